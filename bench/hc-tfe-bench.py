@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+#
+## bench/hc-tfe-bench.py
+#
+## Offline benchmark harness for hc-tfe-attestation-probe.py and hc-tfx-resource-list.py.
+## Starts the synthetic TFE in bench/mocktfe.py on a local port, runs each script against it as a child process
+## with cold caches, and reports per run: wall time, requests served, bytes transferred, 304s and 429s, and the
+## child's peak RSS.  Organisation size, tarball and state sizes, latency and rate limiting are all parameters, so
+## the same scenario can be rerun after a change; --record appends the results as NDJSON (with the git revision)
+## for tracking regressions over time.
+#
+#######################################################################################################################
+
+import argparse
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mocktfe import MockTFE
+from hc_tfe.output import ndjsonRecord, FORMATS
+
+############################################################################
+#
+#   Globals
+#
+############################################################################
+
+REPO_DIR     = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ORG          = 'bench'
+PROBE_ARGS   = '-q -f ndjson -j 8 -r 0'
+TARGETS      = { 'probe': 'hc-tfe-attestation-probe.py', 'resource-list': 'hc-tfx-resource-list.py' }
+
+############################################################################
+#
+# Class: bcolors
+#
+############################################################################
+
+## bcolors - used to provide more engaging output
+#
+class bcolors:
+  Green    = '\033[0;32m'
+  BCyan    = '\033[1;36m'
+  BWhite   = '\033[1;37m'
+  BYellow  = '\033[1;33m'
+  BRed     = '\033[1;31m'
+  Default  = '\033[1;32m'
+  Endc     = '\033[0m'
+#
+## End Class bcolors
+
+############################################################################
+#
+# def caBundle
+#
+############################################################################
+
+## a CA bundle for TFE_CACERT; the mock is plain http but the probe insists on the variable
+#
+def caBundle():
+  if os.getenv('TFE_CACERT'):
+    return os.getenv('TFE_CACERT')
+  try:
+    import certifi
+    return certifi.where()
+  except ImportError:
+    import ssl
+    return ssl.get_default_verify_paths().openssl_cafile
+#
+## End Func caBundle
+
+############################################################################
+#
+# def gitRevision
+#
+############################################################################
+
+def gitRevision():
+  try:
+    return subprocess.run([ 'git', 'describe', '--always', '--dirty' ], cwd=REPO_DIR, capture_output=True, text=True, timeout=10).stdout.strip() or None
+  except (OSError, subprocess.SubprocessError):
+    return None
+#
+## End Func gitRevision
+
+############################################################################
+#
+# def runTarget
+#
+############################################################################
+
+## run one script against mock and return its measurements.  The child gets its own cache and work directories so
+## every run starts cold; wait4 supplies the child's own peak RSS
+#
+def runTarget(mock, target, extraArgs):
+  with tempfile.TemporaryDirectory(prefix='tfeBench.') as scratch:
+    env = dict(os.environ, TFE_ADDR=mock.address, TFE_ORG=ORG, TFE_TOKEN='bench-token', TFE_CACERT=caBundle(), TFE_PROBE_WORK_ROOT=scratch, TFE_FORMAT='ndjson')
+    command = [ sys.executable, os.path.join(REPO_DIR, TARGETS[target]) ]
+    if target == 'probe':
+      command += [ '-o', ORG, '--cache-dir', os.path.join(scratch, 'cache') ] + shlex.split(extraArgs)
+
+    mock.resetStats()
+    with open(os.path.join(scratch, 'output'), 'w+b') as outFile:
+      started = time.perf_counter()
+      child   = subprocess.Popen(command, env=env, cwd=REPO_DIR, stdin=subprocess.DEVNULL, stdout=outFile, stderr=subprocess.STDOUT)
+      _, status, usage = os.wait4(child.pid, 0)
+      elapsed = time.perf_counter() - started
+      outFile.seek(0)
+      output = outFile.read()
+    exitCode = os.waitstatus_to_exitcode(status)
+
+  stats = mock.stats()
+  return {
+    'target':       target,
+    'exit':         exitCode,
+    'wall-seconds': round(elapsed, 3),
+    'requests':     stats['requests'],
+    'bytes':        stats['bytes'],
+    'not-modified': stats['not-modified'],
+    'rate-limited': stats['rate-limited'],
+    'peak-rss-kb':  usage.ru_maxrss,
+    'output-lines': output.count(b'\n'),
+    'endpoints':    stats['endpoints'],
+    'error':        output.decode(errors='replace')[-2000:] if exitCode else ''
+  }
+#
+## End Func runTarget
+
+############################################################################
+#
+# def main
+#
+############################################################################
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark the TFE scripts against a local synthetic TFE')
+  parser.add_argument('-t', '--target',          choices=list(TARGETS) + [ 'all' ], default='all', help='Script to benchmark (default all)')
+  parser.add_argument('-w', '--workspaces',      type=int, default=200, help='Workspaces in the synthetic organisation (default 200)')
+  parser.add_argument('--tarball-kb',            type=int, default=4, help='Approximate uncompressed size of each configuration version in KB (default 4)')
+  parser.add_argument('--state-resources',       type=int, default=20, help='Resources in each state file (default 20)')
+  parser.add_argument('--latency-ms',            type=float, default=0, help='Added server latency per request in ms (default 0)')
+  parser.add_argument('--rate-limit',            type=float, default=0, help='Server rate limit in requests per second, 0 for none (default 0)')
+  parser.add_argument('--etag',                  action='store_true', help='Have the mock send ETags and answer 304s')
+  parser.add_argument('--config-versions',       type=int, default=2, help='Configuration versions per workspace, for --history runs (default 2)')
+  parser.add_argument('--probe-args',            type=str, default=PROBE_ARGS, help=f'Extra arguments for the probe (default "{PROBE_ARGS}")')
+  parser.add_argument('-n', '--repeat',          type=int, default=1, help='Runs per target (default 1)')
+  parser.add_argument('-f', '--format',          choices=FORMATS, default='text', help='Report as text or one NDJSON record per run (default text)')
+  parser.add_argument('--record',                type=str, help='Also append NDJSON records to this file for tracking over time')
+  arg = parser.parse_args()
+
+  mock    = MockTFE(arg.workspaces, arg.tarball_kb, arg.state_resources, arg.latency_ms, arg.rate_limit, arg.etag, arg.config_versions).start()
+  targets = list(TARGETS) if arg.target == 'all' else [ arg.target ]
+  common  = {
+    'time':            datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    'revision':        gitRevision(),
+    'python':          sys.version.split()[0],
+    'workspaces':      arg.workspaces,
+    'tarball-kb':      arg.tarball_kb,
+    'state-resources': arg.state_resources,
+    'latency-ms':      arg.latency_ms,
+    'rate-limit':      arg.rate_limit,
+    'etag':            arg.etag,
+    'config-versions': arg.config_versions,
+    'probe-args':      arg.probe_args
+  }
+
+  failed = False
+  try:
+    for target in targets:
+      for run in range(arg.repeat):
+        result = dict(common, run=run + 1, **runTarget(mock, target, arg.probe_args))
+        failed = failed or result['exit'] != 0
+        if arg.record:
+          with open(arg.record, 'a') as recordFile:
+            recordFile.write(ndjsonRecord(result) + '\n')
+
+        if arg.format == 'ndjson':
+          print(ndjsonRecord(result), flush=True)
+          continue
+        colour = bcolors.Default if result['exit'] == 0 else bcolors.BRed
+        print(f'{bcolors.Green}bench.{bcolors.BCyan}{target:<14}{bcolors.Endc} run {run + 1}: {colour}exit {result["exit"]}{bcolors.Endc}'
+              f'  wall {bcolors.BWhite}{result["wall-seconds"]:.3f}s{bcolors.Endc}'
+              f'  requests {bcolors.BWhite}{result["requests"]}{bcolors.Endc}'
+              f'  bytes {bcolors.BWhite}{result["bytes"]}{bcolors.Endc}'
+              f'  304 {result["not-modified"]}  429 {result["rate-limited"]}'
+              f'  peak RSS {bcolors.BWhite}{result["peak-rss-kb"] // 1024}MB{bcolors.Endc}')
+        if result['error']:
+          print(f'{bcolors.BRed}{result["error"]}{bcolors.Endc}')
+  finally:
+    mock.stop()
+
+  exit(1 if failed else 0)
+#
+## End Func main
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,567 @@
+#!/usr/bin/env python3
+#
+## bench/mocktfe.py
+#
+## Local stand-in for the TFE/TFC API, for benchmarking the scripts in this repo without a live TFE.
+## Speaks the JSON:API endpoints the scripts use (admin/release, organization workspaces with include=latest_run
+## and sparse fieldsets, workspace runs, configuration-versions and their downloads, state-versions and the hosted
+## state download, and the organisation run list with each run's policy checks and run events) for a synthetic
+## organisation of any size.  Tarball and state sizes are configurable, as are
+## per-request latency, a server-side rate limit answered with 429 and X-RateLimit-* headers, and ETag validators.
+## Every response is counted: requests, bytes sent, 304s and 429s, per endpoint, readable from GET /_stats.
+## Run standalone (see --help) or import MockTFE and start it on a thread, as hc-tfe-bench.py does.
+#
+#######################################################################################################################
+
+import argparse
+import hashlib
+import io
+import json
+import tarfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, parse_qsl, urlencode
+
+############################################################################
+#
+#   Globals
+#
+############################################################################
+
+RELEASE        = 'v202306-1'
+MAX_PAGE_SIZE  = 100
+EPOCH          = '2023-01-01T00:00:00+00:00'
+RUN_STATUSES   = [ 'applied', 'applied', 'applied', 'planned_and_finished', 'policy_override', 'errored' ]
+
+############################################################################
+#
+# Class: MockTFE
+#
+############################################################################
+
+## MockTFE - a synthetic organisation and the HTTP server that serves it
+#
+class MockTFE:
+  def __init__(self, workspaces=100, tarballKB=4, stateResources=20, latencyMs=0, rateLimit=0, etag=False, configVersions=2, orgRuns=1000, host='127.0.0.1', port=0):
+    self.workspaces     = int(workspaces)
+    self.configVersions = max(1, int(configVersions))
+    self.orgRuns        = int(orgRuns)
+    self.tarballKB      = int(tarballKB)
+    self.stateResources = int(stateResources)
+    self.latency        = float(latencyMs) / 1000
+    self.rateLimit      = float(rateLimit)
+    self.etag           = etag
+    self.lock           = threading.Lock()
+    self.requests       = Counter()
+    self.bytesSent      = Counter()
+    self.notModified    = 0
+    self.rateLimited    = 0
+    self.tokens         = self.rateLimit
+    self.refilled       = time.monotonic()
+
+    mock = self
+    class Handler(MockHandler):
+      server_mock = mock
+    self.server = ThreadingHTTPServer((host, int(port)), Handler)
+    self.server.daemon_threads = True
+    self.thread = None
+
+  @property
+  def address(self):
+    host, port = self.server.server_address[:2]
+    return f'http://{host}:{port}'
+
+  def start(self):
+    self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+    self.thread.start()
+    return self
+
+  def stop(self):
+    self.server.shutdown()
+    self.server.server_close()
+
+  def resetStats(self):
+    with self.lock:
+      self.requests.clear()
+      self.bytesSent.clear()
+      self.notModified = 0
+      self.rateLimited = 0
+
+  def stats(self):
+    with self.lock:
+      return {
+        'requests':     sum(self.requests.values()),
+        'bytes':        sum(self.bytesSent.values()),
+        'not-modified': self.notModified,
+        'rate-limited': self.rateLimited,
+        'endpoints':    { endpoint: { 'requests': count, 'bytes': self.bytesSent[endpoint] } for endpoint, count in sorted(self.requests.items()) }
+      }
+
+  ## token bucket at rateLimit requests per second, burst of one second's worth; returns seconds until a token is
+  ## free, 0 if this request may proceed
+  #
+  def throttle(self):
+    if self.rateLimit <= 0:
+      return 0
+    with self.lock:
+      now           = time.monotonic()
+      self.tokens   = min(self.rateLimit, self.tokens + (now - self.refilled) * self.rateLimit)
+      self.refilled = now
+      if self.tokens >= 1:
+        self.tokens -= 1
+        return 0
+      return (1 - self.tokens) / self.rateLimit
+
+  def record(self, endpoint, size, status):
+    with self.lock:
+      self.requests[endpoint]  += 1
+      self.bytesSent[endpoint] += size
+      if status == 304:
+        self.notModified += 1
+      elif status == 429:
+        self.rateLimited += 1
+
+  ## synthetic data; everything is derived from the workspace index so any page can be served independently
+  #
+  def workspace(self, i):
+    return {
+      'id':   f'ws-{i:06d}',
+      'type': 'workspaces',
+      'attributes': {
+        'name':                f'ws{i:06d}',
+        'auto-apply':          i % 2 == 0,
+        'created-at':          '2022-01-01T00:00:00Z',
+        'locked':              i % 17 == 0,
+        'speculative-enabled': True,
+        'terraform-version':   [ '1.3.9', '1.4.6', '1.5.2' ][i % 3],
+        'global-remote-state': False,
+        'resource-count':      (i * 7919) % (self.stateResources * 10),
+        'tag-names':           [ f'team-{i % 4}', 'prod' if i % 3 == 0 else 'dev' ],
+        'permissions':         { 'can-read-state-versions': True },
+        'latest-change-at':    EPOCH,
+        'description':         f'synthetic workspace {i} ' + 'x' * 200
+      },
+      'relationships': {
+        'latest-run': { 'data': { 'id': f'run-{i:06d}', 'type': 'runs' } },
+        'project':    { 'data': { 'id': f'prj-{i % 5}', 'type': 'projects' } }
+      }
+    }
+
+  def run(self, i):
+    return {
+      'id':   f'run-{i:06d}',
+      'type': 'runs',
+      'attributes': {
+        'status':      RUN_STATUSES[i % len(RUN_STATUSES)],
+        'created-at':  EPOCH,
+        'canceled-at': None,
+        'message':     'synthetic run ' + 'y' * 200,
+        'status-timestamps': {
+          'plan-queueable-at': '2023-01-01T00:00:00+00:00',
+          'plan-queued-at':    '2023-01-01T00:00:01+00:00',
+          'planning-at':       '2023-01-01T00:00:05+00:00',
+          'planned-at':        '2023-01-01T00:00:20+00:00',
+          'apply-queued-at':   '2023-01-01T00:00:25+00:00',
+          'applying-at':       '2023-01-01T00:00:30+00:00',
+          'confirmed-at':      '2023-01-01T00:00:24+00:00',
+          'applied-at':        '2023-01-01T00:01:00+00:00'
+        }
+      },
+      'relationships': {
+        'created-by':            { 'data': { 'id': f'user-{i % 7}', 'type': 'users' } },
+        'configuration-version': { 'data': { 'id': f'cv-{i:06d}-{self.configVersions - 1}', 'type': 'configuration-versions' } }
+      }
+    }
+
+  ## configuration version 0 is the oldest, uploaded an hour after EPOCH, each later one an hour after that
+  #
+  def configVersion(self, i, version):
+    return {
+      'id':   f'cv-{i:06d}-{version}',
+      'type': 'configuration-versions',
+      'attributes': {
+        'status':            'uploaded',
+        'source':            'tfe-api',
+        'status-timestamps': { 'uploaded-at': f'2023-01-{1 + version // 24:02d}T{version % 24:02d}:00:00+00:00' }
+      },
+      'links': { 'download': f'/api/v2/configuration-versions/cv-{i:06d}-{version}/download' }
+    }
+
+  ## run n of the organisation's history, 0 the newest, each ten minutes after the one before and the oldest at
+  ## EPOCH.  A third of runs pass a policy check and a third soft fail it, half of those then being overridden
+  #
+  def runCreatedAt(self, n):
+    return datetime.fromisoformat(EPOCH) + timedelta(minutes=10 * (self.orgRuns - 1 - n))
+
+  def historyRun(self, n):
+    createdAt = self.runCreatedAt(n)
+    planning  = createdAt + timedelta(seconds=(n * 7919) % 120)
+    applying  = planning + timedelta(seconds=60 + (n * 104729) % 30)
+    stamps    = {
+      'plan-queued-at':  createdAt.isoformat(),
+      'planning-at':     planning.isoformat(),
+      'planned-at':      (planning + timedelta(seconds=20 + n % 40)).isoformat(),
+      'apply-queued-at': (applying - timedelta(seconds=n % 5)).isoformat(),
+      'applying-at':     applying.isoformat(),
+      'applied-at':      (applying + timedelta(seconds=30 + n % 90)).isoformat()
+    }
+    status    = 'applied'
+    if n % 3 == 1:
+      stamps['policy-checked-at'] = (createdAt + timedelta(seconds=40)).isoformat()
+    elif n % 6 == 2:
+      stamps['policy-soft-failed-at'] = (createdAt + timedelta(seconds=40)).isoformat()
+      status = 'discarded'
+      for stamp in ('apply-queued-at', 'applying-at', 'applied-at'):
+        del stamps[stamp]
+    elif n % 6 == 5:
+      stamps['policy-soft-failed-at'] = (createdAt + timedelta(seconds=40)).isoformat()
+      stamps['policy-override-at']    = (createdAt + timedelta(minutes=5)).isoformat()
+    return {
+      'id':   f'run-h{n:07d}',
+      'type': 'runs',
+      'attributes': {
+        'status':            status,
+        'created-at':        createdAt.isoformat(),
+        'message':           'synthetic run ' + 'y' * 200,
+        'status-timestamps': stamps
+      },
+      'relationships': {
+        'workspace':  { 'data': { 'id': f'ws-{n % max(1, self.workspaces):06d}', 'type': 'workspaces' } },
+        'created-by': { 'data': { 'id': f'user-{n % 7}', 'type': 'users' } }
+      }
+    }
+
+  def policyChecks(self, n):
+    createdAt = self.runCreatedAt(n)
+    if n % 3 == 0:
+      return []
+    if n % 3 == 1:
+      status = 'passed'
+    elif n % 6 == 2:
+      status = 'soft_failed'
+    else:
+      status = 'overridden'
+    stamps = { 'queued-at': (createdAt + timedelta(seconds=35)).isoformat() }
+    if status == 'passed':
+      stamps['passed-at'] = (createdAt + timedelta(seconds=40)).isoformat()
+    else:
+      stamps['soft-failed-at'] = (createdAt + timedelta(seconds=40)).isoformat()
+    if status == 'overridden':
+      stamps['overridden-at'] = (createdAt + timedelta(minutes=5)).isoformat()
+    return [ {
+      'id':   f'polchk-h{n:07d}',
+      'type': 'policy-checks',
+      'attributes': {
+        'status':            status,
+        'scope':             'organization',
+        'result':            { 'result': status == 'passed', 'passed': 3 if status == 'passed' else 2, 'total-failed': 0 if status == 'passed' else 1, 'hard-failed': 0, 'soft-failed': 0 if status == 'passed' else 1, 'advisory-failed': 0, 'duration-ms': 12 },
+        'status-timestamps': stamps
+      },
+      'relationships': { 'run': { 'data': { 'id': f'run-h{n:07d}', 'type': 'runs' } } }
+    } ]
+
+  ## run events of run n with include=actor,comment; an overridden run has an override by one of three approvers
+  #
+  def runEvents(self, n):
+    createdAt = self.runCreatedAt(n)
+    events    = [ { 'id': f're-h{n:07d}-0', 'type': 'run-events', 'attributes': { 'action': 'queued', 'created-at': createdAt.isoformat() },
+                    'relationships': { 'actor': { 'data': { 'id': f'user-{n % 7}', 'type': 'users' } }, 'comment': { 'data': None } } } ]
+    included  = [ { 'id': f'user-{n % 7}', 'type': 'users', 'attributes': { 'username': f'dev{n % 7}' } } ]
+    if n % 6 == 5:
+      events.append({ 'id': f're-h{n:07d}-1', 'type': 'run-events', 'attributes': { 'action': 'overridden', 'created-at': (createdAt + timedelta(minutes=5)).isoformat() },
+                      'relationships': { 'actor': { 'data': { 'id': f'user-a{n // 6 % 3}', 'type': 'users' } }, 'comment': { 'data': { 'id': f'wsc-h{n:07d}', 'type': 'comments' } } } })
+      included.append({ 'id': f'user-a{n // 6 % 3}', 'type': 'users', 'attributes': { 'username': f'approver{n // 6 % 3}' } })
+      included.append({ 'id': f'wsc-h{n:07d}', 'type': 'comments', 'attributes': { 'body': f'accepted risk, change {n}' } })
+    return { 'data': events, 'included': included }
+
+  def stateVersion(self, i, serial):
+    count = self.stateResources + serial - 1
+    return {
+      'id':   f'sv-{i:06d}-{serial}',
+      'type': 'state-versions',
+      'attributes': {
+        'serial':                         serial,
+        'created-at':                     EPOCH,
+        'resources-processed':            True,
+        'resources':                      [ { 'name': f'r{n}', 'type': 'null_resource', 'count': 1, 'module': 'root', 'provider': 'provider["registry.terraform.io/hashicorp/null"]' } for n in range(count) ],
+        'hosted-state-download-url':      f'{self.address}/_archivist/state/{i}/{serial}',
+        'hosted-json-state-download-url': f'{self.address}/_archivist/state/{i}/{serial}'
+      }
+    }
+#
+## End Class MockTFE
+
+############################################################################
+#
+# def sparse
+#
+############################################################################
+
+## apply a JSON:API sparse fieldset (fields[type]=a,b) to one resource object
+#
+def sparse(obj, query, typeName):
+  fields = query.get(f'fields[{typeName}]')
+  if not fields:
+    return obj
+  keep = set(fields[0].split(','))
+  return {
+    'id':            obj['id'],
+    'type':          obj['type'],
+    'attributes':    { k: v for k, v in obj['attributes'].items() if k in keep },
+    'relationships': { k: v for k, v in obj.get('relationships', {}).items() if k in keep }
+  }
+#
+## End Func sparse
+
+############################################################################
+#
+# def tarball
+#
+############################################################################
+
+## gzipped configuration tarball of roughly sizeKB of incompressible-ish HCL, different for each version
+#
+@lru_cache(maxsize=512)
+def tarball(workspace, version, sizeKB):
+  files = { 'main.tf': f'resource "null_resource" "a" {{\n  triggers = {{ version = "{version}" }}\n}}\n'.encode() }
+  lines = []
+  for n in range(sizeKB * 1024 // 80):
+    lines.append(f'# {hashlib.sha256(f"{workspace}/{n}".encode()).hexdigest()[:76]}\n')
+  files['modules/padding/padding.tf'] = ''.join(lines).encode()
+  if version % 3 == 2:
+    files['outputs.tf'] = f'output "version" {{\n  value = "{version}"\n}}\n'.encode()
+
+  buffer = io.BytesIO()
+  with tarfile.open(fileobj=buffer, mode='w:gz') as tarFH:
+    for name, content in files.items():
+      info       = tarfile.TarInfo(name)
+      info.size  = len(content)
+      info.mtime = 0
+      tarFH.addfile(info, io.BytesIO(content))
+  return buffer.getvalue()
+#
+## End Func tarball
+
+############################################################################
+#
+# def stateFile
+#
+############################################################################
+
+## raw Terraform state for workspace at serial: serial adds one resource and changes another
+#
+@lru_cache(maxsize=512)
+def stateFile(workspace, serial, resources):
+  state = {
+    'version':           4,
+    'terraform_version': '1.4.6',
+    'serial':            serial,
+    'lineage':           f'lineage-{workspace}',
+    'outputs':           {},
+    'resources':         []
+  }
+  for n in range(resources + serial - 1):
+    state['resources'].append({
+      'mode':      'managed',
+      'type':      'null_resource',
+      'name':      f'r{n}',
+      'provider':  'provider["registry.terraform.io/hashicorp/null"]',
+      'instances': [ { 'schema_version': 0, 'attributes': { 'id': f'{workspace}-{n}-{serial if n == 0 else 0}', 'triggers': { 'n': str(n) } } } ]
+    })
+  return json.dumps(state).encode()
+#
+## End Func stateFile
+
+############################################################################
+#
+# Class: MockHandler
+#
+############################################################################
+
+## MockHandler - routes a request to the synthetic organisation of server_mock
+#
+class MockHandler(BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+  server_mock      = None
+
+  def log_message(self, *args):
+    pass
+
+  def send(self, endpoint, status, body, contentType='application/vnd.api+json', headers=None):
+    mock    = self.server_mock
+    headers = dict(headers or {})
+    if isinstance(body, (dict, list)):
+      body = json.dumps(body, separators=(',', ':')).encode()
+    if status == 200 and mock.etag:
+      etag            = f'W/"{hashlib.md5(body).hexdigest()}"'
+      headers['ETag'] = etag
+      if self.headers.get('If-None-Match') == etag:
+        status, body = 304, b''
+    if mock.rateLimit > 0:
+      headers.setdefault('X-RateLimit-Limit', f'{mock.rateLimit:g}')
+      headers.setdefault('X-RateLimit-Remaining', f'{int(mock.tokens)}')
+
+    self.send_response(status)
+    self.send_header('Content-Type', contentType)
+    self.send_header('Content-Length', str(len(body)))
+    for name, value in headers.items():
+      self.send_header(name, value)
+    self.end_headers()
+    self.wfile.write(body)
+    mock.record(endpoint, len(body), status)
+
+  def do_GET(self):
+    mock  = self.server_mock
+    parts = urlsplit(self.path)
+    query = parse_qs(parts.query)
+    path  = parts.path.rstrip('/').split('/')
+
+    if parts.path == '/_stats':
+      body = json.dumps(mock.stats()).encode()
+      self.send_response(200)
+      self.send_header('Content-Type', 'application/json')
+      self.send_header('Content-Length', str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+      return
+
+    if mock.latency:
+      time.sleep(mock.latency)
+
+    wait = mock.throttle()
+    if wait:
+      self.send('rate-limited', 429, { 'errors': [ { 'status': '429', 'title': 'Too Many Requests' } ] },
+                headers={ 'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': f'{wait:.3f}', 'Retry-After': f'{max(1, round(wait))}' })
+      return
+
+    ## /api/v2/admin/release
+    #
+    if path[1:] == [ 'api', 'v2', 'admin', 'release' ]:
+      return self.send('release', 200, { 'release': RELEASE })
+
+    ## /api/v2/organizations/:org/workspaces
+    #
+    if path[1:4] == [ 'api', 'v2', 'organizations' ] and path[5:] == [ 'workspaces' ]:
+      size   = min(int(query.get('page[size]', [ '20' ])[0]), MAX_PAGE_SIZE)
+      number = int(query.get('page[number]', [ '1' ])[0])
+      total  = max(1, (mock.workspaces + size - 1) // size)
+      first   = (number - 1) * size
+      indexes = range(first, min(mock.workspaces, first + size))
+      keep   = [ (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != 'page[number]' ]
+      base   = f'{mock.address}{parts.path}?{urlencode(keep)}'
+      doc = {
+        'data':  [ sparse(mock.workspace(i), query, 'workspace') for i in indexes ],
+        'links': { 'self': f'{base}&page%5Bnumber%5D={number}', 'next': f'{base}&page%5Bnumber%5D={number + 1}' if number < total else None },
+        'meta':  { 'pagination': { 'current-page': number, 'page-size': size, 'total-pages': total, 'total-count': mock.workspaces } }
+      }
+      if 'latest_run' in query.get('include', [ '' ])[0].split(','):
+        doc['included'] = [ sparse(mock.run(i), query, 'run') for i in indexes ]
+      return self.send('workspaces', 200, doc)
+
+    ## /api/v2/organizations/:org/runs, newest first
+    #
+    if path[1:4] == [ 'api', 'v2', 'organizations' ] and path[5:] == [ 'runs' ]:
+      size    = min(int(query.get('page[size]', [ '20' ])[0]), MAX_PAGE_SIZE)
+      number  = int(query.get('page[number]', [ '1' ])[0])
+      total   = max(1, (mock.orgRuns + size - 1) // size)
+      first   = (number - 1) * size
+      indexes = range(first, min(mock.orgRuns, first + size))
+      keep    = [ (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != 'page[number]' ]
+      base    = f'{mock.address}{parts.path}?{urlencode(keep)}'
+      doc = {
+        'data':  [ sparse(mock.historyRun(n), query, 'run') for n in indexes ],
+        'links': { 'next': f'{base}&page%5Bnumber%5D={number + 1}' if number < total else None },
+        'meta':  { 'pagination': { 'current-page': number, 'page-size': size, 'total-pages': total, 'total-count': mock.orgRuns } }
+      }
+      if 'workspace' in query.get('include', [ '' ])[0].split(','):
+        doc['included'] = [ sparse(mock.workspace(i), query, 'workspace') for i in sorted({ n % max(1, mock.workspaces) for n in indexes }) ]
+      return self.send('org-runs', 200, doc)
+
+    ## /api/v2/runs/:id/policy-checks and /run-events
+    #
+    if path[1:4] == [ 'api', 'v2', 'runs' ] and len(path) == 6 and path[4].startswith('run-h'):
+      n = int(path[4][5:])
+      if path[5] == 'policy-checks':
+        return self.send('policy-checks', 200, { 'data': mock.policyChecks(n), 'links': { 'next': None } })
+      if path[5] == 'run-events':
+        return self.send('run-events', 200, mock.runEvents(n))
+
+    ## /api/v2/workspaces/:id/runs and /configuration-versions
+    #
+    if path[1:4] == [ 'api', 'v2', 'workspaces' ] and len(path) == 6 and path[4].startswith('ws-'):
+      i = int(path[4][3:])
+      if path[5] == 'runs':
+        return self.send('runs', 200, { 'data': [ mock.run(i) ], 'links': { 'next': None }, 'meta': { 'pagination': { 'current-page': 1, 'total-pages': 1 } } })
+      if path[5] == 'configuration-versions':
+        size     = min(int(query.get('page[size]', [ '20' ])[0]), MAX_PAGE_SIZE)
+        number   = int(query.get('page[number]', [ '1' ])[0])
+        total    = max(1, (mock.configVersions + size - 1) // size)
+        newest   = mock.configVersions - 1 - (number - 1) * size
+        keep     = [ (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != 'page[number]' ]
+        base     = f'{mock.address}{parts.path}?{urlencode(keep)}'
+        return self.send('configuration-versions', 200, {
+          'data':  [ mock.configVersion(i, version) for version in range(newest, max(-1, newest - size), -1) ],
+          'links': { 'next': f'{base}&page%5Bnumber%5D={number + 1}' if number < total else None },
+          'meta':  { 'pagination': { 'current-page': number, 'page-size': size, 'total-pages': total, 'total-count': mock.configVersions } }
+        })
+
+    ## /api/v2/configuration-versions/:id/download
+    #
+    if path[1:4] == [ 'api', 'v2', 'configuration-versions' ] and path[5:] == [ 'download' ]:
+      _, workspace, version = path[4].split('-')
+      return self.send('configuration-version-download', 200, tarball(int(workspace), int(version), mock.tarballKB), 'application/octet-stream')
+
+    ## /api/v2/state-versions?filter[workspace][name]=...
+    #
+    if path[1:] == [ 'api', 'v2', 'state-versions' ]:
+      name = query.get('filter[workspace][name]', [ '' ])[0]
+      if not name.startswith('ws') or not name[2:].isdigit():
+        return self.send('state-versions', 200, { 'data': [], 'links': { 'next': None } })
+      i    = int(name[2:])
+      size = int(query.get('page[size]', [ '20' ])[0])
+      data = [ sparse(mock.stateVersion(i, serial), query, 'state-versions') for serial in (2, 1) ][:size]
+      return self.send('state-versions', 200, { 'data': data, 'links': { 'next': None } })
+
+    ## hosted state download
+    #
+    if path[1:3] == [ '_archivist', 'state' ] and len(path) == 5:
+      return self.send('state-download', 200, stateFile(int(path[3]), int(path[4]), mock.stateResources), 'application/json')
+
+    self.send('not-found', 404, { 'errors': [ { 'status': '404', 'title': 'not found' } ] })
+#
+## End Class MockHandler
+
+############################################################################
+#
+# def main
+#
+############################################################################
+
+def main():
+  parser = argparse.ArgumentParser(description='Serve a synthetic TFE organisation for benchmarking; GET /_stats for request and byte counts')
+  parser.add_argument('--port',            type=int, default=8999, help='Port to listen on (default 8999)')
+  parser.add_argument('--workspaces',      type=int, default=100, help='Workspaces in the organisation (default 100)')
+  parser.add_argument('--tarball-kb',      type=int, default=4, help='Approximate size of each configuration version in KB before compression (default 4)')
+  parser.add_argument('--state-resources', type=int, default=20, help='Resources in each state file (default 20)')
+  parser.add_argument('--latency-ms',      type=float, default=0, help='Added latency per request in milliseconds (default 0)')
+  parser.add_argument('--rate-limit',      type=float, default=0, help='Requests per second before answering 429, 0 for no limit (default 0)')
+  parser.add_argument('--etag',            action='store_true', help='Send ETags and answer If-None-Match with 304')
+  parser.add_argument('--config-versions', type=int, default=2, help='Configuration versions per workspace (default 2)')
+  parser.add_argument('--org-runs',        type=int, default=1000, help='Runs in the organisation run list, ten minutes apart (default 1000)')
+  arg = parser.parse_args()
+
+  mock = MockTFE(arg.workspaces, arg.tarball_kb, arg.state_resources, arg.latency_ms, arg.rate_limit, arg.etag, arg.config_versions, arg.org_runs, port=arg.port)
+  print(f'Serving {arg.workspaces} workspaces on {mock.address}', flush=True)
+  try:
+    mock.server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+#
+## End Func main
+
+if __name__ == '__main__':
+  main()
@@ -12,12 +12,26 @@
 import argparse
 import shutil
 import os
-import subprocess
-import requests
+import sys
+import atexit
+import signal
+import tempfile
 import json
-import zlib
-import tarfile
-import difflib
+import time
+from datetime import datetime, timezone
+from hc_tfe.client import TFEClient, POOL_SIZE, streamTo
+from hc_tfe.pagination import iterPages, iterRecords
+from hc_tfe.ratelimit import RateLimiter, RATE, MAX_RETRIES
+from hc_tfe.cvcache import ConfigVersionCache, CACHE_DIR, CACHE_SIZE_MB
+from hc_tfe.respcache import ResponseCache, TTL
+from hc_tfe.watermark import WatermarkStore, WATERMARK_FILE
+from hc_tfe.contentindex import ContentIndex, INDEX_FILE, INDEX_SIZE_MB
+from hc_tfe.output import ndjsonRecord, writeRecord, FORMATS
+from hc_tfe.watch import PollSchedule, ACTIVE_INTERVAL, IDLE_INTERVAL, MAX_IDLE_INTERVAL, FINAL_STATUSES, ATTESTATION_STATUSES
+from hc_tfe.profile import Profiler, span, summaryLines
+from hc_tfe.targets import loadTargets, fanOut, scriptCommand, isTargetChild, PARALLEL_TARGETS
+from hc_tfe.policyscan import parseStamp, policyChecked, overriddenChecks, overrideEvents, overrideRecords, SCAN_RUN_FIELDS
+from hc_tfe.runlatency import RunTimings, STAGES
 
 ############################################################################
 #
@@ -25,20 +39,41 @@ import difflib
 #
 ############################################################################
 
-QUIET         = False
-TFE_ADDR      = os.getenv('TFE_ADDR')
-TFE_TOKEN     = os.getenv('TFE_TOKEN')
-TFE_CACERT    = os.getenv('TFE_CACERT')
-rows, columns = os.popen('stty size', 'r').read().split()
+QUIET          = False
+TFE_ADDR       = os.getenv('TFE_ADDR')
+TFE_TOKEN      = os.getenv('TFE_TOKEN')
+TFE_CACERT     = os.getenv('TFE_CACERT')
+TFE_CLIENT     = None
+CV_CACHE       = None
+RESPONSE_CACHE = None
+WATERMARKS     = None
+CONTENT_INDEX  = None
+PROFILER       = None
+
+## /var/tmp used as CIS benchmarking compliance means /tmp noexec.  Each run makes its own uniquely named work dir
+## under WORK_ROOT (e.g. /dev/shm to keep downloads in RAM) so any number of probes can share a host;
+## tfeProbeTmpDir0/1 are set inside it by handleDirectories('create')
+#
+WORK_ROOT        = os.getenv('TFE_PROBE_WORK_ROOT', '/var/tmp')
+tfeProbeWorkDir  = None
+tfeProbeTmpDir0  = None
+tfeProbeTmpDir1  = None
+
+## sparse fieldsets for the workspace list; only what the report uses, plus the latest run so that there is no
+## separate runs call per workspace
+#
+WORKSPACE_FIELDS = 'name,auto-apply,created-at,locked,speculative-enabled,terraform-version,global-remote-state,resource-count,permissions,latest-change-at,latest-run'
+RUN_FIELDS       = 'status,created-at,canceled-at,status-timestamps,created-by,configuration-version'
+
+## the two latest state versions are all the report compares; resources is the summary TFE processes out of each
+## state, so the state files themselves are only downloaded for --state-diff full
+#
+STATE_VERSION_FIELDS = 'serial,resources-processed,resources,hosted-state-download-url'
+STATE_DIFF_MODES     = ('summary', 'full', 'none')
 
-## /var/tmp used as CIS benchmarking compliance means /tmp noexec
+## --profile with no file name writes a Chrome trace here; a .prom/.om/.txt name writes OpenMetrics instead
 #
-tfeProbeTmpDir0  =  '/var/tmp/tfeProbeTmpDir0'
-tfeProbeTmpDir1  =  '/var/tmp/tfeProbeTmpDir1'
-cv0tgzPath       =  '/var/tmp/cv0blob.tgz'
-cv1tgzPath       =  '/var/tmp/cv1blob.tgz'
-sv0Path          = f'{tfeProbeTmpDir0}/sv0blob.json'
-sv1Path          = f'{tfeProbeTmpDir1}/sv1blob.json'
+PROFILE_FILE         = 'tfe-probe-profile.json'
 
 ############################################################################
 #
@@ -69,6 +104,24 @@ class bcolors:
 #
 ## End Class bcolors
 
+############################################################################
+#
+# Class: ProbeExit
+#
+############################################################################
+
+## ProbeExit - raised in place of exit() by anything that can run on a worker thread.  exit() there would only end
+## that one future and remove the work dir under the workers still running.  This is a BaseException, as SystemExit
+## is, so no "except Exception" takes it for an ordinary error; the executors wait for their other workers to stop
+## and pass it on, and main() cleans up and exits with code on the main thread
+#
+class ProbeExit(BaseException):
+  def __init__(self, code=1):
+    super().__init__(code)
+    self.code = code
+#
+## End Class ProbeExit
+
 ############################################################################
 #
 # def drawLine
@@ -77,11 +130,11 @@ class bcolors:
 
 ## output a line the width of the terminal
 #
-def drawLine():
-  print(f'{bcolors.Default}')
-  line = '#' * int(columns)
-  print(line)
-  print()
+def drawLine(out=print):
+  out(f'{bcolors.Default}')
+  line = '#' * shutil.get_terminal_size().columns
+  out(line)
+  out('')
 #
 ## End Func drawLine
 
@@ -91,31 +144,44 @@ def drawLine():
 #
 ############################################################################
 
+## create makes this run's private work dir (mode 0700) with the two temporary dirs in it and arranges for it to be
+## removed however the run ends; delete removes it and is safe to call more than once
+#
 def handleDirectories(DEBUG, handle):
+  global tfeProbeWorkDir
+  global tfeProbeTmpDir0
+  global tfeProbeTmpDir1
+
   if handle == 'create':
-    for dir in [ tfeProbeTmpDir0, tfeProbeTmpDir1 ]:
-      try:
+    try:
+      tfeProbeWorkDir = tempfile.mkdtemp(prefix='tfeProbe.', dir=WORK_ROOT)
+      tfeProbeTmpDir0 = f'{tfeProbeWorkDir}/tfeProbeTmpDir0'
+      tfeProbeTmpDir1 = f'{tfeProbeWorkDir}/tfeProbeTmpDir1'
+      for dir in [ tfeProbeTmpDir0, tfeProbeTmpDir1 ]:
         if DEBUG:
           drawLine()
           print(f'{bcolors.Magenta}Creating temporary directory: {dir}{bcolors.Endc}')
         os.mkdir(dir)
-      except OSError as error:
-        print()
-        print(f'{bcolors.BRed}handleDirectories ERROR failed to {handle} {dir}:{bcolors.Endc}')
-        print(error)
-        exit(1)
+    except OSError as error:
+      print()
+      print(f'{bcolors.BRed}handleDirectories ERROR failed to {handle} work directory under {WORK_ROOT}:{bcolors.Endc}')
+      print(error)
+      exit(1)
+    atexit.register(handleDirectories, DEBUG, 'delete')
   elif handle == 'delete':
-    for dir in [ tfeProbeTmpDir0, tfeProbeTmpDir1 ]:
-      try:
-        if DEBUG:
-          drawLine()
-          print(f'{bcolors.Magenta}Deleting temporary directory: {dir}{bcolors.Endc}')
-        shutil.rmtree(dir, ignore_errors = False)
-      except OSError as error:
-        print()
-        print(f'{bcolors.BRed}handleDirectories ERROR failed to {handle} {dir}:{bcolors.Endc}')
-        print(error)
-        exit(1)
+    if tfeProbeWorkDir is None:
+      return
+    dir, tfeProbeWorkDir = tfeProbeWorkDir, None
+    try:
+      if DEBUG:
+        drawLine()
+        print(f'{bcolors.Magenta}Deleting temporary directory: {dir}{bcolors.Endc}')
+      shutil.rmtree(dir, ignore_errors = False)
+    except OSError as error:
+      print()
+      print(f'{bcolors.BRed}handleDirectories ERROR failed to {handle} {dir}:{bcolors.Endc}')
+      print(error)
+      exit(1)
   else:
     print()
     print(f'{bcolors.BRed}handleDirectories ERROR internally: handle is {handle}{bcolors.Endc}')
@@ -129,32 +195,37 @@ def handleDirectories(DEBUG, handle):
 #
 ############################################################################
 
-## call TFE and return json object
+## call TFE and return json object; cacheable JSON calls are made conditional on the response cache, and refresh
+## skips the TTL so that an entry with no validators is fetched again (and the cache updated) rather than reused
 #
-def callTFE(QUIET, DEBUG, path, downloadPath=''):
+def callTFE(QUIET, DEBUG, path, downloadPath='', cacheable=False, refresh=False):
   if not path:
     print(f'{bcolors.BRed}No TFE API in calling path{bcolors.Endc}')
-    handleDirectories(DEBUG, 'delete')
-    exit(1)
+    raise ProbeExit(1)
 
   if not QUIET and DEBUG:
     print(f'{bcolors.Magenta}Calling TFE with {path}{bcolors.Endc}')
     print(f'{bcolors.Magenta}Download path:   {downloadPath}{bcolors.Endc}')
     print()
 
-  headers = {
-    'Authorization': f'Bearer {TFE_TOKEN}',
-    'Content-Type':  'application/vnd.api+json'
-  }
+  cacheEntry = None
+  headers    = {}
+  if cacheable and RESPONSE_CACHE is not None:
+    cacheEntry = RESPONSE_CACHE.lookup(path)
+    if cacheEntry is not None and not refresh and RESPONSE_CACHE.isFresh(cacheEntry):
+      if DEBUG:
+        print(f'{bcolors.Magenta}Response from cache (within TTL): {path}{bcolors.Endc}')
+      return(cacheEntry['body'])
+    headers = RESPONSE_CACHE.conditionalHeaders(cacheEntry)
+
   try:
-    response = requests.get(f'{path}', headers=headers)
+    response = TFE_CLIENT.get(f'{path}', headers=headers, stream=bool(downloadPath))
   except Exception as e:
     print()
     print(f'{bcolors.BRed}ERROR with requests to {path}:')
     print(e)
     print(f'{bcolors.Endc}')
-    handleDirectories(DEBUG, 'delete')
-    exit(1)
+    raise ProbeExit(1)
 
   ## handle response code
   #
@@ -164,11 +235,19 @@ def callTFE(QUIET, DEBUG, path, downloadPath=''):
     else:
       print(f'{bcolors.BMagenta}API Request Response code: {response.status_code}')
 
-  ## detect output gzip file (which is the only type this script handles) or marshall
+  ## not modified since it was cached: nothing transferred and nothing to decode
+  #
+  if response.status_code == 304 and cacheEntry is not None:
+    return(cacheEntry['body'])
+
+  ## detect output gzip file (which is the only type this script handles) or marshall; downloads are streamed
+  ## to disk a chunk at a time rather than held in memory
   #
   if response.status_code == 200:
     if not downloadPath or downloadPath == '':
       j = response.json()
+      if cacheable and RESPONSE_CACHE is not None:
+        RESPONSE_CACHE.store(path, response, j)
       if DEBUG:
         print()
         print(f'{bcolors.BYellow}{json.dumps(j)}{bcolors.Endc}')  # in order to put it out to https://codeamaze.com/web-viewer/json-explorer to make sense
@@ -176,103 +255,709 @@ def callTFE(QUIET, DEBUG, path, downloadPath=''):
       return(j)
     elif downloadPath.endswith('tgz'):
       try:
-        data = zlib.decompress(response.content, zlib.MAX_WBITS|32)
-        with open(downloadPath,'wb') as outFile:
-          outFile.write(data)
+        with response, open(downloadPath,'wb') as outFile:
+          streamTo(response, outFile, decompress=True)
       except Exception as e:
         print()
         print(f'{bcolors.BRed}ERROR writing to {downloadPath}:')
         print(e)
         print(f'{bcolors.Endc}')
-        handleDirectories(DEBUG, 'delete')
-        exit(1)
+        raise ProbeExit(1)
       return('OK')
     elif downloadPath.endswith('json'):
       try:
-        j = response.json()
-        with open(downloadPath,'w') as outFile:
-          outFile.write(json.dumps(j))
+        with response, open(downloadPath,'wb') as outFile:
+          written = streamTo(response, outFile)
         if DEBUG:
-          print(f'{bcolors.BGreen}DOWNLOADED STATE VERSION OK{bcolors.Endc}')
-          print()
-          print(f'{bcolors.BYellow}{json.dumps(j)}{bcolors.Endc}')  # in order to put it out to https://codeamaze.com/web-viewer/json-explorer to make sense
+          print(f'{bcolors.BGreen}DOWNLOADED STATE VERSION OK{bcolors.Endc} ({written} bytes to {downloadPath})')
           print()
       except Exception as e:
         print()
         print(f'{bcolors.BRed}ERROR writing to {downloadPath}:')
         print(e)
         print(f'{bcolors.Endc}')
-        handleDirectories(DEBUG, 'delete')
-        exit(1)
+        raise ProbeExit(1)
+      return('OK')
   elif response.status_code >= 400:
     j = response.json()
     print()
     print(f'{bcolors.BYellow}{json.dumps(j)}{bcolors.Endc}')  # in order to put it out to https://codeamaze.com/web-viewer/json-explorer to make sense
     print()
-    handleDirectories(DEBUG, 'delete')
-    exit(response.status_code)
+    raise ProbeExit(response.status_code)
 #
 ## End Func callTFE
 
+############################################################################
+#
+# def downloadConfigVersion
+#
+############################################################################
+
+## return the path of the tarball for configuration version cvId, from the cache if it has been downloaded
+## before, otherwise downloaded to downloadPath (and moved into the cache when caching, unless cache is False)
+#
+def downloadConfigVersion(QUIET, DEBUG, cvId, downloadPath, cache=True):
+  if CV_CACHE is not None:
+    cachedPath = CV_CACHE.get(cvId)
+    if cachedPath:
+      if DEBUG:
+        print(f'{bcolors.Magenta}Configuration version {cvId} from cache: {cachedPath}{bcolors.Endc}')
+      return cachedPath
+
+  downloadCheck = callTFE(QUIET, DEBUG, f'{TFE_ADDR}/api/v2/configuration-versions/{cvId}/download', downloadPath)
+  if downloadCheck != 'OK':
+    print(f'{bcolors.BRed}ERROR: Download configuration version {cvId} failed.{bcolors.Endc}. Exiting here')
+    raise ProbeExit(1)
+
+  if CV_CACHE is None or not cache:
+    return downloadPath
+  try:
+    return CV_CACHE.put(cvId, downloadPath)
+  except Exception as error:
+    print(f'{bcolors.BRed}ERROR: Failed to cache configuration version {cvId} in {CV_CACHE.directory}.{bcolors.Endc}. Exiting here')
+    print(error)
+    print(f'{bcolors.Endc}')
+    raise ProbeExit(1)
+#
+## End Func downloadConfigVersion
+
 ############################################################################
 #
 # def runDiff
 #
 ############################################################################
 
-## Diff config or state; had probs with difflib output so dropped to CLI for brevity
+## Diff config or state, both in-process.  Config is diffed straight from the two tarballs (see hc_tfe/tardiff.py);
+## state compares the resource instances of the two state files and summary the "resources" summaries of the two
+## state version objects, passed in place of the paths (see hc_tfe/statediff.py).  index diffs two configuration
+## versions already in the content index, passed as their IDs (see hc_tfe/contentindex.py).  path0 is the latest
+## version, path1 the previous one; every kind reads from previous to latest, as --history does.  Returns the
+## diff text for config, a dict of added/removed/changed addresses for state
 #
-def runDiff(QUIET, DEBUG, tfeProbeTmpDir0, tfeProbeTmpDir1, fileType=False):
-  if fileType == "state":
+def runDiff(QUIET, DEBUG, path0, path1, fileType=False, out=print, labels=('cv0', 'cv1')):
+  from hc_tfe.tardiff import diffArchives
+  from hc_tfe.statediff import diffStates, diffSummaries
+
+  if fileType == "state" or fileType == "summary":
     try:
-      os.system(f'terraform state list -state={sv0Path} > {tfeProbeTmpDir0}/sv0blob.tfstate')
-      with open(f'{tfeProbeTmpDir0}/sv0blob.tfstate', 'r') as file:
-        sv0 = file.read()
-      os.system(f'terraform state list -state={sv1Path} > {tfeProbeTmpDir1}/sv1blob.tfstate')
-      with open(f'{tfeProbeTmpDir1}/sv1blob.tfstate', 'r') as file:
-        sv1 = file.read()
-
-      child = subprocess.run([f'diff -dabEBur {tfeProbeTmpDir0}/sv0blob.tfstate {tfeProbeTmpDir1}/sv1blob.tfstate'], capture_output=True, shell=True)
-      output = str(child.stdout, 'utf-8')
-      error  = str(child.stderr, 'utf-8')
-
-      if output == '' and error == '':
-        print(f'{bcolors.Green}config.{bcolors.BCyan}Configuration Changes:       {bcolors.BYellow}No difference{bcolors.Endc}')
-      elif output != '' and error == '':
-        print(f'{bcolors.Green}config.{bcolors.BCyan}Configuration Changes:{bcolors.BWhite}\n')
-        print(f'{output}{bcolors.Endc}')
-      elif error != '':
-        print(f'{bcolors.BRed}ERROR: {error}')
-        raise Exception
+      if fileType == "summary":
+        added, removed, changed = diffSummaries(path1, path0)
+      else:
+        added, removed, changed = diffStates(path1, path0)
+
+      if not added and not removed and not changed:
+        out(f'{bcolors.Green}state.{bcolors.BCyan}State Changes:               {bcolors.BYellow}No difference{bcolors.Endc}')
+      else:
+        out(f'{bcolors.Green}state.{bcolors.BCyan}State Changes:{bcolors.BWhite}\n')
+        for address in added:
+          out(f'{bcolors.Green}  + {address}{bcolors.Endc}')
+        for address in removed:
+          out(f'{bcolors.Red}  - {address}{bcolors.Endc}')
+        for address in changed:
+          out(f'{bcolors.Yellow}  ~ {address}{bcolors.Endc}')
+        out('')
+      return { 'added': added, 'removed': removed, 'changed': changed }
     except Exception as error:
-      print(f'{bcolors.BRed}ERROR: Failed to diff state files {tfeProbeTmpDir0}/sv0blob.tfstate and {tfeProbeTmpDir1}/sv1blob.tfstate.{bcolors.Endc}. Exiting here')
+      print(f'{bcolors.BRed}ERROR: Failed to diff {labels[0]} and {labels[1]}.{bcolors.Endc}. Exiting here')
       print(error)
       print(f'{bcolors.Endc}')
-      handleDirectories(DEBUG, 'delete')
-      exit(1)
+      raise ProbeExit(1)
   else:
     try:
-      child = subprocess.run([f'diff -dabEBur {tfeProbeTmpDir0} {tfeProbeTmpDir1}'], capture_output=True, shell=True)
-      output = str(child.stdout, 'utf-8')
-      error  = str(child.stderr, 'utf-8')
-
-      if output == '' and error == '':
-        print(f'{bcolors.Green}config.{bcolors.BCyan}Configuration Changes:      {bcolors.BYellow}No difference{bcolors.Endc}')
-      elif output != '' and error == '':
-        print(f'{bcolors.Green}config.{bcolors.BCyan}Configuration Changes:{bcolors.BWhite}\n')
-        print(f'{output}{bcolors.Endc}')
-      elif error != '':
-        print(f'{bcolors.BRed}ERROR: {error}')
-        raise Exception
+      if fileType == "index":
+        output = CONTENT_INDEX.diff(path1, path0, labels[1], labels[0])
+      else:
+        output = diffArchives(path1, path0, labels[1], labels[0])
+
+      if output == '':
+        out(f'{bcolors.Green}config.{bcolors.BCyan}Configuration Changes:      {bcolors.BYellow}No difference{bcolors.Endc}')
+      else:
+        out(f'{bcolors.Green}config.{bcolors.BCyan}Configuration Changes:{bcolors.BWhite}\n')
+        out(f'{output}{bcolors.Endc}')
+      return output
     except Exception as error:
-      print(f'{bcolors.BRed}ERROR: Failed to diff configurations {tfeProbeTmpDir0} and {tfeProbeTmpDir1}.{bcolors.Endc}. Exiting here')
+      print(f'{bcolors.BRed}ERROR: Failed to diff configurations {path0} and {path1}.{bcolors.Endc}. Exiting here')
       print(error)
       print(f'{bcolors.Endc}')
-      handleDirectories(DEBUG, 'delete')
-      exit(1)
+      raise ProbeExit(1)
 #
 ## End Func runDiff
 
+############################################################################
+#
+# def ensureIndexed
+#
+############################################################################
+
+## make sure configuration version cvId is in the content index, downloading it to downloadPath only if it is not.
+## The tarball is not needed once indexed, so a download is never cached and one already in the cache is dropped
+## from it, rather than storing the version twice
+#
+def ensureIndexed(QUIET, DEBUG, cvId, downloadPath):
+  if CONTENT_INDEX.has(cvId):
+    return
+  path = downloadConfigVersion(QUIET, DEBUG, cvId, downloadPath, cache=False)
+  try:
+    with span(PROFILER, 'cv-index'):
+      CONTENT_INDEX.ingest(cvId, path)
+  except Exception as error:
+    print(f'{bcolors.BRed}ERROR: Failed to index configuration version {cvId}.{bcolors.Endc}. Exiting here')
+    print(error)
+    print(f'{bcolors.Endc}')
+    raise ProbeExit(1)
+  finally:
+    if path == downloadPath:
+      os.remove(path)
+    else:
+      CV_CACHE.release(cvId)
+      CV_CACHE.discard(cvId)
+#
+## End Func ensureIndexed
+
+############################################################################
+#
+# def uploadedAt
+#
+############################################################################
+
+## when configuration version cv was uploaded: the earliest of its status timestamps, or None if it has none
+#
+def uploadedAt(cv):
+  stamps = [ datetime.fromisoformat(stamp.replace('Z', '+00:00')) for stamp in ((cv.get("attributes") or {}).get("status-timestamps") or {}).values() if stamp ]
+  return min(stamps, default=None)
+#
+## End Func uploadedAt
+
+############################################################################
+#
+# def configVersionHistory
+#
+############################################################################
+
+## the configuration versions of workspace to walk, newest first as TFE lists them: at most count of them (0 for
+## no limit), uploaded no earlier than since (None for no limit).  Paging stops at the first version out of range
+#
+def configVersionHistory(QUIET, DEBUG, workspace, count=0, since=None):
+  versions = []
+  pageSize = min(count, 100) if count else 100
+  for cv in iterRecords(lambda path: callTFE(QUIET, DEBUG, path), f'{TFE_ADDR}/api/v2/workspaces/{workspace["id"]}/configuration-versions?page%5Bsize%5D={pageSize}'):
+    if since is not None and uploadedAt(cv) is not None and uploadedAt(cv) < since:
+      break
+    versions.append(cv)
+    if count and len(versions) >= count:
+      break
+  return versions
+#
+## End Func configVersionHistory
+
+############################################################################
+#
+# def walkHistory
+#
+############################################################################
+
+## diff each configuration version in versions (newest first) against the one before it, oldest pair first.  The
+## walk is pipelined: version k+1 is downloaded and decoded on a worker thread while k-1 -> k is diffed, and only
+## those trees are held, so each version is fetched and decoded exactly once and memory does not grow with the
+## length of the history.  With the content index the worker only indexes versions not already in it, and each
+## pair is diffed from the index.  Returns [ { from, to, diff } ], rendering each pair through out
+#
+def walkHistory(QUIET, DEBUG, workspace, versions, out=print):
+  from concurrent.futures import ThreadPoolExecutor
+  from hc_tfe.tardiff import loadTree, diffTrees
+
+  def fetchTree(cvId):
+    if CONTENT_INDEX is not None:
+      with span(PROFILER, 'cv-download'):
+        ensureIndexed(QUIET, DEBUG, cvId, f'{tfeProbeTmpDir0}/{workspace["id"]}-{cvId}.tgz')
+      return cvId
+    with span(PROFILER, 'cv-download'):
+      path = downloadConfigVersion(QUIET, DEBUG, cvId, f'{tfeProbeTmpDir0}/{workspace["id"]}-{cvId}.tgz')
+    try:
+      with span(PROFILER, 'cv-decode'):
+        return loadTree(path)
+    finally:
+      if CV_CACHE is None:
+        os.remove(path)
+      else:
+        CV_CACHE.release(cvId)
+
+  ordered  = versions[::-1]
+  history  = []
+  older    = None
+  olderId  = None
+  executor = ThreadPoolExecutor(max_workers=1)
+  try:
+    pending = executor.submit(fetchTree, ordered[0]["id"])
+    for n, cv in enumerate(ordered):
+      tree = pending.result()
+      if n + 1 < len(ordered):
+        pending = executor.submit(fetchTree, ordered[n + 1]["id"])
+
+      if older is not None:
+        with span(PROFILER, 'config-diff'):
+          if CONTENT_INDEX is not None:
+            output = CONTENT_INDEX.diff(olderId, cv["id"], olderId, cv["id"])
+          else:
+            output = diffTrees(older, tree, olderId, cv["id"])
+        if output == '':
+          out(f'{bcolors.Green}config.{bcolors.BCyan}Changes {olderId} -> {cv["id"]}:  {bcolors.BYellow}No difference{bcolors.Endc}')
+        else:
+          out(f'{bcolors.Green}config.{bcolors.BCyan}Changes {olderId} -> {cv["id"]}:{bcolors.BWhite}\n')
+          out(f'{output}{bcolors.Endc}')
+        history.append({ 'from': olderId, 'to': cv["id"], 'diff': output })
+      older, olderId = tree, cv["id"]
+  except Exception as error:
+    print(f'{bcolors.BRed}ERROR: Failed to walk the configuration history of {workspace["id"]}.{bcolors.Endc}. Exiting here')
+    print(error)
+    print(f'{bcolors.Endc}')
+    raise ProbeExit(1)
+  except ProbeExit:
+    executor.shutdown(wait=True, cancel_futures=True)
+    raise
+  finally:
+    executor.shutdown(wait=False, cancel_futures=True)
+  return history
+#
+## End Func walkHistory
+
+############################################################################
+#
+# def workspaceItems
+#
+############################################################################
+
+## the workspace attributes the report uses.  run-blob holds the latest run from the list's included resources
+## in the shape of a runs list response, {"data": []} for a workspace with no runs, or None when the server did
+## not include it and the runs API has to be asked
+#
+def workspaceItems(array_obj, includedRuns):
+  latestRun = (array_obj.get("relationships") or {}).get("latest-run")
+  if latestRun is None:
+    runBlob = None
+  elif latestRun.get("data") is None:
+    runBlob = { "data": [] }
+  elif latestRun["data"]["id"] in includedRuns:
+    runBlob = { "data": [ includedRuns[latestRun["data"]["id"]] ] }
+  else:
+    runBlob = None
+
+  return {
+    'id':                      f'{array_obj["id"]}',
+    'auto-apply':              f'{array_obj["attributes"]["auto-apply"]}',
+    'created-at':              f'{array_obj["attributes"]["created-at"]}',
+    'locked':                  f'{array_obj["attributes"]["locked"]}',
+    'speculative-enabled':     f'{array_obj["attributes"]["speculative-enabled"]}',
+    'terraform-version':       f'{array_obj["attributes"]["terraform-version"]}',
+    'global-remote-state':     f'{array_obj["attributes"]["global-remote-state"]}',
+    'resource-count':          f'{array_obj["attributes"]["resource-count"]}',
+    'can-read-state-versions': f'{array_obj["attributes"]["permissions"]["can-read-state-versions"]}',
+    'latest-change-at':        f'{array_obj["attributes"].get("latest-change-at")}',
+    'run-blob':                runBlob
+  }
+#
+## End Func workspaceItems
+
+############################################################################
+#
+# def listWorkspaces
+#
+############################################################################
+
+## workspace items by name; every page of the list, streamed page by page, with each workspace's latest run
+## included in the same response
+#
+def listWorkspaces(QUIET, DEBUG, org, cacheable=True):
+  workspaces = {}
+  workspacePages = iterPages(lambda path: callTFE(QUIET, DEBUG, path, cacheable=cacheable), f'{TFE_ADDR}/api/v2/organizations/{org}/workspaces?include=latest_run&fields%5Bworkspace%5D={WORKSPACE_FIELDS}&fields%5Brun%5D={RUN_FIELDS}&page%5Bsize%5D=100', TFE_CLIENT.poolSize)
+  for page in workspacePages:
+    includedRuns = { obj["id"]: obj for obj in page.get("included") or [] if obj["type"] == "runs" }
+    for array_obj in page.get("data") or []:
+      workspaces[array_obj["attributes"]["name"]] = workspaceItems(array_obj, includedRuns)
+  return workspaces
+#
+## End Func listWorkspaces
+
+############################################################################
+#
+# def latestRunId
+#
+############################################################################
+
+## ID of the workspace's latest run as included in the workspace list, or None if the list did not include it
+#
+def latestRunId(workspace):
+  if workspace["run-blob"] is None or len(workspace["run-blob"]["data"]) == 0:
+    return None
+  return workspace["run-blob"]["data"][0]["id"]
+#
+## End Func latestRunId
+
+############################################################################
+#
+# def workspaceRecord
+#
+############################################################################
+
+## the --format ndjson record for one probed workspace: the same facts as the text report, typed, and without any
+## colour or layout
+#
+def workspaceRecord(org, key, workspace, runBlob, cv0, cv1, configChanges, stateVersionsBlob, stateChanges, configHistory=None):
+  record = {
+    'type':                'workspace',
+    'address':             TFE_ADDR,
+    'org':                 org,
+    'name':                key,
+    'id':                  workspace["id"],
+    'terraform-version':   workspace["terraform-version"],
+    'created-at':          workspace["created-at"],
+    'locked':              workspace["locked"] == "True",
+    'speculative-enabled': workspace["speculative-enabled"] == "True",
+    'global-remote-state': workspace["global-remote-state"] == "True",
+    'resource-count':      int(workspace["resource-count"]) if workspace["resource-count"].isdigit() else None,
+    'run':                 None,
+    'configuration':       None,
+    'state':               None
+  }
+
+  if len(runBlob["data"]) > 0:
+    run = runBlob["data"][0]
+    record['run'] = {
+      'id':                run["id"],
+      'status':            run["attributes"].get("status"),
+      'created-at':        run["attributes"].get("created-at"),
+      'canceled-at':       run["attributes"].get("canceled-at"),
+      'created-by':        ((run["relationships"].get("created-by") or {}).get("data") or {}).get("id"),
+      'status-timestamps': run["attributes"].get("status-timestamps") or {}
+    }
+
+  if cv0 is not None:
+    record['configuration'] = { 'latest': cv0, 'previous': cv1, 'diff': configChanges }
+    if configHistory is not None:
+      record['configuration']['history'] = configHistory
+
+  if len(stateVersionsBlob["data"]) > 0:
+    record['state'] = {}
+    for label, sv in zip(('latest', 'previous'), stateVersionsBlob["data"][:2]):
+      record['state'][label] = { 'id': sv["id"], 'serial': sv["attributes"].get("serial") }
+    record['state']['changes'] = stateChanges
+
+  return record
+#
+## End Func workspaceRecord
+
+############################################################################
+#
+# def probeWorkspace
+#
+############################################################################
+
+## probe one workspace and return its report block as a single string so that concurrent probes can be printed
+## whole and in order, with the watermark to record for it once printed; every workspace gets its own download
+## paths in the temporary dirs.  With fmt ndjson the block is one compact JSON record instead and none of the text
+## report is rendered
+#
+def probeWorkspace(QUIET, DEBUG, org, key, workspace, stateDiff='summary', fmt='text', history=0, since=None):
+  lines = []
+  if fmt == 'text':
+    out = lines.append
+  else:
+    out = lambda line: None
+
+  cv0tgzPath        = f'{tfeProbeTmpDir0}/{workspace["id"]}-cv0blob.tgz'
+  cv1tgzPath        = f'{tfeProbeTmpDir1}/{workspace["id"]}-cv1blob.tgz'
+  multipleCV        = False
+  cv0               = None
+  cv1               = None
+  configChanges     = None
+  configHistory     = None
+  stateVersionsBlob = { "data": [] }
+  stateChanges      = None
+  runId             = None
+  cvId              = None
+  stateSerial       = None
+
+  if not QUIET:
+    drawLine(out)
+  out(f'{bcolors.Green}workspace.{bcolors.Default}Name:                    {bcolors.BMagenta}{key}{bcolors.Endc}')
+  out(f'{bcolors.Green}workspace.{bcolors.Default}ID:                      {bcolors.BCyan}{workspace["id"]}{bcolors.Endc}')
+  out(f'{bcolors.Green}workspace.{bcolors.Default}TF Version:              {workspace["terraform-version"]}{bcolors.Endc}')
+  out(f'{bcolors.Green}workspace.{bcolors.Default}Created:                 {workspace["created-at"]}{bcolors.Endc}')
+  if workspace["locked"] == "True":
+    colour = f'{bcolors.BRed}'
+  else:
+    colour = f'{bcolors.Default}'
+  out(f'{bcolors.Green}workspace.{bcolors.Default}Locked:                  {colour}{workspace["locked"]}{bcolors.Endc}')
+  out(f'{bcolors.Green}workspace.{bcolors.Default}Speculative Enabled:     {workspace["speculative-enabled"]}{bcolors.Endc}')
+  out(f'{bcolors.Green}workspace.{bcolors.Default}Global Remote State:     {workspace["global-remote-state"]}{bcolors.Endc}')
+  out(f'{bcolors.Green}workspace.{bcolors.Default}Resources in State:      {workspace["resource-count"]}{bcolors.Endc}')
+  #
+  ## Run data
+  #
+  runBlob = workspace["run-blob"]
+  if runBlob is None:
+    with span(PROFILER, 'runs'):
+      runBlob = callTFE(QUIET, DEBUG, f'{TFE_ADDR}/api/v2/workspaces/{workspace["id"]}/runs?page%5Bsize%5D=1')
+  if len(runBlob["data"]) == 0:
+    out(f'{bcolors.Green}run.{bcolors.BCyan}Last Run:                      {bcolors.BYellow}No runs yet{bcolors.Endc}')
+  else:
+    out(f'{bcolors.Green}run.{bcolors.BCyan}Last Run:                      {bcolors.BCyan}{runBlob["data"][0]["id"]}{bcolors.Endc}')
+    if runBlob["data"][0]["relationships"]["created-by"]["data"]["id"]:
+      out(f'{bcolors.Green}run.{bcolors.BCyan}Created by:                    {bcolors.BBlue}{runBlob["data"][0]["relationships"]["created-by"]["data"]["id"]}{bcolors.Endc}')
+    else:
+      out(f'{bcolors.Green}run.{bcolors.BCyan}Created by:                    {bcolors.BRed}No user found!{bcolors.Endc}')
+
+    # if runBlob["data"][0]["relationships"]["configuration-version"]["data"]["id"]:
+    #   print(f'{bcolors.Green}run.{bcolors.BCyan}Configuration Version:        {bcolors.BBlue}{runBlob["data"][0]["relationships"]["configuration-version"]["data"]["id"]}{bcolors.Endc}')
+    # else:
+    #   print(f'{bcolors.Green}run.{bcolors.BCyan}Configuration Version:        {bcolors.BRed}No configuration version found!{bcolors.Endc}')
+    #
+    ## if we have a configuration that begins with 'cv', hit the API again and get the configuration version data:
+    ##   - as we have a configuration version, get a list of configuration versions and ensure there are at least two
+    ##   - get the previous configuration version
+    ##   - show both configuration versions = get links to the blobs containing the configuration data
+    ##   - get each blob
+    ##   - diff the blobs and output
+
+
+
+
+
+
+    ## outstanding: if there is only one version, then there is no need to do a diff
+
+
+
+
+
+
+
+    #
+    try:
+      if runBlob["data"][0]["relationships"]["configuration-version"]["data"]["id"].startswith("cv-"):
+        ## the list may come from the response cache and be up to its TTL old while the run is always fresh, so a
+        ## list that does not start with the run's version is fetched again before anything is taken as wrong
+        #
+        runCvId = runBlob["data"][0]["relationships"]["configuration-version"]["data"]["id"]
+        with span(PROFILER, 'cv-list'):
+          cvListBlob = callTFE(QUIET, DEBUG, f'{TFE_ADDR}/api/v2/workspaces/{workspace["id"]}/configuration-versions', cacheable=True)
+          if not cvListBlob.get("data") or cvListBlob["data"][0]["id"] != runCvId:
+            cvListBlob = callTFE(QUIET, DEBUG, f'{TFE_ADDR}/api/v2/workspaces/{workspace["id"]}/configuration-versions', cacheable=True, refresh=True)
+
+        if len(cvListBlob) == 0:
+          print(f'{bcolors.BRed}ERROR: Configuration version list blob is empty, but configuration version {runBlob["data"][0]["relationships"]["configuration-version"]["data"]["id"]} detected.{bcolors.Endc}. Exiting here')
+          raise ProbeExit(1)
+        elif len(cvListBlob) == 1:
+          firstCV = True  # see below when we diff the blobs
+        else:
+          multipleCV = True
+    except KeyError:
+      out(f'{bcolors.Green}run.{bcolors.BCyan}Configuration Versions:        {bcolors.BRed}List Not Found{bcolors.Endc}')
+
+    ## --history/--history-since: walk every version in range instead of only the latest two
+    #
+    if multipleCV == True and (history or since is not None):
+      with span(PROFILER, 'cv-list'):
+        versions = configVersionHistory(QUIET, DEBUG, workspace, history, since)
+      if versions:
+        cv0 = versions[0]["id"]
+        cv1 = versions[1]["id"] if len(versions) > 1 else None
+        out(f'{bcolors.Green}run.{bcolors.BCyan}Config Version History:        {bcolors.BBlue}{len(versions)} versions, {versions[-1]["id"]} to {cv0}{bcolors.Endc}')
+      if len(versions) > 1:
+        configHistory = walkHistory(QUIET, DEBUG, workspace, versions, out)
+      else:
+        out(f'{bcolors.Green}config.{bcolors.BCyan}Configuration Changes:      {bcolors.BYellow}Fewer than two versions in range{bcolors.Endc}')
+        configHistory = []
+    elif multipleCV == True:
+      # OK we have >1 configuration versions: get the second one in the array (1) - we already have element 0, but check
+      if runBlob["data"][0]["relationships"]["configuration-version"]["data"]["id"] != cvListBlob["data"][0]["id"]:
+        print(f'{bcolors.BRed}ERROR: Configuration version ({runBlob["data"][0]["relationships"]["configuration-version"]["data"]["id"]}) is different from element 0 in the configuration versions blob ({cvListBlob["data"][0]["id"]}).{bcolors.Endc}. Exiting here')
+        raise ProbeExit(1)
+      cv0 = cvListBlob["data"][0]["id"]
+      cv0download = cvListBlob["data"][0]["links"]["download"]
+      cv1 = cvListBlob["data"][1]["id"]
+      cv1download = cvListBlob["data"][1]["links"]["download"]
+
+      if cv0 and cv0download and cv1 and cv1download:
+        out(f'{bcolors.Green}run.{bcolors.BCyan}Latest Config Version ID:      {bcolors.BBlue}{cv0}{bcolors.Endc}')
+        out(f'{bcolors.Green}run.{bcolors.BCyan}Latest Config Version Path:    {bcolors.BCyan}{cv0download}{bcolors.Endc}')
+        out(f'{bcolors.Green}run.{bcolors.BCyan}Previous Config Version ID:    {bcolors.BBlue}{cv1}{bcolors.Endc}')
+        out(f'{bcolors.Green}run.{bcolors.BCyan}Previous Config Version Path:  {bcolors.BCyan}{cv1download}{bcolors.Endc}')
+
+      ## with the content index, versions already indexed are not downloaded at all and the diff reads the index;
+      ## otherwise diff the tarballs in-process
+      #
+      if CONTENT_INDEX is not None:
+        with span(PROFILER, 'cv-download'):
+          ensureIndexed(QUIET, DEBUG, cv0, cv0tgzPath)
+          ensureIndexed(QUIET, DEBUG, cv1, cv1tgzPath)
+        with span(PROFILER, 'config-diff'):
+          configChanges = runDiff(QUIET, DEBUG, cv0, cv1, "index", out=out, labels=(cv0, cv1))
+      else:
+        with span(PROFILER, 'cv-download'):
+          cv0tgzPath = downloadConfigVersion(QUIET, DEBUG, cv0, cv0tgzPath)
+          cv1tgzPath = downloadConfigVersion(QUIET, DEBUG, cv1, cv1tgzPath)
+        with span(PROFILER, 'config-diff'):
+          configChanges = runDiff(QUIET, DEBUG, cv0tgzPath, cv1tgzPath, out=out, labels=(cv0, cv1))
+
+        try:
+          if CV_CACHE is None:
+            os.remove(cv0tgzPath)
+            os.remove(cv1tgzPath)
+          else:
+            CV_CACHE.release(cv0)
+            CV_CACHE.release(cv1)
+        except Exception as error:
+          print(f'{bcolors.BRed}ERROR: Failed to remove configuration tar files {cv0tgzPath} and {cv1tgzPath}.{bcolors.Endc}. Exiting here')
+          print(error)
+          print(f'{bcolors.Endc}')
+          raise ProbeExit(1)
+
+    try:
+      out(f'{bcolors.Green}run.{bcolors.BCyan}Canceled:                      {bcolors.BYellow}{runBlob["data"][0]["attributes"]["canceled-at"]}{bcolors.Endc}')
+    except KeyError:
+      out(f'{bcolors.Green}run.{bcolors.BCyan}Canceled:                      {bcolors.BCyan}Not canceled{bcolors.Endc}')
+
+    try:
+      out(f'{bcolors.Green}run.{bcolors.BCyan}Created:                       {bcolors.BCyan}{runBlob["data"][0]["attributes"]["created-at"]}{bcolors.Endc}')
+    except KeyError:
+      out(f'{bcolors.Green}run.{bcolors.BCyan}Created:                       {bcolors.BYellow}Not Created{bcolors.Endc}')
+
+    try:
+      out(f'{bcolors.Green}run.{bcolors.BCyan}Plan Queueable:                {bcolors.BCyan}{runBlob["data"][0]["attributes"]["status-timestamps"]["plan-queueable-at"]}{bcolors.Endc}')
+    except KeyError:
+      out(f'{bcolors.Green}run.{bcolors.BCyan}Plan Queueable:                {bcolors.BYellow}Not Queueable{bcolors.Endc}')
+
+    try:
+      out(f'{bcolors.Green}run.{bcolors.BCyan}Plan Queued:                   {bcolors.BCyan}{runBlob["data"][0]["attributes"]["status-timestamps"]["plan-queued-at"]}{bcolors.Endc}')
+    except KeyError:
+      out(f'{bcolors.Green}run.{bcolors.BCyan}Plan Queued:                   {bcolors.BYellow}Not Queued{bcolors.Endc}')
+
+    try:
+      out(f'{bcolors.Green}run.{bcolors.BCyan}Planning:                      {bcolors.BCyan}{runBlob["data"][0]["attributes"]["status-timestamps"]["planning-at"]}{bcolors.Endc}')
+    except KeyError:
+      out(f'{bcolors.Green}run.{bcolors.BCyan}Planning:                      {bcolors.BYellow}Not Planned{bcolors.Endc}')
+
+    try:
+      out(f'{bcolors.Green}run.{bcolors.BCyan}Planned:                       {bcolors.BCyan}{runBlob["data"][0]["attributes"]["status-timestamps"]["planned-at"]}{bcolors.Endc}')
+    except KeyError:
+      out(f'{bcolors.Green}run.{bcolors.BCyan}Planned:                       {bcolors.BYellow}Not Planned{bcolors.Endc}')
+
+    try:
+      out(f'{bcolors.Green}run.{bcolors.BCyan}Apply Queued:                  {bcolors.BCyan}{runBlob["data"][0]["attributes"]["status-timestamps"]["apply-queued-at"]}{bcolors.Endc}')
+    except KeyError:
+      out(f'{bcolors.Green}run.{bcolors.BCyan}Apply Queued:                  {bcolors.BYellow}No Apply Queued{bcolors.Endc}')
+
+    try:
+      out(f'{bcolors.Green}run.{bcolors.BCyan}Applying:                      {bcolors.BCyan}{runBlob["data"][0]["attributes"]["status-timestamps"]["applying-at"]}{bcolors.Endc}')
+    except KeyError:
+      out(f'{bcolors.Green}run.{bcolors.BCyan}Applying:                      {bcolors.BYellow}Not Applied{bcolors.Endc}')
+
+    try:
+      out(f'{bcolors.Green}run.{bcolors.BCyan}Confirmed:                     {bcolors.BCyan}{runBlob["data"][0]["attributes"]["status-timestamps"]["confirmed-at"]}{bcolors.Endc}')
+    except KeyError:
+      out(f'{bcolors.Green}run.{bcolors.BCyan}Confirmed:                     {bcolors.BYellow}Not Confirmed{bcolors.Endc}')
+
+    try:
+      out(f'{bcolors.Green}run.{bcolors.BCyan}Applied:                       {bcolors.BCyan}{runBlob["data"][0]["attributes"]["status-timestamps"]["applied-at"]}')
+    except KeyError:
+      out(f'{bcolors.Green}run.{bcolors.BCyan}Applied:                       {bcolors.BYellow}Not Applied{bcolors.Endc}')
+
+    try:
+      if runBlob["data"][0]["attributes"]["status"] == "applied":
+        out(f'{bcolors.Green}run.{bcolors.BCyan}Status (Outcome):              {bcolors.Default}applied{bcolors.Endc}')
+      else:
+        out(f'{bcolors.Green}run.{bcolors.BCyan}Status (Outcome):              {bcolors.BYellow}{runBlob["data"][0]["attributes"]["status"]}{bcolors.Endc}')
+    except KeyError:
+      out(f'{bcolors.Green}run.{bcolors.BCyan}Status (Outcome):              {bcolors.BRed}UNKNOWN{bcolors.Endc}')
+    #
+    ## If state changed then diff from the previous run - essentially repeat the equivalent from the configuration version diffs from above
+    #
+    try:
+      if workspace["can-read-state-versions"] == "True":
+        #
+        ## Use the State Versions API rather than the workspaces API because it has everything we need for this section in it
+        #
+        with span(PROFILER, 'state-list'):
+          stateVersionsBlob = callTFE(QUIET, DEBUG, f'{TFE_ADDR}/api/v2/state-versions?filter%5Bworkspace%5D%5Bname%5D={key}&filter%5Borganization%5D%5Bname%5D={org}&fields%5Bstate-versions%5D={STATE_VERSION_FIELDS}&page%5Bsize%5D=2', cacheable=True)
+    except KeyError:
+      print(f'{bcolors.BRed}ERROR: Cannot find permission can-read-state-versions yet there is data in /organizations/{org}/workspaces API call. Probably a mishandling in the script. Exiting here')
+      print(error)
+      print(f'{bcolors.Endc}')
+      raise ProbeExit(1)
+
+    ## state data
+    ## if we have a state version that begins with 'sv', hit the API again and get the state version data:
+    ##   - as we have a state version, get a list of state versions and ensure there are at least two
+    ##   - get the previous configuration version
+    ##   - show both configuration versions = get links to the blobs containing the configuration data
+    ##   - get each blob
+    ##   - diff the blobs and output
+    ##   - if there is only one state version in the history, no need to do a diff
+    #
+    try:
+      if stateVersionsBlob["data"][0]["id"] and stateVersionsBlob["data"][0]["id"].startswith("sv-"):
+        out(f'{bcolors.Green}state.{bcolors.BCyan}Latest State Version ID:     {bcolors.BBlue}{stateVersionsBlob["data"][0]["id"]}{bcolors.Endc}')
+        # print(f'{bcolors.Green}state.{bcolors.BCyan}Latest State Version Path:   {bcolors.BCyan}{stateVersionsBlob["data"][0]["attributes"]["hosted-state-download-url"]}{bcolors.Endc}')
+        out(f'{bcolors.Green}state.{bcolors.BCyan}Latest State Version S/N:    {bcolors.BCyan}{stateVersionsBlob["data"][0]["attributes"]["serial"]}{bcolors.Endc}')
+        stateSerial = stateVersionsBlob["data"][0]["attributes"]["serial"]
+    except (KeyError, IndexError):
+        out(f'{bcolors.Green}state.{bcolors.BCyan}Latest Version:              {bcolors.BYellow}No Latest State Version{bcolors.Endc}')
+
+    try:
+      if stateVersionsBlob["data"][1]["id"]:
+        out(f'{bcolors.Green}state.{bcolors.BCyan}Previous State Version ID:   {bcolors.BBlue}{stateVersionsBlob["data"][1]["id"]}{bcolors.Endc}')
+        # print(f'{bcolors.Green}state.{bcolors.BCyan}Previous State Version Path: {bcolors.BCyan}{stateVersionsBlob["data"][1]["attributes"]["hosted-state-download-url"]}{bcolors.Endc}')
+        out(f'{bcolors.Green}state.{bcolors.BCyan}Previous State Version S/N:  {bcolors.BCyan}{stateVersionsBlob["data"][1]["attributes"]["serial"]}{bcolors.Endc}')
+    except (KeyError, IndexError):
+      out(f'{bcolors.Green}state.{bcolors.BCyan}Previous Version:            {bcolors.BYellow}No Previous State Version{bcolors.Endc}')
+
+    ## what changed between the two state versions; nothing to compare with only one
+    #
+    try:
+      sv0 = stateVersionsBlob["data"][0]
+      sv1 = stateVersionsBlob["data"][1]
+    except (KeyError, IndexError):
+      sv1 = None
+
+    if sv1 is not None and stateDiff == 'full':
+      sv0Path = f'{tfeProbeTmpDir0}/{workspace["id"]}-sv0blob.json'
+      sv1Path = f'{tfeProbeTmpDir1}/{workspace["id"]}-sv1blob.json'
+      with span(PROFILER, 'state-download'):
+        callTFE(QUIET, DEBUG, sv0["attributes"]["hosted-state-download-url"], sv0Path)
+        callTFE(QUIET, DEBUG, sv1["attributes"]["hosted-state-download-url"], sv1Path)
+
+      with span(PROFILER, 'state-diff'):
+        stateChanges = runDiff(QUIET, DEBUG, sv0Path, sv1Path, "state", out=out, labels=(sv0["id"], sv1["id"]))
+
+      try:
+        os.remove(sv0Path)
+        os.remove(sv1Path)
+      except Exception as error:
+        print(f'{bcolors.BRed}ERROR: Failed to remove state files {sv0Path} and {sv1Path}.{bcolors.Endc}. Exiting here')
+        print(error)
+        print(f'{bcolors.Endc}')
+        raise ProbeExit(1)
+    elif sv1 is not None and stateDiff == 'summary':
+      if "resources" in sv0["attributes"] and "resources" in sv1["attributes"] and sv0["attributes"].get("resources-processed", True) and sv1["attributes"].get("resources-processed", True):
+        with span(PROFILER, 'state-diff'):
+          stateChanges = runDiff(QUIET, DEBUG, sv0["attributes"]["resources"], sv1["attributes"]["resources"], "summary", out=out, labels=(sv0["id"], sv1["id"]))
+      else:
+        out(f'{bcolors.Green}state.{bcolors.BCyan}State Changes:               {bcolors.BYellow}Resource summary not processed (try --state-diff full){bcolors.Endc}')
+
+  ## how far this workspace has now been probed, for --incremental; the caller records it once the block is printed
+  #
+  if len(runBlob["data"]) > 0:
+    runId = runBlob["data"][0]["id"]
+    cvId  = ((runBlob["data"][0]["relationships"].get("configuration-version") or {}).get("data") or {}).get("id")
+  mark = ( workspace["id"], workspace["latest-change-at"], runId, cvId, stateSerial )
+
+  if fmt == 'ndjson':
+    return ndjsonRecord(workspaceRecord(org, key, workspace, runBlob, cv0, cv1, configChanges, stateVersionsBlob, stateChanges, configHistory)), mark
+  return '\n'.join(lines), mark
+#
+## End Func probeWorkspace
+
 ############################################################################
 #
 # def runReport
@@ -281,7 +966,7 @@ def runDiff(QUIET, DEBUG, tfeProbeTmpDir0, tfeProbeTmpDir1, fileType=False):
 
 ## perform initial tasks such as assess health
 #
-def runReport(QUIET, DEBUG, org):
+def runReport(QUIET, DEBUG, org, jobs=1, stateDiff='summary', incremental=False, fmt='text', history=0, since=None):
   if not QUIET:
     drawLine()
     print(f'{bcolors.Green}TFE.{bcolors.Default}Address:          {bcolors.BWhite}{TFE_ADDR}{bcolors.Endc}')
@@ -291,8 +976,10 @@ def runReport(QUIET, DEBUG, org):
 
   ## Get TFE version and ensure it is recent enough to download config versions
   #
-  releaseBlob = callTFE(QUIET, DEBUG, f'{TFE_ADDR}/api/v2/admin/release')
-  print(f'{bcolors.Green}TFE.{bcolors.Default}Release:          {bcolors.BMagenta}{releaseBlob["release"]}{bcolors.Endc}')
+  with span(PROFILER, 'release'):
+    releaseBlob = callTFE(QUIET, DEBUG, f'{TFE_ADDR}/api/v2/admin/release')
+  if fmt == 'text':
+    print(f'{bcolors.Green}TFE.{bcolors.Default}Release:          {bcolors.BMagenta}{releaseBlob["release"]}{bcolors.Endc}')
   print
   yearMonth = int(releaseBlob["release"][1:7])
   if yearMonth < 202203:
@@ -303,291 +990,422 @@ def runReport(QUIET, DEBUG, org):
 
   ## Initial workspace items
   #
-  workspaces = {}
-  workspaceBlob = callTFE(QUIET, DEBUG, f'{TFE_ADDR}/api/v2/organizations/{org}/workspaces')
-  for array_obj in workspaceBlob["data"]:
-    workspaces[array_obj["attributes"]["name"]] = {
-      'id':                      f'{array_obj["id"]}',
-      'auto-apply':              f'{array_obj["attributes"]["auto-apply"]}',
-      'created-at':              f'{array_obj["attributes"]["created-at"]}',
-      'locked':                  f'{array_obj["attributes"]["locked"]}',
-      'speculative-enabled':     f'{array_obj["attributes"]["speculative-enabled"]}',
-      'terraform-version':       f'{array_obj["attributes"]["terraform-version"]}',
-      'global-remote-state':     f'{array_obj["attributes"]["global-remote-state"]}',
-      'resource-count':          f'{array_obj["attributes"]["resource-count"]}',
-      'can-read-state-versions': f'{array_obj["attributes"]["permissions"]["can-read-state-versions"]}'
-    }
-  for key in sorted(workspaces):
-    if not QUIET:
-      drawLine()
-    print(f'{bcolors.Green}workspace.{bcolors.Default}Name:                    {bcolors.BMagenta}{key}{bcolors.Endc}')
-    print(f'{bcolors.Green}workspace.{bcolors.Default}ID:                      {bcolors.BCyan}{workspaces[key]["id"]}{bcolors.Endc}')
-    print(f'{bcolors.Green}workspace.{bcolors.Default}TF Version:              {workspaces[key]["terraform-version"]}{bcolors.Endc}')
-    print(f'{bcolors.Green}workspace.{bcolors.Default}Created:                 {workspaces[key]["created-at"]}{bcolors.Endc}')
-    if workspaces[key]["locked"] == "True":
-      colour = f'{bcolors.BRed}'
-    else:
-      colour = f'{bcolors.Default}'
-    print(f'{bcolors.Green}workspace.{bcolors.Default}Locked:                  {colour}{workspaces[key]["locked"]}{bcolors.Endc}')
-    print(f'{bcolors.Green}workspace.{bcolors.Default}Speculative Enabled:     {workspaces[key]["speculative-enabled"]}{bcolors.Endc}')
-    print(f'{bcolors.Green}workspace.{bcolors.Default}Global Remote State:     {workspaces[key]["global-remote-state"]}{bcolors.Endc}')
-    print(f'{bcolors.Green}workspace.{bcolors.Default}Resources in State:      {workspaces[key]["resource-count"]}{bcolors.Endc}')
-    #
-    ## Run data
-    #
-    runBlob = callTFE(QUIET, DEBUG, f'{TFE_ADDR}/api/v2/workspaces/{workspaces[key]["id"]}/runs?page%5Bsize%5D=1')
-    if len(runBlob["data"]) == 0:
-      print(f'{bcolors.Green}run.{bcolors.BCyan}Last Run:                      {bcolors.BYellow}No runs yet{bcolors.Endc}')
-    else:
-      print(f'{bcolors.Green}run.{bcolors.BCyan}Last Run:                      {bcolors.BCyan}{runBlob["data"][0]["id"]}{bcolors.Endc}')
-      if runBlob["data"][0]["relationships"]["created-by"]["data"]["id"]:
-        print(f'{bcolors.Green}run.{bcolors.BCyan}Created by:                    {bcolors.BBlue}{runBlob["data"][0]["relationships"]["created-by"]["data"]["id"]}{bcolors.Endc}')
-      else:
-        print(f'{bcolors.Green}run.{bcolors.BCyan}Created by:                    {bcolors.BRed}No user found!{bcolors.Endc}')
+  with span(PROFILER, 'workspace-list'):
+    workspaces = listWorkspaces(QUIET, DEBUG, org)
 
-      # if runBlob["data"][0]["relationships"]["configuration-version"]["data"]["id"]:
-      #   print(f'{bcolors.Green}run.{bcolors.BCyan}Configuration Version:        {bcolors.BBlue}{runBlob["data"][0]["relationships"]["configuration-version"]["data"]["id"]}{bcolors.Endc}')
-      # else:
-      #   print(f'{bcolors.Green}run.{bcolors.BCyan}Configuration Version:        {bcolors.BRed}No configuration version found!{bcolors.Endc}')
-      #
-      ## if we have a configuration that begins with 'cv', hit the API again and get the configuration version data:
-      ##   - as we have a configuration version, get a list of configuration versions and ensure there are at least two
-      ##   - get the previous configuration version
-      ##   - show both configuration versions = get links to the blobs containing the configuration data
-      ##   - get each blob
-      ##   - diff the blobs and output
+  ## incremental: only workspaces whose latest-change-at or latest run has moved since they were last probed
+  #
+  keys = sorted(workspaces)
+  if incremental:
+    keys = [ key for key in keys if WATERMARKS.changed(workspaces[key]["id"], workspaces[key]["latest-change-at"], latestRunId(workspaces[key])) ]
+    if not QUIET:
+      print(f'{bcolors.Green}TFE.{bcolors.Default}Changed:          {bcolors.BWhite}{len(keys)} of {len(workspaces)} workspaces since last probe{bcolors.Endc}')
 
+  ## probe workspaces, --jobs at a time; map() hands results back in submission order so the sorted report
+  ## order is kept however the probes complete.  A workspace is watermarked only once its block has been flushed
+  ## out, and the last marks are committed only when every block has been, so a run that dies part way (a closed
+  ## pipe included) leaves nothing marked as probed that was never reported
+  #
+  from concurrent.futures import ThreadPoolExecutor
 
+  def probe(key):
+    with span(PROFILER, 'probe-workspace', workspace=key):
+      return probeWorkspace(QUIET, DEBUG, org, key, workspaces[key], stateDiff, fmt, history, since)
 
+  executor = ThreadPoolExecutor(max_workers=jobs)
+  try:
+    for block, mark in executor.map(probe, keys):
+      print(block)
+      if WATERMARKS is not None:
+        sys.stdout.flush()
+        WATERMARKS.update(*mark)
+    if WATERMARKS is not None:
+      WATERMARKS.commit()
+  except ProbeExit:
+    executor.shutdown(wait=True, cancel_futures=True)
+    raise
+  finally:
+    executor.shutdown(wait=False, cancel_futures=True)
 
+  if not QUIET:
+    print()
+#
+## End Func runReport
 
+############################################################################
+#
+# def watchRun
+#
+############################################################################
 
-      ## outstanding: if there is only one version, then there is no need to do a diff
+## compare a freshly polled runs blob for workspace key with what was last seen, print any run state change and
+## attestation event straight away, and return whether the workspace needs watching at the active rate.  The first
+## sighting of a workspace only sets the baseline
+#
+def watchRun(org, key, runBlob, seen, fmt='text'):
+  if runBlob is None or len(runBlob["data"]) == 0:
+    current = (None, None)
+  else:
+    current = (runBlob["data"][0]["id"], runBlob["data"][0]["attributes"]["status"])
+  previous  = seen.get(key)
+  seen[key] = current
+
+  runId, status = current
+  if previous is None or previous == current:
+    return status is not None and status not in FINAL_STATUSES
+
+  now = datetime.now().astimezone().isoformat(timespec='seconds')
+  if fmt == 'ndjson':
+    writeRecord({ 'type': 'run-state-change', 'time': now, 'address': TFE_ADDR, 'org': org, 'workspace': key, 'run': runId, 'previous-run': previous[0], 'from': previous[1], 'to': status }, flush=True)
+    if status in ATTESTATION_STATUSES:
+      writeRecord({ 'type': 'attestation', 'time': now, 'address': TFE_ADDR, 'org': org, 'workspace': key, 'run': runId, 'status': status }, flush=True)
+    return True
+
+  if runId != previous[0]:
+    print(f'{bcolors.Green}watch.{bcolors.BCyan}Run State Change:  {bcolors.Default}{now} {bcolors.BMagenta}{key} {bcolors.BCyan}{runId} {bcolors.BYellow}new run {status}{bcolors.Endc}', flush=True)
+  else:
+    print(f'{bcolors.Green}watch.{bcolors.BCyan}Run State Change:  {bcolors.Default}{now} {bcolors.BMagenta}{key} {bcolors.BCyan}{runId} {bcolors.BYellow}{previous[1]} -> {status}{bcolors.Endc}', flush=True)
+  if status in ATTESTATION_STATUSES:
+    print(f'{bcolors.Green}watch.{bcolors.BRed}Attestation:       {bcolors.Default}{now} {bcolors.BMagenta}{key} {bcolors.BCyan}{runId} {bcolors.BRed}{status}{bcolors.Endc}', flush=True)
+  return True
+#
+## End Func watchRun
 
+############################################################################
+#
+# def pollRuns
+#
+############################################################################
 
+## the latest run of one workspace for the watch loop, as (runs blob, HTTP status, None), or (None, HTTP status or
+## None if there was no response, error text) if the call failed.  Unlike callTFE a failure does not exit: one workspace that is deleted or briefly unreachable must not
+## end the watch.  The client has already retried rate limits, 5xx and dropped connections by then
+#
+def pollRuns(DEBUG, workspaceId):
+  path = f'{TFE_ADDR}/api/v2/workspaces/{workspaceId}/runs?page%5Bsize%5D=1'
+  if DEBUG:
+    print(f'{bcolors.Magenta}Calling TFE with {path}{bcolors.Endc}')
+  try:
+    response = TFE_CLIENT.get(path)
+  except Exception as error:
+    return None, None, str(error)
+  with response:
+    if response.status_code >= 400:
+      return None, response.status_code, f'HTTP {response.status_code}'
+    try:
+      return response.json(), response.status_code, None
+    except ValueError as error:
+      return None, response.status_code, f'undecodable response: {error}'
+#
+## End Func pollRuns
 
+############################################################################
+#
+# def watchReport
+#
+############################################################################
 
+## stay resident on the one pooled session and follow the runs of every workspace in org: workspaces with a run in
+## flight are polled every activeInterval seconds, idle ones back off towards maxIdleInterval, and the workspace
+## list is re-read every maxIdleInterval to pick up new workspaces and drop deleted ones.  A poll that fails is
+## reported and the workspace backed off as if idle; a 404 drops it until the list shows it again.  Runs until
+## interrupted
+#
+def watchReport(QUIET, DEBUG, org, jobs=1, activeInterval=ACTIVE_INTERVAL, maxIdleInterval=MAX_IDLE_INTERVAL, fmt='text'):
+  schedule = PollSchedule(activeInterval, IDLE_INTERVAL, maxIdleInterval)
+  seen     = {}
+  ids      = {}
+  nextList = time.monotonic()
+  stream   = sys.stderr if fmt == 'ndjson' else sys.stdout
+
+  ## stop watching a workspace that has gone
+  #
+  def forget(key):
+    ids.pop(key, None)
+    seen.pop(key, None)
+    schedule.remove(key)
 
+  if not QUIET:
+    drawLine()
+    print(f'{bcolors.Green}TFE.{bcolors.Default}Watching:         {bcolors.BWhite}{org} on {TFE_ADDR} (Ctrl-C to stop){bcolors.Endc}')
 
+  from concurrent.futures import ThreadPoolExecutor
 
-      #
-      try:
-        if runBlob["data"][0]["relationships"]["configuration-version"]["data"]["id"].startswith("cv-"):
-          cvListBlob = callTFE(QUIET, DEBUG, f'{TFE_ADDR}/api/v2/workspaces/{workspaces[key]["id"]}/configuration-versions')
-
-          if len(cvListBlob) == 0:
-            print(f'{bcolors.BRed}ERROR: Configuration version list blob is empty, but configuration version {runBlob["data"][0]["relationships"]["configuration-version"]["data"]["id"]} detected.{bcolors.Endc}. Exiting here')
-            handleDirectories(DEBUG, 'delete')
-            exit(1)
-          elif len(cvListBlob) == 1:
-            firstCV = True  # see below when we diff the blobs
-          else:
-            multipleCV = True
-      except KeyError:
-        print(f'{bcolors.Green}run.{bcolors.BCyan}Configuration Versions:        {bcolors.BRed}List Not Found{bcolors.Endc}')
-
-      if multipleCV == True:
-        # OK we have >1 configuration versions: get the second one in the array (1) - we already have element 0, but check
-        if runBlob["data"][0]["relationships"]["configuration-version"]["data"]["id"] != cvListBlob["data"][0]["id"]:
-          print(f'{bcolors.BRed}ERROR: Configuration version ({runBlob["data"][0]["relationships"]["configuration-version"]["data"]["id"]}) is different from element 0 in the configuration versions blob ({cvListBlob["data"][0]["id"]}).{bcolors.Endc}. Exiting here')
-          handleDirectories(DEBUG, 'delete')
-          exit(1)
-        cv0 = cvListBlob["data"][0]["id"]
-        cv0download = cvListBlob["data"][0]["links"]["download"]
-        cv1 = cvListBlob["data"][1]["id"]
-        cv1download = cvListBlob["data"][1]["links"]["download"]
-
-        if cv0 and cv0download and cv1 and cv1download:
-          print(f'{bcolors.Green}run.{bcolors.BCyan}Latest Config Version ID:      {bcolors.BBlue}{cv0}{bcolors.Endc}')
-          print(f'{bcolors.Green}run.{bcolors.BCyan}Latest Config Version Path:    {bcolors.BCyan}{cv0download}{bcolors.Endc}')
-          print(f'{bcolors.Green}run.{bcolors.BCyan}Previous Config Version ID:    {bcolors.BBlue}{cv1}{bcolors.Endc}')
-          print(f'{bcolors.Green}run.{bcolors.BCyan}Previous Config Version Path:  {bcolors.BCyan}{cv1download}{bcolors.Endc}')
-
-        cv0blobDownloadCheck = callTFE(QUIET, DEBUG, f'{TFE_ADDR}/api/v2/configuration-versions/{cv0}/download', cv0tgzPath)
-        if cv0blobDownloadCheck != 'OK':
-          print(f'{bcolors.BRed}ERROR: Download configuration version 0 {cv0} failed.{bcolors.Endc}. Exiting here')
-          handleDirectories(DEBUG, 'delete')
-          exit(1)
-        cv1blobDownloadCheck = callTFE(QUIET, DEBUG, f'{TFE_ADDR}/api/v2/configuration-versions/{cv1}/download', cv1tgzPath)
-        if cv0blobDownloadCheck != 'OK':
-          print(f'{bcolors.BRed}ERROR: Download configuration version 0 {cv0} failed.{bcolors.Endc}. Exiting here')
-          handleDirectories(DEBUG, 'delete')
-          exit(1)
-
-        ## untar both tgz files and diff
-        #
-        try:
-          cv0tgzFH = tarfile.open(cv0tgzPath)
-        except Exception as error:
-          print(f'{bcolors.BRed}ERROR: Failed to open tar file {cv0tgzPath}.{bcolors.Endc}. Exiting here')
-          print(error)
-          print(f'{bcolors.Endc}')
-          handleDirectories(DEBUG, 'delete')
-          exit(1)
-        try:
-          cv1tgzFH = tarfile.open(cv1tgzPath)
-        except Exception as error:
-          print(f'{bcolors.BRed}ERROR: Failed to open tar file {cv1tgzPath}.{bcolors.Endc}. Exiting here')
-          print(error)
-          print(f'{bcolors.Endc}')
-          handleDirectories(DEBUG, 'delete')
-          exit(1)
-
-        ## extract dumps
-        #
-        try:
-          cv0tgzFH.extractall(tfeProbeTmpDir0)
-          cv0tgzFH.close()
-        except FileExistsError as error:
-          print(f'{bcolors.BRed}ERROR: Failed to extract configuration tar file {cv0tgzPath}.{bcolors.Endc}. Exiting here')
-          print(error)
-          print(f'{bcolors.Endc}')
-          handleDirectories(DEBUG, 'delete')
-          exit(1)
+  executor = ThreadPoolExecutor(max_workers=jobs)
+  try:
+    while True:
+      if time.monotonic() >= nextList:
+        workspaces = listWorkspaces(QUIET, DEBUG, org, cacheable=False)
+        for key in [ key for key in ids if key not in workspaces ]:
+          forget(key)
+        for key, workspace in workspaces.items():
+          ids[key] = workspace["id"]
+          schedule.add(key)
+          if workspace["run-blob"] is not None:
+            watchRun(org, key, workspace["run-blob"], seen, fmt)
+        nextList = time.monotonic() + schedule.maxIdleInterval
+
+      due   = [ key for key in schedule.due() if key in ids ]
+      polls = executor.map(lambda key: pollRuns(DEBUG, ids[key]), due)
+      for key, (runBlob, status, error) in zip(due, polls):
+        if error is None:
+          schedule.record(key, watchRun(org, key, runBlob, seen, fmt))
+          continue
+        print(f'{bcolors.BYellow}WARNING: polling {key} failed ({error}){bcolors.Endc}', file=stream, flush=True)
+        if status == 404:
+          forget(key)
+        else:
+          schedule.record(key, False)
 
-        try:
-          cv1tgzFH.extractall(tfeProbeTmpDir1)
-          cv1tgzFH.close()
-        except FileExistsError as error:
-          print(f'{bcolors.BRed}ERROR: Failed to extract configuration tar file {cv1tgzPath}.{bcolors.Endc}. Exiting here')
-          print(error)
-          print(f'{bcolors.Endc}')
-          handleDirectories(DEBUG, 'delete')
-          exit(1)
+      wakeAt = min(schedule.nextDue() or nextList, nextList)
+      time.sleep(max(0, wakeAt - time.monotonic()))
+  except KeyboardInterrupt:
+    if not QUIET:
+      print()
+  finally:
+    executor.shutdown(wait=False, cancel_futures=True)
+#
+## End Func watchReport
 
-        try:
-          os.remove(cv0tgzPath)
-          os.remove(cv1tgzPath)
-        except Exception as error:
-          print(f'{bcolors.BRed}ERROR: Failed to remove configuration tar files {cv0tgzPath} and {cv1tgzPath}.{bcolors.Endc}. Exiting here')
-          print(error)
-          print(f'{bcolors.Endc}')
-          handleDirectories(DEBUG, 'delete')
-          exit(1)
+############################################################################
+#
+# def runsInWindow
+#
+############################################################################
 
-        ## diff dirs
-        #
-        runDiff(QUIET, DEBUG, tfeProbeTmpDir0, tfeProbeTmpDir1)
+## (run, workspace name) for every run in org created from since up to until (None for now), newest first.  The
+## organisation run list is newest first too, so paging stops at the first run older than since; pages are
+## prefetched a pool's worth ahead, so at most that many are read past the end of the window
+#
+def runsInWindow(QUIET, DEBUG, org, since, until=None):
+  def fetch(path):
+    with span(PROFILER, 'run-list'):
+      return callTFE(QUIET, DEBUG, path)
+
+  for page in iterPages(fetch, f'{TFE_ADDR}/api/v2/organizations/{org}/runs?include=workspace&fields%5Brun%5D={SCAN_RUN_FIELDS}&fields%5Bworkspace%5D=name&page%5Bsize%5D=100', TFE_CLIENT.poolSize):
+    names = { obj["id"]: obj["attributes"]["name"] for obj in page.get("included") or [] if obj["type"] == "workspaces" }
+    for run in page.get("data") or []:
+      createdAt = parseStamp(run["attributes"].get("created-at"))
+      if createdAt is not None and createdAt < since:
+        return
+      if createdAt is not None and until is not None and createdAt >= until:
+        continue
+      workspaceId = (((run.get("relationships") or {}).get("workspace") or {}).get("data") or {}).get("id")
+      yield run, names.get(workspaceId, workspaceId)
+#
+## End Func runsInWindow
 
-        ## empty dirs in case we diff state versions below
-        #
-        for dir in [ tfeProbeTmpDir0, tfeProbeTmpDir1 ]:
-          try:
-            if DEBUG:
-              drawLine()
-              print(f'{bcolors.Magenta}Emptying temporary directory: {dir}{bcolors.Endc}')
-            for root, dirs, files in os.walk(dir):
-              for file in files:
-                  os.remove(os.path.join(root, file))
-          except OSError as error:
-            print()
-            print(f'{bcolors.BRed}ERROR: failed to empty temporary dir {emptyPath}:{bcolors.Endc}')
-            print(error)
-            handleDirectories(DEBUG, 'delete')
-            exit(1)
+############################################################################
+#
+# def scanRun
+#
+############################################################################
 
-      try:
-        print(f'{bcolors.Green}run.{bcolors.BCyan}Canceled:                      {bcolors.BYellow}{runBlob["data"][0]["attributes"]["canceled-at"]}{bcolors.Endc}')
-      except KeyError:
-        print(f'{bcolors.Green}run.{bcolors.BCyan}Canceled:                      {bcolors.BCyan}Not canceled{bcolors.Endc}')
+## the override records of one policy-checked run: its policy checks, and its run events only if one was overridden
+#
+def scanRun(QUIET, DEBUG, run, workspace):
+  with span(PROFILER, 'policy-checks'):
+    policyChecks = callTFE(QUIET, DEBUG, f'{TFE_ADDR}/api/v2/runs/{run["id"]}/policy-checks')
+  events = []
+  if overriddenChecks(policyChecks):
+    with span(PROFILER, 'run-events'):
+      events = overrideEvents(callTFE(QUIET, DEBUG, f'{TFE_ADDR}/api/v2/runs/{run["id"]}/run-events?include=actor%2Ccomment'))
+  return overrideRecords(run, workspace, policyChecks, events)
+#
+## End Func scanRun
 
-      try:
-        print(f'{bcolors.Green}run.{bcolors.BCyan}Created:                       {bcolors.BCyan}{runBlob["data"][0]["attributes"]["created-at"]}{bcolors.Endc}')
-      except KeyError:
-        print(f'{bcolors.Green}run.{bcolors.BCyan}Created:                       {bcolors.BYellow}Not Created{bcolors.Endc}')
+############################################################################
+#
+# def scanReport
+#
+############################################################################
 
-      try:
-        print(f'{bcolors.Green}run.{bcolors.BCyan}Plan Queueable:                {bcolors.BCyan}{runBlob["data"][0]["attributes"]["status-timestamps"]["plan-queueable-at"]}{bcolors.Endc}')
-      except KeyError:
-        print(f'{bcolors.Green}run.{bcolors.BCyan}Plan Queueable:                {bcolors.BYellow}Not Queueable{bcolors.Endc}')
+## attest every Sentinel policy override in org between since and until: walk the organisation's runs in the
+## window and check the policy-checked ones, --jobs at a time, streaming out one record (or line) per override in
+## run order as soon as it is known, then the totals.  Only a bounded window of runs is in flight, so memory does
+## not grow with the length of the time window
+#
+def scanReport(QUIET, DEBUG, org, since, until=None, jobs=1, fmt='text'):
+  from collections import deque
+  from concurrent.futures import ThreadPoolExecutor
 
-      try:
-        print(f'{bcolors.Green}run.{bcolors.BCyan}Plan Queued:                   {bcolors.BCyan}{runBlob["data"][0]["attributes"]["status-timestamps"]["plan-queued-at"]}{bcolors.Endc}')
-      except KeyError:
-        print(f'{bcolors.Green}run.{bcolors.BCyan}Plan Queued:                   {bcolors.BYellow}Not Queued{bcolors.Endc}')
+  if not QUIET:
+    drawLine()
+    print(f'{bcolors.Green}TFE.{bcolors.Default}Address:          {bcolors.BWhite}{TFE_ADDR}{bcolors.Endc}')
+    print(f'{bcolors.Green}TFE.{bcolors.Default}Scanning:         {bcolors.BWhite}{org} runs from {since.isoformat()} to {until.isoformat() if until else "now"}{bcolors.Endc}')
 
-      try:
-        print(f'{bcolors.Green}run.{bcolors.BCyan}Planning:                      {bcolors.BCyan}{runBlob["data"][0]["attributes"]["status-timestamps"]["planning-at"]}{bcolors.Endc}')
-      except KeyError:
-        print(f'{bcolors.Green}run.{bcolors.BCyan}Planning:                      {bcolors.BYellow}Not Planned{bcolors.Endc}')
+  totals = { 'runs': 0, 'policy-checked': 0, 'overrides': 0 }
 
-      try:
-        print(f'{bcolors.Green}run.{bcolors.BCyan}Planned:                       {bcolors.BCyan}{runBlob["data"][0]["attributes"]["status-timestamps"]["planned-at"]}{bcolors.Endc}')
-      except KeyError:
-        print(f'{bcolors.Green}run.{bcolors.BCyan}Planned:                       {bcolors.BYellow}Not Planned{bcolors.Endc}')
+  def emit(records):
+    for record in records:
+      totals['overrides'] += 1
+      if fmt == 'ndjson':
+        writeRecord(dict({ 'type': record['type'], 'address': TFE_ADDR, 'org': org }, **record), flush=True)
+      else:
+        print(f'{bcolors.Green}scan.{bcolors.BRed}Override:          {bcolors.Default}{record["overridden-at"]} {bcolors.BMagenta}{record["workspace"]} {bcolors.BCyan}{record["run"]} {record["policy-check"]}'
+              f' {bcolors.BYellow}{record["soft-failed"]} soft failed{bcolors.Default}, overridden by {bcolors.BWhite}{record["overridden-by"] or "unknown"}{bcolors.Endc}'
+              + (f' {bcolors.Default}"{record["comment"]}"{bcolors.Endc}' if record["comment"] else ''), flush=True)
 
-      try:
-        print(f'{bcolors.Green}run.{bcolors.BCyan}Apply Queued:                  {bcolors.BCyan}{runBlob["data"][0]["attributes"]["status-timestamps"]["apply-queued-at"]}{bcolors.Endc}')
-      except KeyError:
-        print(f'{bcolors.Green}run.{bcolors.BCyan}Apply Queued:                  {bcolors.BYellow}No Apply Queued{bcolors.Endc}')
+  executor = ThreadPoolExecutor(max_workers=jobs)
+  window   = deque()
+  try:
+    for run, workspace in runsInWindow(QUIET, DEBUG, org, since, until):
+      totals['runs'] += 1
+      if not policyChecked(run):
+        continue
+      totals['policy-checked'] += 1
+      window.append(executor.submit(scanRun, QUIET, DEBUG, run, workspace))
+      if len(window) >= 2 * jobs:
+        emit(window.popleft().result())
+    while window:
+      emit(window.popleft().result())
+  except ProbeExit:
+    executor.shutdown(wait=True, cancel_futures=True)
+    raise
+  finally:
+    executor.shutdown(wait=False, cancel_futures=True)
+
+  if fmt == 'ndjson':
+    writeRecord({ 'type': 'scan-totals', 'address': TFE_ADDR, 'org': org, 'since': since.isoformat(), 'until': until.isoformat() if until else None, **totals })
+  else:
+    print(f'{bcolors.Green}scan.{bcolors.BCyan}Totals:            {bcolors.BWhite}{totals["runs"]} runs, {totals["policy-checked"]} policy checked, {totals["overrides"]} overridden{bcolors.Endc}')
+#
+## End Func scanReport
 
-      try:
-        print(f'{bcolors.Green}run.{bcolors.BCyan}Applying:                      {bcolors.BCyan}{runBlob["data"][0]["attributes"]["status-timestamps"]["applying-at"]}{bcolors.Endc}')
-      except KeyError:
-        print(f'{bcolors.Green}run.{bcolors.BCyan}Applying:                      {bcolors.BYellow}Not Applied{bcolors.Endc}')
+############################################################################
+#
+# def latencyReport
+#
+############################################################################
 
-      try:
-        print(f'{bcolors.Green}run.{bcolors.BCyan}Confirmed:                     {bcolors.BCyan}{runBlob["data"][0]["attributes"]["status-timestamps"]["confirmed-at"]}{bcolors.Endc}')
-      except KeyError:
-        print(f'{bcolors.Green}run.{bcolors.BCyan}Confirmed:                     {bcolors.BYellow}Not Confirmed{bcolors.Endc}')
+## queue wait, plan and apply times of every run in org between since and until, as p50/p95/p99 seconds org-wide
+## and per workspace: the runs' status timestamps are gathered into columns as the run list streams in and
+## summarised with NumPy in one pass at the end (see hc_tfe/runlatency.py)
+#
+def latencyReport(QUIET, DEBUG, org, since, until=None, fmt='text'):
+  if not QUIET:
+    drawLine()
+    print(f'{bcolors.Green}TFE.{bcolors.Default}Address:          {bcolors.BWhite}{TFE_ADDR}{bcolors.Endc}')
+    print(f'{bcolors.Green}TFE.{bcolors.Default}Run latency:      {bcolors.BWhite}{org} runs from {since.isoformat()} to {until.isoformat() if until else "now"}{bcolors.Endc}')
+
+  timings = RunTimings()
+  for run, workspace in runsInWindow(QUIET, DEBUG, org, since, until):
+    timings.add(run, workspace)
+  with span(PROFILER, 'latency-summary'):
+    summary = timings.summary()
+
+  if fmt == 'ndjson':
+    for record in summary['workspaces']:
+      writeRecord({ 'type': 'latency-workspace', 'address': TFE_ADDR, 'org': org, **record })
+    writeRecord({ 'type': 'latency', 'address': TFE_ADDR, 'org': org, 'since': since.isoformat(), 'until': until.isoformat() if until else None, 'runs': summary['runs'], 'stages': summary['stages'] })
+    return
+
+  seconds = lambda value: '-' if value is None else f'{value:.0f}'
+  print(f'{bcolors.Green}latency.{bcolors.BCyan}Runs:             {bcolors.BWhite}{summary["runs"]} in {len(summary["workspaces"])} workspaces{bcolors.Endc}')
+  print(f'{bcolors.BWhite}{"stage":<18} {"runs":>8} {"p50 s":>8} {"p95 s":>8} {"p99 s":>8} {"mean s":>8} {"max s":>8}{bcolors.Endc}')
+  for stage, row in summary['stages'].items():
+    print(f'{bcolors.BCyan}{stage:<18}{bcolors.Endc} {row["runs"]:>8} {seconds(row["p50"]):>8} {seconds(row["p95"]):>8} {seconds(row["p99"]):>8} {seconds(row["mean"]):>8} {seconds(row["max"]):>8}')
+  print()
+  print(f'{bcolors.BWhite}{"workspace":<40} {"runs":>6}' + ''.join(f' {stage + " p50/95/99 s":>28}' for stage in STAGES) + f'{bcolors.Endc}')
+  for record in summary['workspaces']:
+    print(f'{bcolors.BMagenta}{record["workspace"]:<40}{bcolors.Endc} {record["runs"]:>6}'
+          + ''.join(f' {"/".join(seconds(record[stage][f"p{p}"]) for p in (50, 95, 99)):>28}' for stage in STAGES))
+#
+## End Func latencyReport
 
-      try:
-        print(f'{bcolors.Green}run.{bcolors.BCyan}Applied:                       {bcolors.BCyan}{runBlob["data"][0]["attributes"]["status-timestamps"]["applied-at"]}')
-      except KeyError:
-        print(f'{bcolors.Green}run.{bcolors.BCyan}Applied:                       {bcolors.BYellow}Not Applied{bcolors.Endc}')
+############################################################################
+#
+# def targetReport
+#
+############################################################################
 
-      try:
-        if runBlob["data"][0]["attributes"]["status"] == "applied":
-          print(f'{bcolors.Green}run.{bcolors.BCyan}Status (Outcome):              {bcolors.Default}applied{bcolors.Endc}')
-        else:
-          print(f'{bcolors.Green}run.{bcolors.BCyan}Status (Outcome):              {bcolors.BYellow}{runBlob["data"][0]["attributes"]["status"]}{bcolors.Endc}')
-      except KeyError:
-        print(f'{bcolors.Green}run.{bcolors.BCyan}Status (Outcome):              {bcolors.BRed}UNKNOWN{bcolors.Endc}')
-      #
-      ## If state changed then diff from the previous run - essentially repeat the equivalent from the configuration version diffs from above
+## run this probe once per target, parallel targets at a time, each as a child process with its own --jobs, and
+## merge the results: every target's report in targets file order, then a result line (or record) per target and
+## the totals.  With --watch the children's events stream straight through.  Returns whether every target succeeded
+#
+def targetReport(QUIET, targets, parallel=PARALLEL_TARGETS, fmt='text', watch=False):
+  command   = scriptCommand(__file__, ('-t', '--targets', '--parallel-targets', '-o', '--org'))
+  results   = []
+  succeeded = True
+
+  for result in fanOut(command, targets, parallel, capture=not watch):
+    target = result['target']
+    result['workspaces'] = 0
+    if fmt == 'ndjson':
+      ## records pass through; anything else is a failing child's error text, kept off stdout
       #
-      try:
-        if workspaces[key]["can-read-state-versions"] == "True":
-          #
-          ## Use the State Versions API rather than the workspaces API because it has everything we need for this section in it
-          #
-          stateVersionsBlob = callTFE(QUIET, DEBUG, f'{TFE_ADDR}/api/v2/state-versions?filter%5Bworkspace%5D%5Bname%5D={key}&filter%5Borganization%5D%5Bname%5D={org}')
-      except KeyError:
-        print(f'{bcolors.BRed}ERROR: Cannot find permission can-read-state-versions yet there is data in /organizations/{org}/workspaces API call. Probably a mishandling in the script. Exiting here')
-        print(error)
-        print(f'{bcolors.Endc}')
-        handleDirectories(DEBUG, 'delete')
-        exit(1)
+      for line in result['output'].splitlines():
+        if line.startswith('{'):
+          print(line)
+          result['workspaces'] += line.startswith('{"type":"workspace"')
+        elif line.strip():
+          print(line, file=sys.stderr)
+      sys.stdout.flush()
+    elif not watch:
+      result['workspaces'] = result['output'].count(f'workspace.{bcolors.Default}Name:')
+      if not QUIET:
+        drawLine()
+        print(f'{bcolors.Green}target.{bcolors.Default}Organisation:        {bcolors.BMagenta}{target.org}{bcolors.Default} on {bcolors.BWhite}{target.address}{bcolors.Endc}')
+      print(result['output'], end='', flush=True)
+    results.append(result)
+    succeeded = succeeded and result['exit'] == 0
+
+  if fmt == 'ndjson':
+    for result in results:
+      writeRecord({ 'type': 'target', 'address': result['target'].address, 'org': result['target'].org, 'exit': result['exit'], 'seconds': round(result['seconds'], 3), 'workspaces': result['workspaces'] })
+    writeRecord({ 'type': 'targets-totals', 'targets': len(results), 'failed': sum(1 for result in results if result['exit'] != 0), 'workspaces': sum(result['workspaces'] for result in results) })
+    return succeeded
+
+  drawLine()
+  for result in results:
+    colour = bcolors.Default if result['exit'] == 0 else bcolors.BRed
+    print(f'{bcolors.Green}target.{bcolors.Default}Result:              {bcolors.BMagenta}{result["target"].org:<24}{bcolors.BWhite}{result["target"].address:<40}{colour}exit {result["exit"]:<4}{bcolors.Endc}{result["workspaces"]:6} workspaces {result["seconds"]:8.1f}s')
+  print(f'{bcolors.BYellow}Targets: {len(results)}, failed: {sum(1 for result in results if result["exit"] != 0)}, workspaces: {sum(result["workspaces"] for result in results)}{bcolors.Endc}')
+  return succeeded
+#
+## End Func targetReport
 
-      ## state data
-      ## if we have a state version that begins with 'sv', hit the API again and get the state version data:
-      ##   - as we have a state version, get a list of state versions and ensure there are at least two
-      ##   - get the previous configuration version
-      ##   - show both configuration versions = get links to the blobs containing the configuration data
-      ##   - get each blob
-      ##   - diff the blobs and output
-      ##   - if there is only one state version in the history, no need to do a diff
-      #
-      try:
-        if stateVersionsBlob["data"][0]["id"] and stateVersionsBlob["data"][0]["id"].startswith("sv-"):
-          print(f'{bcolors.Green}state.{bcolors.BCyan}Latest State Version ID:     {bcolors.BBlue}{stateVersionsBlob["data"][0]["id"]}{bcolors.Endc}')
-          # print(f'{bcolors.Green}state.{bcolors.BCyan}Latest State Version Path:   {bcolors.BCyan}{stateVersionsBlob["data"][0]["attributes"]["hosted-state-download-url"]}{bcolors.Endc}')
-          print(f'{bcolors.Green}state.{bcolors.BCyan}Latest State Version S/N:    {bcolors.BCyan}{stateVersionsBlob["data"][0]["attributes"]["serial"]}{bcolors.Endc}')
-      except KeyError:
-          print(f'{bcolors.Green}state.{bcolors.BCyan}Latest Version:              {bcolors.BYellow}No Latest State Version{bcolors.Endc}')
+############################################################################
+#
+# def writeProfile
+#
+############################################################################
 
-      try:
-        if stateVersionsBlob["data"][1]["id"]:
-          print(f'{bcolors.Green}state.{bcolors.BCyan}Previous State Version ID:   {bcolors.BBlue}{stateVersionsBlob["data"][1]["id"]}{bcolors.Endc}')
-          # print(f'{bcolors.Green}state.{bcolors.BCyan}Previous State Version Path: {bcolors.BCyan}{stateVersionsBlob["data"][1]["attributes"]["hosted-state-download-url"]}{bcolors.Endc}')
-          print(f'{bcolors.Green}state.{bcolors.BCyan}Previous State Version S/N:  {bcolors.BCyan}{stateVersionsBlob["data"][1]["attributes"]["serial"]}{bcolors.Endc}')
-      except KeyError:
-        print(f'{bcolors.Green}state.{bcolors.BCyan}Previous Version:            {bcolors.BYellow}No Previous State Version{bcolors.Endc}')
+## print the per-endpoint and per-phase timing table and write the trace file; registered with atexit so that a
+## --watch run stopped with SIGTERM still reports.  With ndjson the table goes to stderr to keep stdout parseable
+#
+def writeProfile(path, fmt='text'):
+  stream = sys.stderr if fmt == 'ndjson' else sys.stdout
+  print(file=stream)
+  for line in summaryLines(PROFILER):
+    print(line, file=stream)
+  try:
+    PROFILER.write(path)
+    print(f'\nProfile written to {path}', file=stream)
+  except OSError as error:
+    print(f'{bcolors.BRed}ERROR: Failed to write profile {path}: {error}{bcolors.Endc}', file=stream)
+#
+## End Func writeProfile
 
-  if not QUIET:
-    print()
+############################################################################
 #
-## End Func runReport
+# def parseDate
+#
+############################################################################
+
+## the ISO 8601 date given to option, UTC unless it says otherwise
+#
+def parseDate(option, text):
+  try:
+    date = datetime.fromisoformat(text.replace('Z', '+00:00'))
+  except ValueError:
+    print(f'{bcolors.BRed}ERROR: {option} {text} is not an ISO 8601 date{bcolors.Endc}')
+    exit(1)
+  if date.tzinfo is None:
+    date = date.replace(tzinfo=timezone.utc)
+  return date
+#
+## End Func parseDate
 
 ############################################################################
 #
@@ -609,41 +1427,68 @@ def main():
     global TFE_ADDR
     global TFE_TOKEN
     global TFE_CACERT
-
-    ## check env vars
-    #
-    if TFE_ADDR is None:
-      print(f'{bcolors.BRed}ERROR: Please export TFE_ADDR as an environment variable in the form https://dev-tfe.mydomain.com{bcolors.Endc}')
-      exit(1)
-
-    if not TFE_ADDR.startswith('https://') and not TFE_ADDR.startswith('http://'):
-      TFE_ADDR = 'https://'+TFE_ADDR
-
-    if TFE_TOKEN is None:
-      print(f'{bcolors.BRed}ERROR: Please export TFE_TOKEN as an environment variable{bcolors.Endc}')
-      exit(1)
-
-    if TFE_CACERT is None:
-      print(f'{bcolors.BRed}ERROR: Please export local path to TFE_CACERT as an environment variable{bcolors.Endc}')
-      exit(1)
+    global TFE_CLIENT
+    global CV_CACHE
+    global RESPONSE_CACHE
+    global WORK_ROOT
+    global WATERMARKS
+    global CONTENT_INDEX
+    global PROFILER
 
     ## create parser
     #
     parser = argparse.ArgumentParser(
         description=f'HashiCorp Terraform Enterprise probe, for convenient iteration of enterprise namespaces for rudimentary reporting',
-        formatter_class=lambda prog: argparse.HelpFormatter(prog,max_help_position=80, width=130)
+        formatter_class=lambda prog: argparse.HelpFormatter(prog,max_help_position=80, width=130),
+        allow_abbrev=False
     )
     optional = parser._action_groups.pop()
 
     org   = parser.add_argument_group('Handle TFE organisations')
     quiet = parser.add_argument_group('Hide dressing for better pipeline work')
     debug = parser.add_argument_group('Add outputs of debug information')
+    perf  = parser.add_argument_group('Tune API performance')
+    cache = parser.add_argument_group('Cache configuration versions and list responses between runs')
+    state = parser.add_argument_group('Compare state versions')
+    work  = parser.add_argument_group('Place the temporary work area')
+    incr  = parser.add_argument_group('Probe only what changed since the last run')
+    watch = parser.add_argument_group('Stay resident and follow runs as they happen')
+    fan   = parser.add_argument_group('Probe several organisations and TFE instances in one run')
+    hist  = parser.add_argument_group('Walk the configuration version history')
+    scan  = parser.add_argument_group('Attest every Sentinel policy override, or measure run latency, over a time window')
 
     ## add arguments to the parser
     #
-    org.add_argument('-o', '--org', type=str, help='Specify the organisation in TFE to use')
+    org.add_argument('-o', '--org', type=str, default=os.getenv('TFE_ORG'), help='Specify the organisation in TFE to use; also TFE_ORG')
     quiet.add_argument('-q', '--quiet',         action='store_true', help='Hide extraneous output')
+    quiet.add_argument('-f', '--format',        choices=FORMATS, default='text', help='Coloured text report, or one compact JSON record per workspace (per event with --watch) with no dressing (default text)')
     debug.add_argument('-d', '--debug',         action='store_true', help='Output debug output')
+    perf.add_argument('-p', '--pool-size',      type=int, default=POOL_SIZE, help=f'Number of keep-alive connections to pool (default {POOL_SIZE})')
+    perf.add_argument('-j', '--jobs',           type=int, default=1, help='Number of workspaces to probe concurrently (default 1)')
+    perf.add_argument('-r', '--rate',           type=float, default=RATE, help=f'Maximum API requests per second, 0 to pace only on the rate limit headers (default {RATE})')
+    perf.add_argument('--profile',              type=str, nargs='?', const=PROFILE_FILE, metavar='FILE', help=f'Time every API call and phase, print p50/p95 per endpoint and phase at exit and write a Chrome trace, or OpenMetrics for a .prom/.om/.txt FILE (default {PROFILE_FILE})')
+    perf.add_argument('--retries',              type=int, default=MAX_RETRIES, help=f'Retries for rate limited (429), 5xx or dropped requests (default {MAX_RETRIES})')
+
+    cache.add_argument('--cache-dir',           type=str, default=CACHE_DIR, help=f'Directory for downloaded configuration versions (default {CACHE_DIR})')
+    cache.add_argument('--cache-size',          type=int, default=CACHE_SIZE_MB, help=f'Cache size cap in MB, least recently used evicted first (default {CACHE_SIZE_MB})')
+    cache.add_argument('--no-cache',            action='store_true', help='Download every configuration version and keep nothing')
+    cache.add_argument('--cache-ttl',           type=int, default=TTL, help=f'Seconds to reuse list responses that carry no ETag/Last-Modified (default {TTL})')
+    cache.add_argument('--no-response-cache',   action='store_true', help='Always fetch list responses in full')
+    cache.add_argument('--content-index',       action='store_true', help=f'Diff configuration versions from a content-hash index kept in --cache-dir/{INDEX_FILE} rather than from their tarballs; slower on a cold index, then only new versions are downloaded')
+    cache.add_argument('--content-index-size',  type=int, default=INDEX_SIZE_MB, help=f'Content index size cap in MB, versions indexed longest ago dropped first (default {INDEX_SIZE_MB})')
+    work.add_argument('-w', '--work-root',      type=str, default=WORK_ROOT, help=f'Directory to make this run\'s private work dir in, e.g. /dev/shm for tmpfs; also TFE_PROBE_WORK_ROOT (default {WORK_ROOT})')
+    incr.add_argument('-i', '--incremental',    action='store_true', help=f'Skip workspaces with no new change or run since they were last probed (watermarks kept in --cache-dir/{WATERMARK_FILE})')
+    watch.add_argument('--watch',               action='store_true', help='Poll workspaces for run state changes and attestation events until interrupted, instead of reporting once')
+    watch.add_argument('--watch-active',        type=float, default=ACTIVE_INTERVAL, help=f'Seconds between polls of a workspace with a run in flight (default {ACTIVE_INTERVAL})')
+    watch.add_argument('--watch-idle-max',      type=float, default=MAX_IDLE_INTERVAL, help=f'Longest gap in seconds between polls of an idle workspace, and between re-reads of the workspace list (default {MAX_IDLE_INTERVAL})')
+    fan.add_argument('-t', '--targets',         type=str, metavar='FILE', help='File of "address org [token-variable [ca-bundle]]" lines to probe instead of TFE_ADDR/-o, each as its own process with these options; tokens are read from the named variables (default TFE_TOKEN)')
+    fan.add_argument('--parallel-targets',      type=int, default=PARALLEL_TARGETS, help=f'Targets probed at once; --jobs applies within each target (default {PARALLEL_TARGETS})')
+    hist.add_argument('--history',              type=int, default=0, metavar='N', help='Diff each of the latest N configuration versions against the one before it, oldest first, instead of only the latest two')
+    hist.add_argument('--history-since',        type=str, metavar='DATE', help='Walk every configuration version uploaded since DATE (ISO 8601, UTC unless given), capped by --history if also given')
+    scan.add_argument('--scan-since',           type=str, metavar='DATE', help='Instead of the workspace report, check every run in the organisation created since DATE (ISO 8601, UTC unless given) and report each overridden policy check, who overrode it and their comment')
+    scan.add_argument('--scan-until',           type=str, metavar='DATE', help='End the --scan-since window at DATE rather than now')
+    scan.add_argument('--latency',              action='store_true', help='Report queue wait, plan and apply time p50/p95/p99 per workspace and org-wide for the runs in the --scan-since window, instead of overrides; needs NumPy')
+    state.add_argument('-s', '--state-diff',    choices=STATE_DIFF_MODES, default='summary', help='Compare the latest two state versions by their resource summaries, by downloading and diffing both state files, or not at all (default summary)')
 
     parser._action_groups.append(optional)
 
@@ -651,7 +1496,41 @@ def main():
     #
     arg = parser.parse_args()
 
-    if arg.quiet:
+    ## several targets: re-run per target and merge, no env vars or -o needed here
+    #
+    if arg.targets:
+      if isTargetChild():
+        print(f'{bcolors.BRed}ERROR: --targets given to a probe already running for one target; not fanning out again{bcolors.Endc}')
+        exit(1)
+      if arg.profile:
+        print(f'{bcolors.BRed}ERROR: --profile profiles a single target; run it without --targets{bcolors.Endc}')
+        exit(1)
+      try:
+        targets = loadTargets(arg.targets)
+      except (OSError, ValueError) as error:
+        print(f'{bcolors.BRed}ERROR: Failed to load targets: {error}{bcolors.Endc}')
+        exit(1)
+      signal.signal(signal.SIGTERM, lambda signum, frame: exit(1))
+      exit(0 if targetReport(arg.quiet or arg.format == 'ndjson', targets, arg.parallel_targets, arg.format, arg.watch) else 1)
+
+    ## check env vars; after parsing so that --help works without them
+    #
+    if TFE_ADDR is None:
+      print(f'{bcolors.BRed}ERROR: Please export TFE_ADDR as an environment variable in the form https://dev-tfe.mydomain.com{bcolors.Endc}')
+      exit(1)
+
+    if not TFE_ADDR.startswith('https://') and not TFE_ADDR.startswith('http://'):
+      TFE_ADDR = 'https://'+TFE_ADDR
+
+    if TFE_TOKEN is None:
+      print(f'{bcolors.BRed}ERROR: Please export TFE_TOKEN as an environment variable{bcolors.Endc}')
+      exit(1)
+
+    if TFE_CACERT is None:
+      print(f'{bcolors.BRed}ERROR: Please export local path to TFE_CACERT as an environment variable{bcolors.Endc}')
+      exit(1)
+
+    if arg.quiet or arg.format == 'ndjson':
       QUIET = True
     else:
       QUIET = False
@@ -667,11 +1546,125 @@ def main():
       print(f'{bcolors.BRed}ERROR: Please supply an org name with -o{bcolors.Endc}')
       exit(1)
 
-    ## handle temporary directories and call
+    if arg.jobs < 1:
+      print(f'{bcolors.BRed}ERROR: --jobs must be at least 1{bcolors.Endc}')
+      exit(1)
+
+    since = None
+    if arg.history_since:
+      since = parseDate('--history-since', arg.history_since)
+    if arg.history < 0 or arg.history == 1:
+      print(f'{bcolors.BRed}ERROR: --history needs at least 2 versions to compare{bcolors.Endc}')
+      exit(1)
+
+    scanSince = None
+    scanUntil = None
+    if arg.scan_since:
+      if arg.watch:
+        print(f'{bcolors.BRed}ERROR: --scan-since scans a past window; it cannot be combined with --watch{bcolors.Endc}')
+        exit(1)
+      scanSince = parseDate('--scan-since', arg.scan_since)
+    if arg.scan_until:
+      if scanSince is None:
+        print(f'{bcolors.BRed}ERROR: --scan-until needs --scan-since{bcolors.Endc}')
+        exit(1)
+      scanUntil = parseDate('--scan-until', arg.scan_until)
+    if arg.latency:
+      if scanSince is None:
+        print(f'{bcolors.BRed}ERROR: --latency needs --scan-since{bcolors.Endc}')
+        exit(1)
+      try:
+        import numpy
+      except ImportError:
+        print(f'{bcolors.BRed}ERROR: --latency needs NumPy; pip install numpy{bcolors.Endc}')
+        exit(1)
+
+    if arg.profile:
+      PROFILER = Profiler()
+      atexit.register(writeProfile, arg.profile, arg.format)
+
+    ## one pooled session for every call made by this run; at least one connection per job so none are churned
+    #
+    try:
+      TFE_CLIENT = TFEClient(TFE_TOKEN, TFE_CACERT, max(arg.pool_size, arg.jobs), RateLimiter(arg.rate, arg.retries), PROFILER)
+    except Exception as e:
+      print(f'{bcolors.BRed}ERROR: Failed to load TFE_CACERT {TFE_CACERT}:')
+      print(e)
+      print(f'{bcolors.Endc}')
+      exit(1)
+
+    if not arg.no_cache:
+      try:
+        CV_CACHE = ConfigVersionCache(arg.cache_dir, arg.cache_size * 1024 * 1024)
+      except OSError as error:
+        print(f'{bcolors.BRed}ERROR: Failed to open configuration version cache {arg.cache_dir}:')
+        print(error)
+        print(f'{bcolors.Endc}')
+        exit(1)
+
+    if not arg.no_response_cache:
+      try:
+        RESPONSE_CACHE = ResponseCache(f'{arg.cache_dir}/responses', TFE_TOKEN, arg.cache_ttl)
+      except OSError as error:
+        print(f'{bcolors.BRed}ERROR: Failed to open response cache {arg.cache_dir}/responses:')
+        print(error)
+        print(f'{bcolors.Endc}')
+        exit(1)
+
+    ## workspace reports record watermarks so that a later --incremental run has something to compare against;
+    ## --watch and --scan-since never read or write them, and with --no-cache nothing is kept unless --incremental
+    ## asks for it
+    #
+    if arg.incremental or (not arg.no_cache and not arg.watch and scanSince is None):
+      try:
+        os.makedirs(arg.cache_dir, mode=0o700, exist_ok=True)
+        WATERMARKS = WatermarkStore(f'{arg.cache_dir}/{WATERMARK_FILE}', TFE_ADDR, org)
+      except Exception as error:
+        print(f'{bcolors.BRed}ERROR: Failed to open watermark store {arg.cache_dir}/{WATERMARK_FILE}:')
+        print(error)
+        print(f'{bcolors.Endc}')
+        exit(1)
+
+    ## configuration versions are diffed from the content index only if asked for, as it is kept between runs
     #
+    if arg.content_index:
+      if arg.no_cache:
+        print(f'{bcolors.BRed}ERROR: --content-index keeps configuration versions between runs; run it without --no-cache{bcolors.Endc}')
+        exit(1)
+      try:
+        os.makedirs(arg.cache_dir, mode=0o700, exist_ok=True)
+        CONTENT_INDEX = ContentIndex(f'{arg.cache_dir}/{INDEX_FILE}', arg.content_index_size * 1024 * 1024)
+      except Exception as error:
+        print(f'{bcolors.BRed}ERROR: Failed to open content index {arg.cache_dir}/{INDEX_FILE}:')
+        print(error)
+        print(f'{bcolors.Endc}')
+        exit(1)
+
+    ## handle temporary directories and call; the work dir is removed at exit, including on SIGTERM
+    #
+    WORK_ROOT = arg.work_root
+    signal.signal(signal.SIGTERM, lambda signum, frame: exit(1))
     handleDirectories(DEBUG, 'create')
-    runReport(QUIET, DEBUG, org)
+    try:
+      if arg.watch:
+        watchReport(QUIET, DEBUG, org, arg.jobs, arg.watch_active, arg.watch_idle_max, arg.format)
+      elif scanSince is not None and arg.latency:
+        latencyReport(QUIET, DEBUG, org, scanSince, scanUntil, arg.format)
+      elif scanSince is not None:
+        scanReport(QUIET, DEBUG, org, scanSince, scanUntil, arg.jobs, arg.format)
+      else:
+        runReport(QUIET, DEBUG, org, arg.jobs, arg.state_diff, arg.incremental, arg.format, arg.history, since)
+    except ProbeExit as error:
+      ## a failure on any thread ends up here, once the workers have stopped
+      #
+      handleDirectories(DEBUG, 'delete')
+      exit(error.code)
     handleDirectories(DEBUG, 'delete')
+    if WATERMARKS is not None:
+      WATERMARKS.close()
+    if CONTENT_INDEX is not None:
+      CONTENT_INDEX.close()
+    TFE_CLIENT.close()
 #
 ## End Func main
 
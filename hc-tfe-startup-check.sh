@@ -0,0 +1,91 @@
+#!/usr/bin/env bash
+#
+## hc-tfe-startup-check.sh
+#
+## Startup-time regression check for the Python scripts, which automation calls thousands of times a day.
+## Each script is started with --help, detached from any terminal (as under cron or CI), and must:
+##   - exit 0 without a TTY
+##   - not import requests, asyncio, tarfile, difflib, subprocess, sqlite3 or numpy (they belong to the code paths
+##     that use them, not to startup)
+##   - start within STARTUP_BUDGET_MS milliseconds of a bare python3 (best of STARTUP_RUNS runs)
+## Exits non-zero if any script fails any check.
+#
+#########################################################################################################
+
+function usage {
+  echo "Usage: $(basename ${0}) [script.py ...]"
+  echo "Scripts default to hc-tfe-attestation-probe.py and hc-tfx-resource-list.py"
+  echo "Env: STARTUP_BUDGET_MS (default 60), STARTUP_RUNS (default 5)"
+  exit 1
+}
+
+## best wall time in ms over STARTUP_RUNS runs of the given command, detached from the terminal
+#
+function bestTime {
+  local best=''
+  for run in $(seq ${runs})
+  do
+    local start=$(date +%s%N)
+    "$@" </dev/null >/dev/null 2>&1
+    local elapsed=$(( ($(date +%s%N) - start) / 1000000 ))
+    if [[ -z "${best}" || ${elapsed} -lt ${best} ]]
+    then
+      best=${elapsed}
+    fi
+  done
+  echo ${best}
+}
+
+function main {
+  nmlred="\033[0;31m" # Red
+  bldred="\033[1;31m" # Red
+  nmlgrn="\033[0;32m" # Green
+  bldgrn="\033[1;32m" # Green
+  bldylw="\033[1;33m" # Yellow
+  txtrst="\033[0m"    # Text Reset
+
+  if [[ "${1}" == '-h' || "${1}" == '--help' ]]
+  then
+    usage
+  fi
+
+  cd "$(dirname ${0})"
+  budget=${STARTUP_BUDGET_MS:-60}
+  runs=${STARTUP_RUNS:-5}
+  scripts=${@:-hc-tfe-attestation-probe.py hc-tfx-resource-list.py}
+  heavy='requests|urllib3|asyncio|tarfile|difflib|subprocess|sqlite3|numpy'
+  failed=0
+
+  floor=$(bestTime python3 -c pass)
+  echo -e "${bldylw}python3 floor: ${floor}ms, budget: +${budget}ms${txtrst}"
+
+  for script in ${scripts}
+  do
+    if ! python3 ${script} --help </dev/null >/dev/null 2>&1
+    then
+      echo -e "${bldred}FAIL${txtrst} ${script}: --help did not exit 0 without a terminal"
+      failed=1
+      continue
+    fi
+
+    imported=$(python3 -X importtime ${script} --help </dev/null 2>&1 >/dev/null | awk -F'|' '{print $3}' | sed 's/^ *//' | grep -E "^(${heavy})$" | tr '\n' ' ')
+    if [[ -n "${imported}" ]]
+    then
+      echo -e "${bldred}FAIL${txtrst} ${script}: imports at startup: ${imported}"
+      failed=1
+    fi
+
+    elapsed=$(bestTime python3 ${script} --help)
+    if [[ $(( elapsed - floor )) -gt ${budget} ]]
+    then
+      echo -e "${bldred}FAIL${txtrst} ${script}: ${elapsed}ms to start, over budget"
+      failed=1
+    else
+      echo -e "${bldgrn}OK${txtrst}   ${script}: ${elapsed}ms to start"
+    fi
+  done
+
+  exit ${failed}
+}
+
+main "$@"
@@ -4,21 +4,36 @@
 #
 ## Originally by @richard-russell, modified by @ml4
 #
-## Retrieve workspace resource counts and output sorted list (most resources first)
+## Retrieve workspace resource counts and output sorted list (most resources first), or with --analytics the
+## top workspaces, resource count percentiles and histogram, and breakdowns by version, project, tag, lock and
+## auto-apply, aggregated as the pages stream in (see hc_tfe/analytics.py)
 ## NB: skeleton code ... only checks for basic errors in responses
 ## Reads inputs from env vars or interactively
 #
 ## ONLY TESTED ON TFC
 
 from getpass import getpass
+import argparse
+import atexit
 import os
-import requests
+import sys
 import json
+from hc_tfe.client import TFEClient, POOL_SIZE
+from hc_tfe.pagination import iterRecords
+from hc_tfe.ratelimit import RateLimiter, RATE, MAX_RETRIES
+from hc_tfe.output import writeRecord, FORMATS
+from hc_tfe.profile import Profiler, span, summaryLines
+from hc_tfe.targets import loadTargets, fanOut, scriptCommand, isTargetChild, PARALLEL_TARGETS
+from hc_tfe.analytics import WorkspaceStats, TOP_K, FIELDS
 
 DEBUG     = False
 QUIET     = False
 PAGESIZE  = 100
 TS_FORMAT = '%Y-%m-%dT%H:%M:%S%z'
+TFE_CLIENT = None
+PROFILER   = None
+PROFILE_FILE = 'tfx-resource-list-profile.json'
+BAR_WIDTH  = 40
 
 ############################################################################
 #
@@ -71,13 +86,13 @@ def env_or_ask(var, sensitive=False):
 
 ############################################################################
 #
-# def call_TFE
+# def get_TFE
 #
 ############################################################################
 
-## call TFE and return json object
+## call TFE for a single page and return the json object
 #
-def call_TFE(QUIET, path):
+def get_TFE(QUIET, path):
   if not path:
     print(f'{bcolors.BRed}No TFE API in calling path{bcolors.Endc}')
     exit(1)
@@ -86,12 +101,8 @@ def call_TFE(QUIET, path):
     print(f'{bcolors.Magenta}Calling TFE with {path}{bcolors.Endc}')
     print()
 
-  headers = {
-    'Authorization': f'Bearer {TFE_TOKEN}',
-    'Content-Type':  'application/vnd.api+json'
-  }
   try:
-    response = requests.get(f'{path}', headers=headers)
+    response = TFE_CLIENT.get(f'{path}')
   except Exception as e:
     print()
     print(f'{bcolors.BRed}ERROR with requests to {path}:')
@@ -103,7 +114,7 @@ def call_TFE(QUIET, path):
   #
   if response.status_code >= 400:
     print(f'{bcolors.BRed}API Request Response code: {response.status_code}')
-  else:
+  elif not QUIET:
     print(f'{bcolors.BMagenta}API Request Response code: {response.status_code}')
 
   ## detect output gzip file (which is the only type this script handles) or marshall
@@ -116,25 +127,182 @@ def call_TFE(QUIET, path):
     print(f'{bcolors.BYellow}{json.dumps(j)}{bcolors.Endc}')  # in order to put it out to https://codeamaze.com/web-viewer/json-explorer to make sense
     print()
     exit(response.status_code)
+  return j
+#
+## End Func get_TFE
+
+############################################################################
+#
+# def call_TFE
+#
+############################################################################
 
-  data = j.get('data')
-  links = j.get('links')
-  if links is None:
-      return data
-  nextpage = links.get('next')
-  # print(f'  nextpage -> {nextpage}')
-  if nextpage is None:
-      return data
-  data.extend(call_TFE(QUIET, nextpage))
-  return data
+## call TFE and yield the records of every page as the pages arrive; pages after the first are prefetched
+## concurrently, at most one per pooled connection at a time
+#
+def call_TFE(QUIET, path):
+  return iterRecords(lambda url: get_TFE(QUIET, url), path, TFE_CLIENT.poolSize)
 #
 ## End Func call_TFE
 
+############################################################################
+#
+# def print_analytics
+#
+############################################################################
+
+## render an analytics summary (WorkspaceStats.summary(), or a child's analytics record) as text
+#
+def print_analytics(summary):
+  print()
+  print(f'{bcolors.BCyan}Top {len(summary["top"])} workspaces by resources{bcolors.Endc}')
+  for ws in summary['top']:
+    print(f'{bcolors.Green}{ws["name"]}: {ws["resource-count"]}{bcolors.Endc}')
+
+  print()
+  print(f'{bcolors.BCyan}Resources per workspace{bcolors.Endc}')
+  print('  '.join(f'{name} {bcolors.BWhite}{value}{bcolors.Endc}' for name, value in summary['percentiles'].items()))
+  most = max((bucket['workspaces'] for bucket in summary['histogram']), default=0)
+  for bucket in summary['histogram']:
+    bar = '#' * (-(-bucket['workspaces'] * BAR_WIDTH // most) if most else 0)
+    print(f'{bucket["resources"]:>13} {bucket["workspaces"]:>8} {bcolors.Green}{bar}{bcolors.Endc}')
+
+  for name, counts in summary['breakdowns'].items():
+    print()
+    print(f'{bcolors.BCyan}Workspaces by {name}{bcolors.Endc}')
+    for value, n in list(counts.items())[:TOP_K]:
+      print(f'{bcolors.Green}{value:<40}{bcolors.Endc} {n:>8}')
+    if len(counts) > TOP_K:
+      print(f'{bcolors.Grey}... and {len(counts) - TOP_K} more{bcolors.Endc}')
+#
+## End Func print_analytics
+
+############################################################################
+#
+# def report_targets
+#
+############################################################################
+
+## run this script once per target as a child process emitting ndjson, parallel targets at a time, and merge:
+## text gives each target's workspaces and total then the resources per organisation and overall; ndjson passes
+## the children's records through followed by an overall record.  Returns whether every target succeeded
+#
+def report_targets(targets, parallel, fmt):
+  command = scriptCommand(__file__, ('-t', '--targets', '--parallel-targets', '-f', '--format')) + [ '--format', 'ndjson' ]
+  totals  = []
+  failed  = 0
+
+  for result in fanOut(command, targets, parallel):
+    target = result['target']
+    if result['exit'] != 0:
+      failed += 1
+      print(f'{bcolors.BRed}ERROR: {target.org} on {target.address} failed with exit {result["exit"]}{bcolors.Endc}', file=sys.stderr)
+      print(result['output'][-2000:], end='', file=sys.stderr)
+      continue
+
+    records = [ json.loads(line) for line in result['output'].splitlines() if line.startswith('{') ]
+    total   = next((record for record in records if record['type'] == 'totals'), None)
+    if total is None:
+      failed += 1
+      print(f'{bcolors.BRed}ERROR: {target.org} on {target.address} returned no totals{bcolors.Endc}', file=sys.stderr)
+      continue
+    totals.append(total)
+
+    if fmt == 'ndjson':
+      print(result['output'], end='', flush=True)
+      continue
+
+    print()
+    print(f'{bcolors.BCyan}{target.org} on {target.address}{bcolors.Endc}')
+    analytics = next((record for record in records if record['type'] == 'analytics'), None)
+    if analytics is not None:
+      print_analytics(analytics)
+      print()
+    else:
+      wsresources = [ (record['name'], record['resource-count']) for record in records if record['type'] == 'workspace' ]
+      for ws, num_resources in sorted(wsresources, key=lambda x:(-x[1], x[0])):
+        print(f'{bcolors.Green}{ws}: {num_resources}')
+    print(f'{bcolors.BYellow}{target.org} resources: {total["resources"]} in {total["workspaces"]} workspaces{bcolors.Endc}')
+
+  total_workspaces = sum(total['workspaces'] for total in totals)
+  total_resources  = sum(total['resources'] for total in totals)
+  if fmt == 'ndjson':
+    writeRecord({ 'type': 'overall', 'targets': len(targets), 'failed': failed, 'workspaces': total_workspaces, 'resources': total_resources })
+    return failed == 0
+
+  print()
+  print(f'{bcolors.BWhite}{"organisation":<30} {"address":<40} {"workspaces":>10} {"resources":>10}{bcolors.Endc}')
+  for total in totals:
+    print(f'{bcolors.Green}{total["org"]:<30} {total["address"]:<40} {total["workspaces"]:>10} {total["resources"]:>10}{bcolors.Endc}')
+  print(f'\nTotal workspaces: {total_workspaces}')
+  print(f'{bcolors.BYellow}Total resources:  {total_resources}{bcolors.Endc}')
+  if failed:
+    print(f'{bcolors.BRed}Failed targets:   {failed}{bcolors.Endc}')
+  print()
+  return failed == 0
+#
+## End Func report_targets
+
+############################################################################
+#
+# def write_profile
+#
+############################################################################
+
+## print the per-endpoint timing table at exit and write the trace (OpenMetrics for a .prom/.om/.txt path);
+## stderr with ndjson so stdout stays parseable
+#
+def write_profile(path, fmt):
+  stream = sys.stderr if fmt == 'ndjson' else sys.stdout
+  print(file=stream)
+  for line in summaryLines(PROFILER):
+    print(line, file=stream)
+  try:
+    PROFILER.write(path)
+    print(f'\nProfile written to {path}', file=stream)
+  except OSError as error:
+    print(f'{bcolors.BRed}ERROR: Failed to write profile {path}: {error}{bcolors.Endc}', file=stream)
+#
+## End Func write_profile
+
 def main():
   global QUIET
   global TFE_ADDR
   global TFE_TOKEN
   global TFE_CACERT
+  global TFE_CLIENT
+  global PROFILER
+
+  parser = argparse.ArgumentParser(description='List TFE/TFC workspace resource counts. Inputs are read from TFE_ADDR, TFE_ORG and TFE_TOKEN, or asked for', allow_abbrev=False)
+  parser.add_argument('-f', '--format', choices=FORMATS, default=os.getenv('TFE_FORMAT', 'text'), help='Coloured text, or one compact JSON record per workspace and a closing totals record with no dressing; also TFE_FORMAT (default text)')
+  parser.add_argument('--profile', type=str, nargs='?', const=PROFILE_FILE, default=os.getenv('TFE_PROFILE'), metavar='FILE', help=f'Time every API call, print p50/p95 per endpoint at exit and write a Chrome trace, or OpenMetrics for a .prom/.om/.txt FILE; also TFE_PROFILE (default {PROFILE_FILE})')
+  parser.add_argument('-t', '--targets', type=str, default=os.getenv('TFE_TARGETS'), metavar='FILE', help='File of "address org [token-variable [ca-bundle]]" lines to list instead of TFE_ADDR/TFE_ORG, totalled per organisation and overall; tokens are read from the named variables (default TFE_TOKEN); also TFE_TARGETS')
+  parser.add_argument('--parallel-targets', type=int, default=PARALLEL_TARGETS, help=f'Targets listed at once (default {PARALLEL_TARGETS})')
+  parser.add_argument('-a', '--analytics', action='store_true', help='Instead of listing every workspace, report the top workspaces by resources, resource count percentiles and histogram, and breakdowns by terraform version, project, tag, locked and auto-apply; with ndjson one analytics record')
+  parser.add_argument('-k', '--top', type=int, default=TOP_K, help=f'Workspaces in the --analytics top list (default {TOP_K})')
+  arg = parser.parse_args()
+  if arg.format == 'ndjson':
+    QUIET = True
+
+  ## several targets: re-run per target and merge, nothing to read or ask for here
+  #
+  if arg.targets:
+    if isTargetChild():
+      print(f'{bcolors.BRed}ERROR: --targets given to a listing already running for one target; not fanning out again{bcolors.Endc}')
+      exit(1)
+    if arg.profile:
+      print(f'{bcolors.BRed}ERROR: --profile profiles a single target; run it without --targets{bcolors.Endc}')
+      exit(1)
+    try:
+      targets = loadTargets(arg.targets)
+    except (OSError, ValueError) as error:
+      print(f'{bcolors.BRed}ERROR: Failed to load targets: {error}{bcolors.Endc}')
+      exit(1)
+    exit(0 if report_targets(targets, arg.parallel_targets, arg.format) else 1)
+
+  if arg.profile:
+    PROFILER = Profiler()
+    atexit.register(write_profile, arg.profile, arg.format)
 
   ## These variables are populated from environment variables if they exist, else prompt for input
   #
@@ -142,9 +310,58 @@ def main():
   TFE_ORG   = env_or_ask('TFE_ORG')
   TFE_TOKEN = env_or_ask('TFE_TOKEN', sensitive=True)
 
-  workspaces_blob = call_TFE(QUIET, f'{TFE_ADDR}/api/v2/organizations/{TFE_ORG}/workspaces?page%5Bsize%5d={PAGESIZE}')
-  wsresources = [ (ws['attributes']['name'], ws['attributes']['resource-count']) for ws in workspaces_blob ]
-  wsr_sorted = sorted(wsresources, key=lambda x:x[0], reverse=False)
+  ## optional: CA bundle for private TFE, size of the keep-alive connection pool, request rate and retries
+  #
+  TFE_CACERT = os.getenv('TFE_CACERT')
+  rateLimiter = RateLimiter(os.getenv('TFE_RATE_LIMIT', RATE), os.getenv('TFE_RETRIES', MAX_RETRIES))
+  try:
+    TFE_CLIENT = TFEClient(TFE_TOKEN, TFE_CACERT, os.getenv('TFE_POOL_SIZE', POOL_SIZE), rateLimiter, PROFILER)
+  except Exception as e:
+    print(f'{bcolors.BRed}ERROR: Failed to load TFE_CACERT {TFE_CACERT}:')
+    print(e)
+    print(f'{bcolors.Endc}')
+    exit(1)
+
+  ## only the fields reported on; pages are a fraction of the size with the rest left out
+  #
+  fields     = FIELDS if arg.analytics else 'name,resource-count'
+  workspaces = call_TFE(QUIET, f'{TFE_ADDR}/api/v2/organizations/{TFE_ORG}/workspaces?page%5Bsize%5d={PAGESIZE}&fields%5Bworkspace%5D={fields}')
+
+  ## analytics: every workspace folded into the aggregates as its page arrives, none kept
+  #
+  if arg.analytics:
+    stats = WorkspaceStats(arg.top)
+    with span(PROFILER, 'workspace-list'):
+      for ws in workspaces:
+        stats.add(ws)
+    with span(PROFILER, 'analytics'):
+      summary = stats.summary()
+    if arg.format == 'ndjson':
+      writeRecord(dict({ 'type': 'analytics', 'address': TFE_ADDR, 'org': TFE_ORG }, **summary))
+      writeRecord({ 'type': 'totals', 'address': TFE_ADDR, 'org': TFE_ORG, 'workspaces': summary['workspaces'], 'resources': summary['resources'] })
+      return
+    print_analytics(summary)
+    print(f'\nTotal workspaces: {summary["workspaces"]}')
+    print(f'{bcolors.BYellow}Total resources:  {summary["resources"]}{bcolors.Endc}')
+    print()
+    return
+
+  ## ndjson: a record per workspace as each page arrives, unsorted, then the totals
+  #
+  if arg.format == 'ndjson':
+    total_workspaces = 0
+    total_resources  = 0
+    with span(PROFILER, 'workspace-list'):
+      for ws in workspaces:
+        writeRecord({ 'type': 'workspace', 'address': TFE_ADDR, 'org': TFE_ORG, 'name': ws['attributes']['name'], 'id': ws['id'], 'resource-count': ws['attributes']['resource-count'] })
+        total_workspaces += 1
+        total_resources  += ws['attributes']['resource-count']
+    writeRecord({ 'type': 'totals', 'address': TFE_ADDR, 'org': TFE_ORG, 'workspaces': total_workspaces, 'resources': total_resources })
+    return
+
+  with span(PROFILER, 'workspace-list'):
+    wsresources = [ (ws['attributes']['name'], ws['attributes']['resource-count']) for ws in workspaces ]
+  wsr_sorted = sorted(wsresources, key=lambda x:(-x[1], x[0]))
 
   print()
   total_resources = 0
@@ -0,0 +1,8 @@
+#
+## hc_tfe
+#
+## Shared library code for the hc-tfe-*.py and hc-tfx-*.py scripts in this repo.
+## The scripts add their own directory to the import path when run, so this package is picked up
+## without installation.
+#
+#######################################################################################################################
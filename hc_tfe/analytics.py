@@ -0,0 +1,114 @@
+#
+## hc_tfe/analytics.py
+#
+## Streaming organisation-wide workspace analytics for hc-tfx-resource-list.py --analytics.
+## Workspaces are folded into WorkspaceStats one at a time as the pages arrive and are never kept: resource counts
+## go into a flat unsigned array (8 bytes a workspace rather than a tuple and two objects), the largest K into a
+## K-sized min-heap, and terraform-version, project, tag, locked and auto-apply into counters of distinct values.
+## Memory is then the array plus the distinct values, and percentiles cost one sort of the array at the end, so
+## 50k workspaces aggregate in well under a second.
+#
+#######################################################################################################################
+
+import heapq
+from array import array
+from collections import Counter
+
+############################################################################
+#
+#   Globals
+#
+############################################################################
+
+TOP_K       = 10
+PERCENTILES = ( 50, 90, 95, 99 )
+
+## breakdowns: report label and how to read the value(s) off a workspace record from the API
+#
+BREAKDOWNS = {
+  'terraform-version': lambda ws: [ ws['attributes'].get('terraform-version') ],
+  'project':           lambda ws: [ ((ws.get('relationships', {}).get('project') or {}).get('data') or {}).get('id') ],
+  'tag':               lambda ws: ws['attributes'].get('tag-names') or [ None ],
+  'locked':            lambda ws: [ ws['attributes'].get('locked') ],
+  'auto-apply':        lambda ws: [ ws['attributes'].get('auto-apply') ]
+}
+
+## the workspace list fields the analytics read, for a sparse fieldset
+#
+FIELDS = 'name,resource-count,terraform-version,project,tag-names,locked,auto-apply'
+
+############################################################################
+#
+# Class: WorkspaceStats
+#
+############################################################################
+
+## WorkspaceStats - aggregates of every workspace added
+#
+class WorkspaceStats:
+  def __init__(self, k=TOP_K):
+    self.k          = k
+    self.counts     = array('Q')
+    self.heap       = []
+    self.seq        = 0
+    self.breakdowns = { name: Counter() for name in BREAKDOWNS }
+
+  ## fold one workspace record in
+  #
+  def add(self, ws):
+    count = int(ws['attributes'].get('resource-count') or 0)
+    self.counts.append(count)
+
+    ## min-heap of the K largest; seq breaks ties without comparing names and keeps the first seen
+    #
+    entry = (count, -self.seq, ws['attributes']['name'])
+    self.seq += 1
+    if len(self.heap) < self.k:
+      heapq.heappush(self.heap, entry)
+    elif entry > self.heap[0]:
+      heapq.heapreplace(self.heap, entry)
+
+    for name, values in BREAKDOWNS.items():
+      for value in values(ws):
+        self.breakdowns[name][str(value).lower() if isinstance(value, bool) else (value or '(none)')] += 1
+
+  ## (name, count) of the K workspaces with most resources, most first
+  #
+  def top(self):
+    return [ (name, count) for count, _, name in sorted(self.heap, reverse=True) ]
+
+  ## nearest-rank percentiles of the resource counts, plus mean and max
+  #
+  def percentiles(self):
+    ordered = sorted(self.counts)
+    result  = {}
+    if not ordered:
+      return result
+    for p in PERCENTILES:
+      result[f'p{p}'] = ordered[max(0, -(-p * len(ordered) // 100) - 1)]
+    result['mean'] = round(sum(ordered) / len(ordered), 1)
+    result['max']  = ordered[-1]
+    return result
+
+  ## counts of workspaces by resources in power-of-two buckets: "0", "1", "2-3", "4-7"...
+  #
+  def histogram(self):
+    buckets = Counter(count.bit_length() for count in self.counts)
+    result  = []
+    for bits in range(max(buckets, default=-1) + 1):
+      low  = 0 if bits == 0 else 1 << (bits - 1)
+      high = 0 if bits == 0 else (1 << bits) - 1
+      result.append((str(low) if low == high else f'{low}-{high}', buckets.get(bits, 0)))
+    return result
+
+  def summary(self):
+    return {
+      'workspaces':  len(self.counts),
+      'resources':   sum(self.counts),
+      'top':         [ { 'name': name, 'resource-count': count } for name, count in self.top() ],
+      'percentiles': self.percentiles(),
+      'histogram':   [ { 'resources': label, 'workspaces': n } for label, n in self.histogram() ],
+      'breakdowns':  { name: dict(counter.most_common()) for name, counter in self.breakdowns.items() }
+    }
+#
+## End Class WorkspaceStats
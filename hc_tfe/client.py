@@ -0,0 +1,189 @@
+#
+## hc_tfe/client.py
+#
+## One pooled, keep-alive HTTP session per process for talking to the TFE/TFC API.
+## A bare requests.get() does a fresh TCP + TLS handshake per call; against a large org the probe makes tens of
+## thousands of calls so the handshakes dominate wall time.  TFEClient builds the auth headers once, loads the
+## TFE_CACERT bundle into a single SSL context once and reuses connections from a sized pool.
+## Every request is paced and, on 429/5xx or a dropped connection, retried by the shared RateLimiter in
+## hc_tfe.ratelimit.  Given a Profiler (hc_tfe.profile) the client reports every call's endpoint, status, bytes,
+## latency and retry count to it.
+## requests (and ssl) are only imported when the first client is built, so a script that imports this module for
+## its defaults starts fast on paths that never talk to TFE, e.g. --help.
+#
+#######################################################################################################################
+
+import time
+import zlib
+from functools import lru_cache
+from hc_tfe.ratelimit import RateLimiter
+
+############################################################################
+#
+#   Globals
+#
+############################################################################
+
+POOL_SIZE  = 10
+CHUNK_SIZE = 1024 * 1024
+
+############################################################################
+#
+# def pooledAdapter
+#
+############################################################################
+
+## the PooledAdapter class, defined on first call so that requests is imported on first use rather than at import
+#
+@lru_cache(maxsize=None)
+def pooledAdapter():
+  from requests.adapters import HTTPAdapter
+
+  ## PooledAdapter - HTTPAdapter that hands every pool the same pre-loaded SSL context
+  #
+  class PooledAdapter(HTTPAdapter):
+    def __init__(self, sslContext=None, **kwargs):
+      self.sslContext = sslContext
+      super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+      if self.sslContext is not None:
+        kwargs['ssl_context'] = self.sslContext
+      return super().init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+      if self.sslContext is not None:
+        proxy_kwargs['ssl_context'] = self.sslContext
+      return super().proxy_manager_for(proxy, **proxy_kwargs)
+
+    ## requests would otherwise set ca_certs on every connection, which makes urllib3 re-read the bundle from disk
+    ## on each new connection; the context already has it loaded
+    #
+    def cert_verify(self, conn, url, verify, cert):
+      super().cert_verify(conn, url, verify, cert)
+      if self.sslContext is not None and url.lower().startswith('https'):
+        conn.ca_certs    = None
+        conn.ca_cert_dir = None
+  #
+  ## End Class PooledAdapter
+
+  return PooledAdapter
+#
+## End Func pooledAdapter
+
+############################################################################
+#
+# Class: TFEClient
+#
+############################################################################
+
+## TFEClient - shared session, default headers, connection pool and rate limiter
+#
+class TFEClient:
+  def __init__(self, token, cacert=None, poolSize=POOL_SIZE, rateLimiter=None, profiler=None):
+    self.token       = token
+    self.cacert      = cacert
+    self.poolSize    = int(poolSize)
+    self.rateLimiter = rateLimiter or RateLimiter()
+    self.profiler    = profiler
+
+    import requests
+    self.connectionError = requests.ConnectionError
+    self.sslError        = requests.exceptions.SSLError
+
+    sslContext = None
+    if cacert:
+      import ssl
+      sslContext = ssl.create_default_context(cafile=cacert)
+      ## urllib3 1.26 cannot hand a pre-built context the server name when the host is an IP address, so the
+      ## context's own check fails every such call; urllib3 still matches the certificate to the host itself
+      #
+      sslContext.check_hostname = False
+
+    adapter = pooledAdapter()(sslContext=sslContext, pool_connections=self.poolSize, pool_maxsize=self.poolSize)
+    self.session = requests.Session()
+    self.session.mount('https://', adapter)
+    self.session.mount('http://', adapter)
+    self.session.headers.update({
+      'Authorization': f'Bearer {token}',
+      'Content-Type':  'application/vnd.api+json'
+    })
+
+  ## GET a path on the shared session, paced by the rate limiter.  Retryable statuses and connection errors are
+  ## retried with backoff; the last response (or exception) is handed back once retries run out.  A certificate
+  ## error is raised straight away: it is a ConnectionError to requests, but retrying cannot fix a wrong TFE_CACERT
+  #
+  def get(self, path, **kwargs):
+    started = self.profiler.now() if self.profiler is not None else None
+    attempt = 0
+    while True:
+      self.rateLimiter.wait()
+      try:
+        response = self.session.get(path, **kwargs)
+      except self.connectionError as error:
+        if isinstance(error, self.sslError) or attempt >= self.rateLimiter.maxRetries:
+          if started is not None:
+            self.profiler.request(path, None, 0, started, self.profiler.now() - started, attempt)
+          raise
+        time.sleep(self.rateLimiter.delay(attempt))
+        attempt += 1
+        continue
+
+      self.rateLimiter.update(response)
+      if not self.rateLimiter.shouldRetry(response.status_code, attempt):
+        if started is not None:
+          self.profiler.request(path, response.status_code, responseBytes(response, kwargs.get('stream')), started, self.profiler.now() - started, attempt)
+        return response
+      delay = self.rateLimiter.delay(attempt, response)
+      response.close()
+      time.sleep(delay)
+      attempt += 1
+
+  def close(self):
+    self.session.close()
+#
+## End Class TFEClient
+
+############################################################################
+#
+# def responseBytes
+#
+############################################################################
+
+## body size of response for the profiler: the Content-Length of a streamed body, which is not read yet, otherwise
+## the body itself
+#
+def responseBytes(response, stream=False):
+  if stream:
+    return int(response.headers.get('Content-Length') or 0)
+  return len(response.content)
+#
+## End Func responseBytes
+
+############################################################################
+#
+# def streamTo
+#
+############################################################################
+
+## copy a stream=True response body to outFile (anything with write()) a chunk at a time, optionally inflating
+## gzip/zlib content on the way, so memory stays at a chunk however large the artifact is.  Returns bytes written;
+## raises zlib.error if compressed content ends before its end of stream, as a truncated download does
+#
+def streamTo(response, outFile, decompress=False, chunkSize=CHUNK_SIZE):
+  decompressor = zlib.decompressobj(zlib.MAX_WBITS|32) if decompress else None
+  written      = 0
+  for chunk in response.iter_content(chunkSize):
+    if decompressor is not None:
+      chunk = decompressor.decompress(chunk)
+    outFile.write(chunk)
+    written += len(chunk)
+  if decompressor is not None:
+    chunk = decompressor.flush()
+    outFile.write(chunk)
+    written += len(chunk)
+    if not decompressor.eof:
+      raise zlib.error('incomplete or truncated stream')
+  return written
+#
+## End Func streamTo
@@ -0,0 +1,226 @@
+#
+## hc_tfe/contentindex.py
+#
+## Persistent content-hash index of configuration versions, Merkle style.
+## Ingesting a configuration version tarball records, in one SQLite file, the sha256 of every file (the manifest),
+## a hash per directory computed from its entries (so equal directory hashes mean equal subtrees, and equal root
+## hashes mean equal versions), and each distinct file content once, zlib-compressed, keyed by its hash.  Vendored
+## modules and files unchanged between versions are therefore stored once across every version and workspace.
+## diff() then works from the index alone: identical roots return straight away, directories whose hashes match
+## are skipped without reading their files, and difflib only sees files whose hashes differ, fetched once each.
+## Once both sides of a diff are indexed, neither tarball needs downloading again.
+## The file is in WAL mode with synchronous=NORMAL, blobs are compressed outside the lock and ingests are committed
+## COMMIT_EVERY at a time and on close.  close() also holds the file to its cap by dropping the versions indexed
+## longest ago, then every blob no remaining version refers to; freed pages are reused rather than returned, so
+## the file stays near the cap rather than under it.
+## SQLite is imported when an index is opened and tardiff when something is ingested or diffed.
+#
+#######################################################################################################################
+
+import hashlib
+import threading
+import time
+import zlib
+from collections import defaultdict
+
+############################################################################
+#
+#   Globals
+#
+############################################################################
+
+INDEX_FILE    = 'contentindex.sqlite'
+INDEX_SIZE_MB = 1024
+COMMIT_EVERY  = 20
+SCHEMA        = '''
+CREATE TABLE IF NOT EXISTS blobs (
+  digest  BLOB PRIMARY KEY,
+  content BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS manifests (
+  cv_id   TEXT NOT NULL,
+  path    TEXT NOT NULL,
+  dir     TEXT NOT NULL,
+  digest  BLOB NOT NULL,
+  PRIMARY KEY (cv_id, path)
+);
+CREATE INDEX IF NOT EXISTS manifests_dir ON manifests (cv_id, dir);
+CREATE TABLE IF NOT EXISTS trees (
+  cv_id   TEXT NOT NULL,
+  dir     TEXT NOT NULL,
+  digest  BLOB NOT NULL,
+  PRIMARY KEY (cv_id, dir)
+);
+CREATE TABLE IF NOT EXISTS versions (
+  cv_id      TEXT PRIMARY KEY,
+  indexed_at REAL NOT NULL
+);
+'''
+
+############################################################################
+#
+# def treeHashes
+#
+############################################################################
+
+## { dir: digest } for every directory of a { path: digest } manifest, '' being the root.  A directory's digest
+## covers the names, kinds and digests of its entries, so it changes exactly when something beneath it does
+#
+def treeHashes(files):
+  entries = defaultdict(list, { '': [] })
+  for path, digest in files.items():
+    parent, _, name = path.rpartition('/')
+    entries[parent].append((name, 'f', digest))
+    while parent:
+      parent = parent.rpartition('/')[0]
+      if parent in entries:
+        break
+      entries[parent] = []
+
+  hashes = {}
+  for directory in sorted(entries, key=lambda d: d.count('/') + (d != ''), reverse=True):
+    digest = hashlib.sha256()
+    for name, kind, child in sorted(entries[directory]):
+      digest.update(f'{kind} {name}\0'.encode() + child)
+    hashes[directory] = digest.digest()
+    if directory:
+      parent, _, name = directory.rpartition('/')
+      entries[parent].append((name, 'd', hashes[directory]))
+  return hashes
+#
+## End Func treeHashes
+
+############################################################################
+#
+# Class: ContentIndex
+#
+############################################################################
+
+## ContentIndex - one SQLite file of manifests, directory hashes and deduplicated blobs, capped at maxBytes; safe
+## to share between probe threads
+#
+class ContentIndex:
+  def __init__(self, path, maxBytes=INDEX_SIZE_MB * 1024 * 1024):
+    import sqlite3
+
+    self.maxBytes   = int(maxBytes)
+    self.pending    = 0
+    self.lock       = threading.Lock()
+    self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    self.connection.execute('PRAGMA journal_mode=WAL')
+    self.connection.execute('PRAGMA synchronous=NORMAL')
+    with self.connection:
+      self.connection.executescript(SCHEMA)
+      ## versions indexed before versions was kept count as the oldest
+      #
+      self.connection.execute("INSERT OR IGNORE INTO versions SELECT cv_id, 0 FROM trees WHERE dir = ''")
+
+  def has(self, cvId):
+    with self.lock:
+      return self.connection.execute('SELECT 1 FROM trees WHERE cv_id = ? AND dir = ?', (cvId, '')).fetchone() is not None
+
+  ## index the tarball at archive as cvId.  The archive is read and new blobs compressed outside the lock; only
+  ## blobs not already held are compressed and written.  Committed with the next COMMIT_EVERY ingests, or by close()
+  #
+  def ingest(self, cvId, archive):
+    from hc_tfe.tardiff import iterMembers
+
+    files    = {}
+    contents = {}
+    for name, digest, content in iterMembers(archive):
+      files[name] = digest
+      contents.setdefault(digest, content)
+    trees = treeHashes(files)
+
+    with self.lock:
+      known = { row[0] for digest in contents for row in self.connection.execute('SELECT digest FROM blobs WHERE digest = ?', (digest,)) }
+    blobs = [ (digest, zlib.compress(content)) for digest, content in contents.items() if digest not in known ]
+
+    with self.lock:
+      self.connection.executemany('INSERT OR IGNORE INTO blobs VALUES (?, ?)', blobs)
+      self.connection.execute('DELETE FROM manifests WHERE cv_id = ?', (cvId,))
+      self.connection.executemany('INSERT INTO manifests VALUES (?, ?, ?, ?)',
+        ((cvId, path, path.rpartition('/')[0], digest) for path, digest in files.items()))
+      self.connection.execute('DELETE FROM trees WHERE cv_id = ?', (cvId,))
+      self.connection.executemany('INSERT INTO trees VALUES (?, ?, ?)', ((cvId, directory, digest) for directory, digest in trees.items()))
+      self.connection.execute('INSERT OR REPLACE INTO versions VALUES (?, ?)', (cvId, time.time()))
+      self.pending += 1
+      if self.pending >= COMMIT_EVERY:
+        self.connection.commit()
+        self.pending = 0
+
+  def trees(self, cvId):
+    with self.lock:
+      return dict(self.connection.execute('SELECT dir, digest FROM trees WHERE cv_id = ?', (cvId,)))
+
+  ## { path: digest } of the files directly in each of dirs
+  #
+  def files(self, cvId, dirs):
+    with self.lock:
+      return { path: digest for directory in dirs for path, digest in self.connection.execute('SELECT path, digest FROM manifests WHERE cv_id = ? AND dir = ?', (cvId, directory)) }
+
+  def blob(self, digest):
+    with self.lock:
+      row = self.connection.execute('SELECT content FROM blobs WHERE digest = ?', (digest,)).fetchone()
+    return zlib.decompress(row[0])
+
+  ## the differences between indexed versions cvId0 and cvId1, in the same diff -r style text as
+  ## tardiff.diffArchives, '' when they are the same
+  #
+  def diff(self, cvId0, cvId1, label0='a', label1='b'):
+    from hc_tfe.tardiff import diffText
+
+    trees0 = self.trees(cvId0)
+    trees1 = self.trees(cvId1)
+    for cvId, trees in ((cvId0, trees0), (cvId1, trees1)):
+      if not trees:
+        raise KeyError(f'{cvId} is not indexed')
+    if trees0[''] == trees1['']:
+      return ''
+
+    changed  = [ directory for directory in set(trees0) | set(trees1) if trees0.get(directory) != trees1.get(directory) ]
+    files0   = self.files(cvId0, changed)
+    files1   = self.files(cvId1, changed)
+    sections = {}
+    for name in set(files0) | set(files1):
+      digest0 = files0.get(name)
+      digest1 = files1.get(name)
+      if digest0 is None:
+        sections[name] = f'Only in {label1}: {name}\n'
+      elif digest1 is None:
+        sections[name] = f'Only in {label0}: {name}\n'
+      elif digest0 != digest1:
+        text = diffText(self.blob(digest0), self.blob(digest1), f'{label0}/{name}', f'{label1}/{name}')
+        if text:
+          sections[name] = text
+
+    return ''.join(sections[name] for name in sorted(sections))
+
+  ## bytes of the file in use, not counting free pages
+  #
+  def usedBytes(self):
+    pageSize = self.connection.execute('PRAGMA page_size').fetchone()[0]
+    pages    = self.connection.execute('PRAGMA page_count').fetchone()[0] - self.connection.execute('PRAGMA freelist_count').fetchone()[0]
+    return pageSize * pages
+
+  ## drop the versions indexed longest ago, a tenth of them at a time, and the blobs only they referred to, until
+  ## the index fits maxBytes.  Call with the lock held
+  #
+  def evict(self):
+    with self.connection:
+      while self.usedBytes() > self.maxBytes:
+        count  = self.connection.execute('SELECT COUNT(*) FROM versions').fetchone()[0]
+        oldest = [ (row[0],) for row in self.connection.execute('SELECT cv_id FROM versions ORDER BY indexed_at LIMIT ?', (max(1, count // 10),)) ]
+        if not oldest:
+          break
+        for table in ( 'manifests', 'trees', 'versions' ):
+          self.connection.executemany(f'DELETE FROM {table} WHERE cv_id = ?', oldest)
+        self.connection.execute('DELETE FROM blobs WHERE digest NOT IN (SELECT digest FROM manifests)')
+
+  def close(self):
+    with self.lock:
+      self.connection.commit()
+      self.evict()
+      self.connection.close()
+#
+## End Class ContentIndex
@@ -0,0 +1,208 @@
+#
+## hc_tfe/cvcache.py
+#
+## Persistent on-disk cache of configuration version tarballs, keyed by configuration version ID.
+## Configuration versions are immutable, so once a cv-xxxx blob has been downloaded it never needs fetching again;
+## repeat probes and the previous-version side of adjacent-run diffs are served from here.
+## The cache is capped in bytes and evicts least recently used blobs first.  Recency is the file mtime, which is
+## bumped on every hit so the order survives across runs.
+## The directory is shared by every probe on the host (concurrent runs, --targets children), so get() and put()
+## never hand out the cached name itself: they return a hard link to the blob under .pins/, named for this process.
+## Another process evicting the blob only removes the cached name, and the linked copy stays readable until
+## release() drops the link; links left by a process that died are cleared by the next one to open the cache.
+## Each process keeps its own view of the directory's size for eviction and re-reads the directory every
+## RESCAN_SECONDS, so the cap holds for what every process has added, not just this one.
+#
+#######################################################################################################################
+
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict, Counter
+
+############################################################################
+#
+#   Globals
+#
+############################################################################
+
+## /var/tmp for the same CIS noexec reason as the probe's temporary dirs
+#
+CACHE_DIR      = '/var/tmp/tfeProbeCache'
+CACHE_SIZE_MB  = 1024
+CV_ID_PATTERN  = re.compile(r'^cv-[A-Za-z0-9_-]+$')
+PINS_DIR       = '.pins'
+RESCAN_SECONDS = 30
+
+############################################################################
+#
+# Class: ConfigVersionCache
+#
+############################################################################
+
+## ConfigVersionCache - LRU, size-capped directory of <cv-id>.tar files; safe to share between probe threads and
+## between processes
+#
+class ConfigVersionCache:
+  def __init__(self, directory=CACHE_DIR, maxBytes=CACHE_SIZE_MB * 1024 * 1024):
+    self.directory = directory
+    self.pins      = os.path.join(directory, PINS_DIR)
+    self.maxBytes  = int(maxBytes)
+    self.lock      = threading.Lock()
+    self.entries   = OrderedDict()
+    self.pinned    = Counter()
+    self.size      = 0
+    self.scannedAt = 0
+
+    os.makedirs(self.pins, mode=0o700, exist_ok=True)
+    self.clearStalePins()
+    with self.lock:
+      self.rescan()
+    self.evict()
+
+  def path(self, cvId):
+    if not CV_ID_PATTERN.match(cvId):
+      raise ValueError(f'not a configuration version ID: {cvId}')
+    return os.path.join(self.directory, f'{cvId}.tar')
+
+  def pinPath(self, cvId):
+    return os.path.join(self.pins, f'{os.getpid()}-{cvId}.tar')
+
+  ## remove pin links of processes that are no longer running
+  #
+  def clearStalePins(self):
+    for entry in os.scandir(self.pins):
+      pid = entry.name.split('-', 1)[0]
+      if not pid.isdigit():
+        continue
+      try:
+        os.kill(int(pid), 0)
+      except ProcessLookupError:
+        try:
+          os.remove(entry.path)
+        except FileNotFoundError:
+          pass
+      except PermissionError:
+        pass
+
+  ## re-read the directory, oldest first, as every process has left it.  Call with the lock held
+  #
+  def rescan(self):
+    found = []
+    for entry in os.scandir(self.directory):
+      if entry.is_file() and entry.name.endswith('.tar') and CV_ID_PATTERN.match(entry.name[:-4]):
+        try:
+          stat = entry.stat()
+        except FileNotFoundError:
+          continue
+        found.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+    self.entries.clear()
+    self.size = 0
+    for mtime, cvId, size in sorted(found):
+      self.entries[cvId] = size
+      self.size += size
+    self.scannedAt = time.monotonic()
+
+  ## link the cached blob for cvId into .pins for this process, once however many threads pin it.  Call with the
+  ## lock held; raises FileNotFoundError if another process has evicted it
+  #
+  def pin(self, cvId):
+    pinPath = self.pinPath(cvId)
+    if self.pinned[cvId] == 0:
+      try:
+        os.link(self.path(cvId), pinPath)
+      except FileExistsError:
+        pass
+    self.pinned[cvId] += 1
+    return pinPath
+
+  ## return the path of a pinned link to the cached blob for cvId, or None
+  #
+  def get(self, cvId):
+    self.path(cvId)
+    with self.lock:
+      try:
+        pinPath = self.pin(cvId)
+      except FileNotFoundError:
+        if cvId in self.entries:
+          self.size -= self.entries.pop(cvId)
+        return None
+      os.utime(pinPath)
+      if cvId not in self.entries:
+        self.entries[cvId] = os.path.getsize(pinPath)
+        self.size += self.entries[cvId]
+      self.entries.move_to_end(cvId)
+    return pinPath
+
+  ## move a freshly downloaded blob into the cache and return the path of a pinned link to it.  The blob lands as
+  ## this process's pin first and is then linked in under its cached name, so readers never see a partial blob
+  #
+  def put(self, cvId, srcPath):
+    path    = self.path(cvId)
+    pinPath = self.pinPath(cvId)
+    partial = f'{pinPath}.{threading.get_ident()}.partial'
+    size    = os.path.getsize(srcPath)
+    try:
+      os.replace(srcPath, partial)
+    except OSError:
+      ## different filesystem
+      #
+      shutil.copyfile(srcPath, partial)
+      os.remove(srcPath)
+
+    with self.lock:
+      if self.pinned[cvId] == 0:
+        os.replace(partial, pinPath)
+        os.link(pinPath, f'{pinPath}.link')
+        os.replace(f'{pinPath}.link', path)
+      else:
+        os.remove(partial)
+      self.pinned[cvId] += 1
+      if cvId in self.entries:
+        self.size -= self.entries.pop(cvId)
+      self.entries[cvId] = size
+      self.size += size
+    self.evict()
+    return pinPath
+
+  def release(self, cvId):
+    with self.lock:
+      self.pinned[cvId] -= 1
+      if self.pinned[cvId] <= 0:
+        del self.pinned[cvId]
+        try:
+          os.remove(self.pinPath(cvId))
+        except FileNotFoundError:
+          pass
+
+  ## remove the cached blob for cvId, e.g. once it is held elsewhere; pinned links stay readable as with evict()
+  #
+  def discard(self, cvId):
+    path = self.path(cvId)
+    with self.lock:
+      if cvId in self.entries:
+        self.size -= self.entries.pop(cvId)
+      try:
+        os.remove(path)
+      except FileNotFoundError:
+        pass
+
+  ## drop least recently used blobs until the cache fits maxBytes.  A blob pinned by any process can go too: only
+  ## its cached name is removed, and the pinned link keeps it readable
+  #
+  def evict(self):
+    with self.lock:
+      if time.monotonic() - self.scannedAt > RESCAN_SECONDS:
+        self.rescan()
+      for cvId in list(self.entries):
+        if self.size <= self.maxBytes:
+          break
+        self.size -= self.entries.pop(cvId)
+        try:
+          os.remove(self.path(cvId))
+        except FileNotFoundError:
+          pass
+#
+## End Class ConfigVersionCache
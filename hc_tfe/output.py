@@ -0,0 +1,49 @@
+#
+## hc_tfe/output.py
+#
+## Machine-readable output for the scripts' --format ndjson modes: one compact JSON object per line, no colour
+## codes, so a SIEM or jq can stream-process the output rather than regex-scraping ANSI text.
+#
+#######################################################################################################################
+
+import json
+import sys
+
+############################################################################
+#
+#   Globals
+#
+############################################################################
+
+FORMATS = ('text', 'ndjson')
+
+############################################################################
+#
+# def ndjsonRecord
+#
+############################################################################
+
+## record as a single compact JSON line, without the trailing newline
+#
+def ndjsonRecord(record):
+  return json.dumps(record, separators=(',', ':'), ensure_ascii=False, default=str)
+#
+## End Func ndjsonRecord
+
+############################################################################
+#
+# def writeRecord
+#
+############################################################################
+
+## write record as one NDJSON line to outFile (stdout by default, which is block buffered when piped); flush for
+## events that a consumer should see straight away
+#
+def writeRecord(record, outFile=None, flush=False):
+  if outFile is None:
+    outFile = sys.stdout
+  outFile.write(ndjsonRecord(record) + '\n')
+  if flush:
+    outFile.flush()
+#
+## End Func writeRecord
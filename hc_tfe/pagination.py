@@ -0,0 +1,84 @@
+#
+## hc_tfe/pagination.py
+#
+## Fetch every page of a JSON:API collection, one page or one record at a time.
+## iterPages/iterRecords are generators: page 1 is fetched first to read meta.pagination.total-pages, then the
+## following pages are requested on a small thread pool, a bounded window of them ahead of the consumer, instead of
+## one links.next round trip after another.  Memory is bounded by the window rather than the org, and a consumer
+## that stops early leaves at most the window fetched past where it stopped.
+## The fetch callable is supplied by the calling script so that its own error handling/exit behaviour is kept;
+## it takes a URL and returns the decoded JSON document.  Fetches run on threads so they share the pooled session
+## in hc_tfe.client; concurrent.futures is imported by the function that uses it, keeping script startup light.
+#
+#######################################################################################################################
+
+from collections import deque
+from itertools import islice
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+############################################################################
+#
+# def pageUrl
+#
+############################################################################
+
+## return path with page[number] set to number, keeping any other query parameters (page[size], filters...)
+#
+def pageUrl(path, number):
+  parts = urlsplit(path)
+  query = [ (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != 'page[number]' ]
+  query.append(('page[number]', str(number)))
+  return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), parts.fragment))
+#
+## End Func pageUrl
+
+############################################################################
+#
+# def iterPages
+#
+############################################################################
+
+## yield each page document of path in page order.  With concurrency > 1 and meta.pagination present, up to
+## concurrency pages are in flight ahead of the consumer; otherwise links.next is followed iteratively
+#
+def iterPages(fetch, path, concurrency=1):
+  page = fetch(path)
+  yield page
+
+  pagination = (page.get('meta') or {}).get('pagination')
+  if not pagination or int(concurrency) <= 1:
+    nextpage = (page.get('links') or {}).get('next')
+    while nextpage:
+      page = fetch(nextpage)
+      yield page
+      nextpage = (page.get('links') or {}).get('next')
+    return
+
+  from concurrent.futures import ThreadPoolExecutor
+
+  totalPages = int(pagination.get('total-pages') or 1)
+  numbers    = iter(range(2, totalPages + 1))
+  with ThreadPoolExecutor(max_workers=int(concurrency)) as executor:
+    window = deque(executor.submit(fetch, pageUrl(path, number)) for number in islice(numbers, int(concurrency)))
+    while window:
+      page   = window.popleft().result()
+      number = next(numbers, None)
+      if number is not None:
+        window.append(executor.submit(fetch, pageUrl(path, number)))
+      yield page
+#
+## End Func iterPages
+
+############################################################################
+#
+# def iterRecords
+#
+############################################################################
+
+## yield each record of every page of path, one at a time
+#
+def iterRecords(fetch, path, concurrency=1):
+  for page in iterPages(fetch, path, concurrency):
+    yield from page.get('data') or []
+#
+## End Func iterRecords
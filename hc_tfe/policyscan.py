@@ -0,0 +1,139 @@
+#
+## hc_tfe/policyscan.py
+#
+## Sentinel override attestation for the probe's --scan-since mode.
+## The organisation's run list is read newest first and paging stops at the first run older than the window, so
+## the list costs one call per hundred runs in the window however many workspaces there are.  Only a run whose
+## status timestamps show a policy check has its policy checks fetched, and only a run with an overridden check
+## has its run events fetched, to find who overrode it, when, and any comment left with the override.  Everything
+## here works on the decoded API documents; the calls themselves are made by the probe.
+#
+#######################################################################################################################
+
+from datetime import datetime
+
+############################################################################
+#
+#   Globals
+#
+############################################################################
+
+## the run list fields the scan reads, for a sparse fieldset
+#
+SCAN_RUN_FIELDS = 'status,created-at,status-timestamps,workspace,created-by'
+
+## policy check statuses that mean a failed policy was let through
+#
+OVERRIDDEN = { 'overridden' }
+
+############################################################################
+#
+# def parseStamp
+#
+############################################################################
+
+## an API timestamp as an aware datetime, None if missing
+#
+def parseStamp(text):
+  if not text:
+    return None
+  return datetime.fromisoformat(text.replace('Z', '+00:00'))
+#
+## End Func parseStamp
+
+############################################################################
+#
+# def policyChecked
+#
+############################################################################
+
+## whether run went through a policy check: a policy-* status timestamp (policy-checked-at, policy-soft-failed-at,
+## policy-override-at...) or a policy status now.  Runs in workspaces without Sentinel policies have neither
+#
+def policyChecked(run):
+  attributes = run.get("attributes") or {}
+  if (attributes.get("status") or '').startswith('policy_'):
+    return True
+  return any(stamp.startswith('policy-') for stamp in attributes.get("status-timestamps") or {})
+#
+## End Func policyChecked
+
+############################################################################
+#
+# def overriddenChecks
+#
+############################################################################
+
+## the policy checks in a run's policy-checks document that were overridden
+#
+def overriddenChecks(policyChecks):
+  return [ check for check in policyChecks.get("data") or [] if (check.get("attributes") or {}).get("status") in OVERRIDDEN ]
+#
+## End Func overriddenChecks
+
+############################################################################
+#
+# def overrideEvents
+#
+############################################################################
+
+## the override actions in a run-events document fetched with include=actor,comment, oldest first: when, by whom
+## (username, or user ID if the user was not included) and the comment left with it
+#
+def overrideEvents(eventsDoc):
+  included = { (obj["type"], obj["id"]): obj for obj in eventsDoc.get("included") or [] }
+  events   = []
+  for event in eventsDoc.get("data") or []:
+    if 'overrid' not in ((event.get("attributes") or {}).get("action") or ''):
+      continue
+    relationships = event.get("relationships") or {}
+    actor   = (relationships.get("actor") or {}).get("data") or {}
+    comment = (relationships.get("comment") or {}).get("data") or {}
+    user    = included.get((actor.get("type"), actor.get("id")))
+    note    = included.get((comment.get("type"), comment.get("id")))
+    events.append({
+      'at':      event["attributes"].get("created-at"),
+      'by':      user["attributes"].get("username") if user else actor.get("id"),
+      'comment': note["attributes"].get("body") if note else None
+    })
+  events.sort(key=lambda event: event['at'] or '')
+  return events
+#
+## End Func overrideEvents
+
+############################################################################
+#
+# def overrideRecords
+#
+############################################################################
+
+## one attestation record per overridden policy check of run, matched with the override events in order; the
+## caller adds address and org
+#
+def overrideRecords(run, workspace, policyChecks, events):
+  records = []
+  for n, check in enumerate(overriddenChecks(policyChecks)):
+    attributes = check["attributes"]
+    result     = attributes.get("result") or {}
+    event      = events[n] if n < len(events) else {}
+    records.append({
+      'type':            'override',
+      'workspace':       workspace,
+      'run':             run["id"],
+      'run-created-at':  run["attributes"].get("created-at"),
+      'run-status':      run["attributes"].get("status"),
+      'run-created-by':  (((run.get("relationships") or {}).get("created-by") or {}).get("data") or {}).get("id"),
+      'policy-check':    check["id"],
+      'scope':           attributes.get("scope"),
+      'soft-failed-at':  (attributes.get("status-timestamps") or {}).get("soft-failed-at"),
+      'overridden-at':   (attributes.get("status-timestamps") or {}).get("overridden-at") or event.get('at'),
+      'overridden-by':   event.get('by'),
+      'comment':         event.get('comment'),
+      'passed':          result.get("passed"),
+      'soft-failed':     result.get("soft-failed"),
+      'hard-failed':     result.get("hard-failed"),
+      'advisory-failed': result.get("advisory-failed")
+    })
+  return records
+#
+## End Func overrideRecords
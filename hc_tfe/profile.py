@@ -0,0 +1,258 @@
+#
+## hc_tfe/profile.py
+#
+## Request and phase instrumentation for the scripts' --profile option.
+## TFEClient reports every API call to a Profiler: endpoint (the URL path with IDs folded to :id, so calls group
+## by route), status, bytes, latency including retries, and retry count.  A streamed download's latency runs to
+## its response headers; the time to read the body shows in the phase around it.  The scripts wrap each phase of
+## their work (the workspace list, each workspace probe, downloads, diffs...) in span() blocks.  At the end
+## summary() gives a p50/p95 table per endpoint and per phase, and the raw events can be written as a Chrome trace
+## (open it in chrome://tracing or Perfetto to see what every thread was doing) or as OpenMetrics text for a
+## metrics pipeline.
+## With no profiler every hook is a no-op.
+#
+#######################################################################################################################
+
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from urllib.parse import urlsplit
+
+############################################################################
+#
+#   Globals
+#
+############################################################################
+
+## path segments that are IDs: prefixed (ws-..., run-..., cv-..., sv-..., user-...) so long as there is a digit in
+## them, which route names never have, plain numbers, and the long opaque keys of archivist download URLs
+#
+ID_SEGMENT        = re.compile(r'^[a-z]{2,5}-(?=[\w-]*\d)[\w-]+$|^\d+$|^[\w=-]{32,}$')
+NAMED_COLLECTIONS = { 'organizations' }
+OPENMETRICS_EXT   = ( '.prom', '.om', '.txt' )
+
+############################################################################
+#
+# def endpointOf
+#
+############################################################################
+
+## the route of url: path only, with IDs and organisation names replaced so that calls group together
+#
+def endpointOf(url):
+  segments = urlsplit(url).path.split('/')
+  for n, segment in enumerate(segments):
+    if ID_SEGMENT.match(segment) or (n > 0 and segments[n - 1] in NAMED_COLLECTIONS):
+      segments[n] = ':id'
+  return '/'.join(segments) or '/'
+#
+## End Func endpointOf
+
+############################################################################
+#
+# def percentile
+#
+############################################################################
+
+## nearest-rank percentile of an already sorted list, the same rank analytics.py and runlatency.py take
+#
+def percentile(ordered, fraction):
+  if not ordered:
+    return 0.0
+  rank = max(1, math.ceil(fraction * len(ordered)))
+  return ordered[min(rank, len(ordered)) - 1]
+#
+## End Func percentile
+
+############################################################################
+#
+# Class: Profiler
+#
+############################################################################
+
+## Profiler - collects request records and phase spans from any thread
+#
+class Profiler:
+  def __init__(self):
+    self.lock     = threading.Lock()
+    self.origin   = time.perf_counter()
+    self.requests = []
+    self.spans    = []
+
+  def now(self):
+    return time.perf_counter() - self.origin
+
+  ## one API call: started is a now() value, seconds covers every attempt
+  #
+  def request(self, url, status, size, started, seconds, retries):
+    record = {
+      'endpoint': endpointOf(url),
+      'status':   status,
+      'bytes':    size,
+      'start':    started,
+      'seconds':  seconds,
+      'retries':  retries,
+      'thread':   threading.get_ident()
+    }
+    with self.lock:
+      self.requests.append(record)
+
+  ## time the enclosed block as phase name
+  #
+  def span(self, name, **args):
+    return Span(self, name, args)
+
+  def addSpan(self, name, started, seconds, args):
+    with self.lock:
+      self.spans.append({ 'name': name, 'start': started, 'seconds': seconds, 'thread': threading.get_ident(), 'args': args })
+
+  ## per-endpoint and per-phase rows: count, p50/p95/max seconds, and for endpoints bytes, retries and errors
+  #
+  def summary(self):
+    with self.lock:
+      requests = list(self.requests)
+      spans    = list(self.spans)
+
+    byEndpoint = defaultdict(list)
+    for record in requests:
+      byEndpoint[record['endpoint']].append(record)
+    endpoints = []
+    for endpoint, records in sorted(byEndpoint.items()):
+      times = sorted(record['seconds'] for record in records)
+      endpoints.append({
+        'endpoint': endpoint,
+        'count':    len(records),
+        'errors':   sum(1 for record in records if not record['status'] or record['status'] >= 400),
+        'retries':  sum(record['retries'] for record in records),
+        'bytes':    sum(record['bytes'] or 0 for record in records),
+        'total':    sum(times),
+        'p50':      percentile(times, 0.50),
+        'p95':      percentile(times, 0.95),
+        'max':      times[-1]
+      })
+
+    byPhase = defaultdict(list)
+    for span in spans:
+      byPhase[span['name']].append(span['seconds'])
+    phases = []
+    for name, times in sorted(byPhase.items()):
+      times.sort()
+      phases.append({ 'phase': name, 'count': len(times), 'total': sum(times), 'p50': percentile(times, 0.50), 'p95': percentile(times, 0.95), 'max': times[-1] })
+
+    return endpoints, phases
+
+  ## Chrome trace event format: one complete ("X") event per request and per span, on the thread that made it
+  #
+  def chromeTrace(self):
+    pid    = os.getpid()
+    events = []
+    with self.lock:
+      for record in self.requests:
+        events.append({ 'name': record['endpoint'], 'cat': 'request', 'ph': 'X', 'pid': pid, 'tid': record['thread'],
+                        'ts': record['start'] * 1e6, 'dur': record['seconds'] * 1e6,
+                        'args': { 'status': record['status'], 'bytes': record['bytes'], 'retries': record['retries'] } })
+      for span in self.spans:
+        events.append({ 'name': span['name'], 'cat': 'phase', 'ph': 'X', 'pid': pid, 'tid': span['thread'],
+                        'ts': span['start'] * 1e6, 'dur': span['seconds'] * 1e6, 'args': span['args'] })
+    events.sort(key=lambda event: event['ts'])
+    return { 'traceEvents': events, 'displayTimeUnit': 'ms' }
+
+  def openMetrics(self):
+    endpoints, phases = self.summary()
+    lines = [ '# TYPE tfe_request_seconds summary', '# UNIT tfe_request_seconds seconds', '# HELP tfe_request_seconds TFE API call latency including retries' ]
+    for row in endpoints:
+      label = f'endpoint="{row["endpoint"]}"'
+      lines.append(f'tfe_request_seconds{{{label},quantile="0.5"}} {row["p50"]:.6f}')
+      lines.append(f'tfe_request_seconds{{{label},quantile="0.95"}} {row["p95"]:.6f}')
+      lines.append(f'tfe_request_seconds_sum{{{label}}} {row["total"]:.6f}')
+      lines.append(f'tfe_request_seconds_count{{{label}}} {row["count"]}')
+    for metric, key, helpText in (('tfe_request_bytes', 'bytes', 'Response bytes by endpoint'), ('tfe_request_retries', 'retries', 'Retried attempts by endpoint'), ('tfe_request_errors', 'errors', 'Calls ending in an error status by endpoint')):
+      lines.append(f'# TYPE {metric} counter')
+      lines.append(f'# HELP {metric} {helpText}')
+      for row in endpoints:
+        lines.append(f'{metric}_total{{endpoint="{row["endpoint"]}"}} {row[key]}')
+    lines += [ '# TYPE tfe_phase_seconds summary', '# UNIT tfe_phase_seconds seconds', '# HELP tfe_phase_seconds Time spent per phase' ]
+    for row in phases:
+      label = f'phase="{row["phase"]}"'
+      lines.append(f'tfe_phase_seconds{{{label},quantile="0.5"}} {row["p50"]:.6f}')
+      lines.append(f'tfe_phase_seconds{{{label},quantile="0.95"}} {row["p95"]:.6f}')
+      lines.append(f'tfe_phase_seconds_sum{{{label}}} {row["total"]:.6f}')
+      lines.append(f'tfe_phase_seconds_count{{{label}}} {row["count"]}')
+    lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
+
+  ## write the trace to path: OpenMetrics text for .prom/.om/.txt, otherwise Chrome trace JSON
+  #
+  def write(self, path):
+    with open(path, 'w') as outFile:
+      if path.endswith(OPENMETRICS_EXT):
+        outFile.write(self.openMetrics())
+      else:
+        json.dump(self.chromeTrace(), outFile)
+#
+## End Class Profiler
+
+############################################################################
+#
+# Class: Span
+#
+############################################################################
+
+## Span - context manager timing one phase
+#
+class Span:
+  def __init__(self, profiler, name, args):
+    self.profiler = profiler
+    self.name     = name
+    self.args     = args
+
+  def __enter__(self):
+    self.started = self.profiler.now()
+    return self
+
+  def __exit__(self, *exc):
+    self.profiler.addSpan(self.name, self.started, self.profiler.now() - self.started, self.args)
+    return False
+#
+## End Class Span
+
+############################################################################
+#
+# def span
+#
+############################################################################
+
+## profiler.span(name) when profiling, otherwise a no-op context
+#
+def span(profiler, name, **args):
+  if profiler is None:
+    return nullcontext()
+  return profiler.span(name, **args)
+#
+## End Func span
+
+############################################################################
+#
+# def summaryLines
+#
+############################################################################
+
+## the summary as aligned text table lines
+#
+def summaryLines(profiler):
+  endpoints, phases = profiler.summary()
+  lines = [ f'{"endpoint":<58} {"calls":>6} {"errors":>6} {"retries":>7} {"bytes":>12} {"p50 ms":>9} {"p95 ms":>9} {"max ms":>9}' ]
+  for row in endpoints:
+    lines.append(f'{row["endpoint"]:<58} {row["count"]:>6} {row["errors"]:>6} {row["retries"]:>7} {row["bytes"]:>12} {row["p50"] * 1000:>9.1f} {row["p95"] * 1000:>9.1f} {row["max"] * 1000:>9.1f}')
+  lines.append('')
+  lines.append(f'{"phase":<58} {"count":>6} {"total s":>9} {"p50 ms":>9} {"p95 ms":>9} {"max ms":>9}')
+  for row in phases:
+    lines.append(f'{row["phase"]:<58} {row["count"]:>6} {row["total"]:>9.2f} {row["p50"] * 1000:>9.1f} {row["p95"] * 1000:>9.1f} {row["max"] * 1000:>9.1f}')
+  return lines
+#
+## End Func summaryLines
@@ -0,0 +1,147 @@
+#
+## hc_tfe/ratelimit.py
+#
+## Client-side pacing for the TFE API rate limit (30 requests/second per user by default).
+## RateLimiter is shared by every thread using a TFEClient: requests take a token from a token bucket before they
+## go out, the bucket rate follows the X-RateLimit-Limit header, and when X-RateLimit-Remaining hits zero all
+## requests are held until X-RateLimit-Reset has passed.  429 and 5xx responses are retried with jittered
+## exponential backoff rather than ending a sweep that may have been running for an hour.
+#
+#######################################################################################################################
+
+import random
+import threading
+import time
+
+############################################################################
+#
+#   Globals
+#
+############################################################################
+
+RATE           = 30
+MAX_RETRIES    = 5
+BACKOFF        = 0.5
+MAX_BACKOFF    = 30.0
+RETRY_STATUSES = { 429, 500, 502, 503, 504 }
+
+############################################################################
+#
+# def headerFloat
+#
+############################################################################
+
+## return a numeric response header as a float, or None if it is absent or junk
+#
+def headerFloat(response, name):
+  try:
+    return float(response.headers[name])
+  except (KeyError, TypeError, ValueError):
+    return None
+#
+## End Func headerFloat
+
+############################################################################
+#
+# Class: TokenBucket
+#
+############################################################################
+
+## TokenBucket - thread-safe token bucket; rate tokens are added per second up to capacity, a rate of 0 disables
+## pacing.  pause() empties the bucket and holds every caller until the given monotonic time
+#
+class TokenBucket:
+  def __init__(self, rate, capacity=None):
+    self.lock        = threading.Lock()
+    self.rate        = float(rate)
+    self.capacity    = float(capacity or rate or 1)
+    self.tokens      = self.capacity
+    self.updated     = time.monotonic()
+    self.pausedUntil = 0.0
+
+  def setRate(self, rate):
+    with self.lock:
+      self.refill(time.monotonic())
+      self.rate     = float(rate)
+      self.capacity = float(rate or 1)
+      self.tokens   = min(self.tokens, self.capacity)
+
+  def pause(self, until):
+    with self.lock:
+      self.pausedUntil = max(self.pausedUntil, until)
+      self.tokens      = 0.0
+
+  ## caller must hold the lock
+  #
+  def refill(self, now):
+    if self.rate > 0:
+      self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+    self.updated = now
+
+  def acquire(self):
+    while True:
+      with self.lock:
+        now = time.monotonic()
+        if now < self.pausedUntil:
+          wait = self.pausedUntil - now
+        elif self.rate <= 0:
+          return
+        else:
+          self.refill(now)
+          if self.tokens >= 1:
+            self.tokens -= 1
+            return
+          wait = (1 - self.tokens) / self.rate
+      time.sleep(wait)
+#
+## End Class TokenBucket
+
+############################################################################
+#
+# Class: RateLimiter
+#
+############################################################################
+
+## RateLimiter - paces requests and decides on and times retries
+#
+class RateLimiter:
+  def __init__(self, rate=RATE, maxRetries=MAX_RETRIES, backoff=BACKOFF, maxBackoff=MAX_BACKOFF):
+    self.rate       = float(rate)
+    self.bucket     = TokenBucket(rate)
+    self.maxRetries = int(maxRetries)
+    self.backoff    = float(backoff)
+    self.maxBackoff = float(maxBackoff)
+
+  ## block until a request may be sent
+  #
+  def wait(self):
+    self.bucket.acquire()
+
+  ## adjust pacing to what the server says the limit and remaining budget are; never faster than the
+  ## configured rate
+  #
+  def update(self, response):
+    limit = headerFloat(response, 'X-RateLimit-Limit')
+    if limit and self.rate > 0 and min(limit, self.rate) != self.bucket.rate:
+      self.bucket.setRate(min(limit, self.rate))
+
+    remaining = headerFloat(response, 'X-RateLimit-Remaining')
+    reset     = headerFloat(response, 'X-RateLimit-Reset')
+    if remaining is not None and remaining < 1 and reset:
+      self.bucket.pause(time.monotonic() + reset)
+
+  def shouldRetry(self, statusCode, attempt):
+    return statusCode in RETRY_STATUSES and attempt < self.maxRetries
+
+  ## seconds to wait before retry number attempt (0-based); a 429 waits out the server's reset/Retry-After,
+  ## anything else gets full-jitter exponential backoff
+  #
+  def delay(self, attempt, response=None):
+    if response is not None and response.status_code == 429:
+      serverWait = headerFloat(response, 'Retry-After') or headerFloat(response, 'X-RateLimit-Reset')
+      if serverWait:
+        self.bucket.pause(time.monotonic() + serverWait)
+        return serverWait + random.uniform(0, self.backoff)
+    return random.uniform(0, min(self.maxBackoff, self.backoff * (2 ** attempt)))
+#
+## End Class RateLimiter
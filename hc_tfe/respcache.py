@@ -0,0 +1,96 @@
+#
+## hc_tfe/respcache.py
+#
+## Conditional-request cache for JSON API responses that mostly do not change between probes (workspace,
+## configuration version and state version lists).
+## Each entry keeps the decoded body with the ETag/Last-Modified validators the server sent.  Later requests for the
+## same URL send If-None-Match/If-Modified-Since and a 304 hands back the stored body, so there is no payload to
+## transfer and nothing to JSON-decode.  Responses without validators are reused for ttl seconds, then refetched.
+## Entries are marshal files: the bodies are plain JSON-shaped data, marshal loads it much faster than json and,
+## unlike pickle, cannot execute code.  Keys include a hash of the token so different identities never share.
+#
+#######################################################################################################################
+
+import hashlib
+import marshal
+import os
+import threading
+import time
+
+############################################################################
+#
+#   Globals
+#
+############################################################################
+
+TTL = 300
+
+############################################################################
+#
+# Class: ResponseCache
+#
+############################################################################
+
+## ResponseCache - one file per URL under directory; safe to share between probe threads
+#
+class ResponseCache:
+  def __init__(self, directory, token, ttl=TTL):
+    self.directory = directory
+    self.ttl       = float(ttl)
+    self.tokenHash = hashlib.sha256(f'{token}'.encode()).hexdigest()
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+
+  def path(self, url):
+    key = hashlib.sha256(f'{self.tokenHash}\n{url}'.encode()).hexdigest()
+    return os.path.join(self.directory, f'{key}.marshal')
+
+  ## return the stored entry for url, or None
+  #
+  def lookup(self, url):
+    try:
+      with open(self.path(url), 'rb') as inFile:
+        entry = marshal.load(inFile)
+    except (OSError, EOFError, ValueError, TypeError):
+      return None
+    if not isinstance(entry, dict) or entry.get('url') != url:
+      return None
+    return entry
+
+  ## an entry without validators is served as-is while it is younger than ttl
+  #
+  def isFresh(self, entry):
+    return not entry.get('etag') and not entry.get('last-modified') and time.time() - entry['stored'] < self.ttl
+
+  ## headers to make the request for entry conditional
+  #
+  def conditionalHeaders(self, entry):
+    headers = {}
+    if entry is None:
+      return headers
+    if entry.get('etag'):
+      headers['If-None-Match'] = entry['etag']
+    if entry.get('last-modified'):
+      headers['If-Modified-Since'] = entry['last-modified']
+    return headers
+
+  def store(self, url, response, body):
+    entry = {
+      'url':           url,
+      'etag':          response.headers.get('ETag'),
+      'last-modified': response.headers.get('Last-Modified'),
+      'stored':        time.time(),
+      'body':          body
+    }
+    path    = self.path(url)
+    tmpPath = f'{path}.{os.getpid()}.{threading.get_ident()}'
+    try:
+      with open(tmpPath, 'wb') as outFile:
+        marshal.dump(entry, outFile)
+      os.replace(tmpPath, path)
+    except (OSError, ValueError):
+      ## an uncacheable body or a full disk only costs the next probe a full fetch
+      #
+      if os.path.exists(tmpPath):
+        os.remove(tmpPath)
+#
+## End Class ResponseCache
@@ -0,0 +1,134 @@
+#
+## hc_tfe/runlatency.py
+#
+## Run latency analytics for the probe's --latency mode, for sizing TFE agent capacity.
+## Runs are folded into RunTimings one at a time as the run list pages arrive and are never kept: each status
+## timestamp a stage needs goes into its own flat column of epoch seconds (NaN where the run never reached that
+## status) and the workspace into a column of workspace numbers, 8 bytes a value.  summary() hands the columns to
+## NumPy once: each stage duration is one subtraction of two columns, and the nearest-rank percentiles of every
+## workspace come from a single sort by workspace then duration, with the rank of each percentile in each workspace
+## computed as arrays rather than in a loop over workspaces.
+## NumPy is only imported by summary(), so it is needed for --latency alone.
+#
+#######################################################################################################################
+
+import math
+from array import array
+from datetime import datetime
+
+############################################################################
+#
+#   Globals
+#
+############################################################################
+
+PERCENTILES = ( 50, 95, 99 )
+
+## stages: report label and the status timestamps that start and end it.  The two queue waits are time spent
+## waiting for an agent (or worker) to pick the run up
+#
+STAGES = {
+  'queue-wait':       ( 'plan-queued-at', 'planning-at' ),
+  'plan':             ( 'planning-at', 'planned-at' ),
+  'apply-queue-wait': ( 'apply-queued-at', 'applying-at' ),
+  'apply':            ( 'applying-at', 'applied-at' )
+}
+STAMPS = sorted({ stamp for stage in STAGES.values() for stamp in stage })
+
+############################################################################
+#
+# def groupStats
+#
+############################################################################
+
+## per-group count, nearest-rank percentiles, mean and max of values, groups being integers below groupCount.
+## Returns a dict of arrays indexed by group; groups with no values get NaN
+#
+def groupStats(np, groups, values, groupCount):
+  counts = np.bincount(groups, minlength=groupCount)
+  stats  = { 'runs': counts }
+  if len(values) == 0:
+    for key in [ f'p{p}' for p in PERCENTILES ] + [ 'mean', 'max' ]:
+      stats[key] = np.full(groupCount, np.nan)
+    return stats
+
+  ordered = values[np.lexsort((values, groups))]
+  starts  = np.cumsum(counts) - counts
+  last    = np.maximum(starts + counts - 1, 0)
+  empty   = counts == 0
+  for p in PERCENTILES:
+    rank = np.maximum(-(-p * counts // 100) - 1, 0)
+    stats[f'p{p}'] = np.where(empty, np.nan, ordered[np.minimum(starts + rank, last)])
+  stats['mean'] = np.where(empty, np.nan, np.bincount(groups, weights=values, minlength=groupCount) / np.maximum(counts, 1))
+  stats['max']  = np.where(empty, np.nan, ordered[last])
+  return stats
+#
+## End Func groupStats
+
+############################################################################
+#
+# Class: RunTimings
+#
+############################################################################
+
+## RunTimings - status timestamps of every run added, by column
+#
+class RunTimings:
+  def __init__(self):
+    self.columns    = { stamp: array('d') for stamp in STAMPS }
+    self.workspaces = array('q')
+    self.names      = {}
+
+  ## fold one run record in, from workspace
+  #
+  def add(self, run, workspace):
+    self.workspaces.append(self.names.setdefault(workspace, len(self.names)))
+    stamps = (run.get("attributes") or {}).get("status-timestamps") or {}
+    for stamp, column in self.columns.items():
+      text = stamps.get(stamp)
+      column.append(datetime.fromisoformat(text.replace('Z', '+00:00')).timestamp() if text else math.nan)
+
+  def __len__(self):
+    return len(self.workspaces)
+
+  ## org-wide and per-workspace seconds for each stage: runs that reached both ends of it, p50/p95/p99, mean, max.
+  ## A stage whose end is stamped before its start (clock skew) is left out
+  #
+  def summary(self):
+    import numpy as np
+
+    workspaces = np.frombuffer(self.workspaces, dtype=np.int64) if len(self) else np.zeros(0, dtype=np.int64)
+    columns    = { stamp: np.frombuffer(column, dtype=np.float64) if len(self) else np.zeros(0) for stamp, column in self.columns.items() }
+    names      = sorted(self.names, key=self.names.get)
+    runs       = np.bincount(workspaces, minlength=len(names))
+
+    summary = { 'runs': len(self), 'stages': {}, 'workspaces': [ { 'workspace': name, 'runs': int(runs[n]) } for n, name in enumerate(names) ] }
+    for stage, (start, end) in STAGES.items():
+      durations = columns[end] - columns[start]
+      valid     = durations >= 0  # NaN compares false
+      durations = durations[valid]
+      org       = groupStats(np, np.zeros(len(durations), dtype=np.int64), durations, 1)
+      perWs     = groupStats(np, workspaces[valid], durations, len(names))
+      summary['stages'][stage] = statsRow(org, 0)
+      for n, record in enumerate(summary['workspaces']):
+        record[stage] = statsRow(perWs, n)
+    return summary
+#
+## End Class RunTimings
+
+############################################################################
+#
+# def statsRow
+#
+############################################################################
+
+## row n of groupStats arrays as plain numbers, seconds to 0.1, None where there were no runs
+#
+def statsRow(stats, n):
+  row = { 'runs': int(stats['runs'][n]) }
+  for key, values in stats.items():
+    if key != 'runs':
+      row[key] = None if math.isnan(values[n]) else round(float(values[n]), 1)
+  return row
+#
+## End Func statsRow
@@ -0,0 +1,237 @@
+#
+## hc_tfe/statediff.py
+#
+## Native Terraform state comparison, replacing two `terraform state list` runs plus a `diff` subprocess.
+## The state file is parsed incrementally: the top-level object is walked key by key and each element of the
+## "resources" array is decoded on its own from a chunked read, so a 100MB+ state never has to be held as one
+## parsed document.  Every resource instance is reduced to its address (as `terraform state list` prints it) and a
+## digest of its attributes; comparing two of those indexes gives the added, removed and changed instances.
+## No terraform binary is needed on the probe host.
+## Where only resource-level changes matter, diffSummaries() compares the processed "resources" summaries TFE keeps
+## on each state version object instead, so no state file is downloaded at all.
+#
+#######################################################################################################################
+
+import hashlib
+import json
+import re
+
+############################################################################
+#
+#   Globals
+#
+############################################################################
+
+CHUNK_SIZE  = 1024 * 1024
+WHITESPACE  = re.compile(r'[ \t\n\r]*')
+NUMBER_TAIL = re.compile(r'[0-9.eE+-]*')
+
+############################################################################
+#
+# Class: JSONStream
+#
+############################################################################
+
+## JSONStream - just enough of a pull parser to walk the top level of a large JSON document: structural characters
+## are consumed one at a time and complete values are decoded with raw_decode as soon as enough text is buffered
+#
+class JSONStream:
+  def __init__(self, inFile, chunkSize=CHUNK_SIZE):
+    self.inFile    = inFile
+    self.chunkSize = chunkSize
+    self.decoder   = json.JSONDecoder()
+    self.buffer    = ''
+    self.pos       = 0
+    self.eof       = False
+
+  ## read another size characters (a chunk by default), dropping what has already been consumed; False at end of
+  ## file
+  #
+  def fill(self, size=None):
+    if self.eof:
+      return False
+    chunk = self.inFile.read(size or self.chunkSize)
+    if not chunk:
+      self.eof = True
+      return False
+    self.buffer = self.buffer[self.pos:] + chunk
+    self.pos    = 0
+    return True
+
+  def peek(self):
+    while True:
+      self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+      if self.pos < len(self.buffer):
+        return self.buffer[self.pos]
+      if not self.fill():
+        raise ValueError('unexpected end of state file')
+
+  def expect(self, char):
+    if self.peek() != char:
+      raise ValueError(f'expected {char!r} at offset {self.pos} of state file, found {self.buffer[self.pos]!r}')
+    self.pos += 1
+
+  ## consume char if it is next, e.g. an optional comma
+  #
+  def accept(self, char):
+    if self.peek() == char:
+      self.pos += 1
+      return True
+    return False
+
+  ## decode the next complete value.  Each failed attempt re-decodes the value from its start, so while one value
+  ## spans chunks the reads double in size: a value of n characters costs O(n) decoding, not O(n^2 / chunk)
+  #
+  def value(self):
+    self.peek()
+    size = self.chunkSize
+    while True:
+      try:
+        obj, end = self.decoder.raw_decode(self.buffer, self.pos)
+      except json.JSONDecodeError:
+        if not self.fill(size):
+          raise
+        size *= 2
+        continue
+      ## a number with nothing but more number characters after it may continue in the next chunk
+      #
+      if isinstance(obj, (int, float)) and NUMBER_TAIL.fullmatch(self.buffer, end) and self.fill(size):
+        size *= 2
+        continue
+      self.pos = end
+      return obj
+#
+## End Class JSONStream
+
+############################################################################
+#
+# def iterResources
+#
+############################################################################
+
+## yield each element of the top-level "resources" array of the state file at path, one at a time
+#
+def iterResources(path, chunkSize=CHUNK_SIZE):
+  with open(path, 'r', encoding='utf-8') as inFile:
+    stream = JSONStream(inFile, chunkSize)
+    stream.expect('{')
+    if stream.accept('}'):
+      return
+    while True:
+      key = stream.value()
+      stream.expect(':')
+      if key == 'resources':
+        stream.expect('[')
+        if not stream.accept(']'):
+          while True:
+            yield stream.value()
+            if stream.accept(']'):
+              break
+            stream.expect(',')
+      else:
+        stream.value()
+      if stream.accept('}'):
+        return
+      stream.expect(',')
+#
+## End Func iterResources
+
+############################################################################
+#
+# def instanceAddress
+#
+############################################################################
+
+## resource instance address the way `terraform state list` prints it
+#
+def instanceAddress(resource, instance):
+  address = ''
+  if resource.get('module'):
+    address = f'{resource["module"]}.'
+  if resource.get('mode') == 'data':
+    address += 'data.'
+  address += f'{resource["type"]}.{resource["name"]}'
+  if 'index_key' in instance:
+    address += f'[{json.dumps(instance["index_key"], ensure_ascii=False)}]'
+  return address
+#
+## End Func instanceAddress
+
+############################################################################
+#
+# def stateIndex
+#
+############################################################################
+
+## map every resource instance address in the state file at path to a digest of its attributes
+#
+def stateIndex(path, chunkSize=CHUNK_SIZE):
+  index = {}
+  for resource in iterResources(path, chunkSize):
+    for instance in resource.get('instances') or []:
+      attributes = instance.get('attributes', instance.get('attributes_flat'))
+      encoded    = json.dumps(attributes, sort_keys=True, separators=(',', ':')).encode()
+      index[instanceAddress(resource, instance)] = hashlib.sha256(encoded).digest()
+  return index
+#
+## End Func stateIndex
+
+############################################################################
+#
+# def diffStates
+#
+############################################################################
+
+## compare the states at path0 and path1; returns sorted (added, removed, changed) address lists, where added
+## means in path1 but not path0
+#
+def diffStates(path0, path1, chunkSize=CHUNK_SIZE):
+  index0 = stateIndex(path0, chunkSize)
+  index1 = stateIndex(path1, chunkSize)
+
+  added   = sorted(address for address in index1 if address not in index0)
+  removed = sorted(address for address in index0 if address not in index1)
+  changed = sorted(address for address, digest in index1.items() if address in index0 and index0[address] != digest)
+  return added, removed, changed
+#
+## End Func diffStates
+
+############################################################################
+#
+# def summaryIndex
+#
+############################################################################
+
+## map every resource in a state version's "resources" summary to its (count, provider); root module resources are
+## addressed without a module prefix, as in the state file
+#
+def summaryIndex(resources):
+  index = {}
+  for resource in resources or []:
+    address = f'{resource["type"]}.{resource["name"]}'
+    if resource.get('module') and resource['module'] != 'root':
+      address = f'{resource["module"]}.{address}'
+    index[address] = (resource.get('count'), resource.get('provider'))
+  return index
+#
+## End Func summaryIndex
+
+############################################################################
+#
+# def diffSummaries
+#
+############################################################################
+
+## compare two state version resource summaries; returns sorted (added, removed, changed) resource addresses, where
+## changed means the instance count or provider moved
+#
+def diffSummaries(resources0, resources1):
+  index0 = summaryIndex(resources0)
+  index1 = summaryIndex(resources1)
+
+  added   = sorted(address for address in index1 if address not in index0)
+  removed = sorted(address for address in index0 if address not in index1)
+  changed = sorted(address for address, summary in index1.items() if address in index0 and index0[address] != summary)
+  return added, removed, changed
+#
+## End Func diffSummaries
@@ -0,0 +1,178 @@
+#
+## hc_tfe/tardiff.py
+#
+## In-process diff of two configuration version tarballs, replacing extract-to-disk plus a `diff -dabEBur`
+## subprocess.  Each archive is read exactly once in tarfile stream mode ('r|*', so gzipped or plain tar): the old
+## archive's members are held in memory with a content hash, the new archive is compared member by member as it
+## streams past, and difflib only runs on members whose hashes differ.  No temporary files, no fork/exec.
+## loadTree()/diffTrees() are the two halves, for walking a run of versions with each decoded only once.
+## Whitespace handling follows the diff flags the probe used: runs of whitespace compare equal (-b, -E) and changes
+## made up only of blank lines are ignored (-B).
+#
+#######################################################################################################################
+
+import difflib
+import hashlib
+import re
+import tarfile
+
+############################################################################
+#
+#   Globals
+#
+############################################################################
+
+CONTEXT_LINES = 3
+WHITESPACE    = re.compile(r'\s+')
+
+############################################################################
+#
+# Class: DiffLine
+#
+############################################################################
+
+## DiffLine - a line of text that compares equal to any line differing only in amount of whitespace, so that
+## difflib matches the way `diff -b` does while still printing the original text.  As with -b, trailing whitespace
+## is ignored but leading indentation added where there was none is a change
+#
+class DiffLine(str):
+  def __new__(cls, text):
+    line     = super().__new__(cls, text)
+    line.key = WHITESPACE.sub(' ', text).rstrip()
+    return line
+
+  def __eq__(self, other):
+    return self.key == getattr(other, 'key', other)
+
+  def __ne__(self, other):
+    return not self.__eq__(other)
+
+  def __hash__(self):
+    return hash(self.key)
+#
+## End Class DiffLine
+
+############################################################################
+#
+# def memberName
+#
+############################################################################
+
+## archive member name without any leading ./
+#
+def memberName(member):
+  name = member.name
+  while name.startswith('./'):
+    name = name[2:]
+  return name
+#
+## End Func memberName
+
+############################################################################
+#
+# def iterMembers
+#
+############################################################################
+
+## yield (name, sha256 digest, content bytes) for each file or symlink in the archive, in a single streaming pass
+#
+def iterMembers(archive):
+  if isinstance(archive, str):
+    tarFH = tarfile.open(archive, mode='r|*')
+  else:
+    tarFH = tarfile.open(fileobj=archive, mode='r|*')
+  with tarFH:
+    for member in tarFH:
+      if member.isfile():
+        content = tarFH.extractfile(member).read()
+      elif member.issym() or member.islnk():
+        content = f'-> {member.linkname}\n'.encode()
+      else:
+        continue
+      yield memberName(member), hashlib.sha256(content).digest(), content
+#
+## End Func iterMembers
+
+############################################################################
+#
+# def diffText
+#
+############################################################################
+
+## unified diff of two member contents, or '' if they only differ in whitespace or blank lines
+#
+def diffText(content0, content1, label0, label1):
+  lines0 = [ DiffLine(line) for line in content0.decode('utf-8', errors='replace').splitlines() ]
+  lines1 = [ DiffLine(line) for line in content1.decode('utf-8', errors='replace').splitlines() ]
+
+  matcher = difflib.SequenceMatcher(None, lines0, lines1, autojunk=False)
+  changed = [ line for tag, i0, i1, j0, j1 in matcher.get_opcodes() if tag != 'equal' for line in lines0[i0:i1] + lines1[j0:j1] ]
+  if all(line.key == '' for line in changed):
+    return ''
+
+  diffLines = difflib.unified_diff(lines0, lines1, fromfile=label0, tofile=label1, n=CONTEXT_LINES, lineterm='')
+  return '\n'.join(diffLines) + '\n'
+#
+## End Func diffText
+
+############################################################################
+#
+# def loadTree
+#
+############################################################################
+
+## decode archive (path or binary file object) once into { name: (sha256 digest, content bytes) }, for callers
+## that diff the same version against more than one other, e.g. the probe's --history walk
+#
+def loadTree(archive):
+  return { name: (digest, content) for name, digest, content in iterMembers(archive) }
+#
+## End Func loadTree
+
+############################################################################
+#
+# def diffTrees
+#
+############################################################################
+
+## return the differences between tree0 (from loadTree) and members1 (a loadTree dict, or (name, digest, content)
+## tuples as iterMembers yields them) as diff -r style text, '' when they are the same.  tree0 is left as it was
+#
+def diffTrees(tree0, members1, label0='a', label1='b'):
+  if isinstance(members1, dict):
+    members1 = ( (name, digest, content) for name, (digest, content) in members1.items() )
+  only0    = set(tree0)
+  sections = {}
+
+  for name, digest1, content1 in members1:
+    member0 = tree0.get(name)
+    if member0 is None:
+      sections[name] = f'Only in {label1}: {name}\n'
+      continue
+    only0.discard(name)
+    if member0[0] != digest1:
+      text = diffText(member0[1], content1, f'{label0}/{name}', f'{label1}/{name}')
+      if text:
+        sections[name] = text
+
+  for name in only0:
+    sections[name] = f'Only in {label0}: {name}\n'
+
+  return ''.join(sections[name] for name in sorted(sections))
+#
+## End Func diffTrees
+
+############################################################################
+#
+# def diffArchives
+#
+############################################################################
+
+## return the differences between archive0 and archive1 (paths or binary file objects) as diff -r style text,
+## '' when they are the same.  label0/label1 prefix member names in the output, e.g. the configuration version IDs.
+## archive1 is compared as it streams past rather than decoded whole
+#
+def diffArchives(archive0, archive1, label0='a', label1='b'):
+  return diffTrees(loadTree(archive0), iterMembers(archive1), label0, label1)
+#
+## End Func diffArchives
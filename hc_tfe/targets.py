@@ -0,0 +1,184 @@
+#
+## hc_tfe/targets.py
+#
+## Fan one script invocation out over several TFE/TFC instances and organisations.
+## A targets file lists one target per line: address, organisation, and optionally the name of the environment
+## variable holding that instance's token (default TFE_TOKEN) and a CA bundle path (default TFE_CACERT), e.g.
+##
+##   # address                    org          token variable   CA bundle
+##   https://tfe1.example.com     platform     TFE1_TOKEN       /etc/pki/tfe1-ca.pem
+##   https://tfe1.example.com     networks     TFE1_TOKEN       /etc/pki/tfe1-ca.pem
+##   https://app.terraform.io     acme         TFC_TOKEN
+##
+## Tokens themselves never go in the file.  fanOut() runs the calling script once per target as a child process
+## with TFE_ADDR, TFE_ORG, TFE_TOKEN and TFE_CACERT set for it, a bounded number at a time, and hands back each
+## target's exit code, wall time and captured output in file order for the caller to merge.  Each child keeps its
+## own connection pool, rate limiter and --jobs, which is what bounds the concurrency against any one target.
+## Children run with TFE_TARGET_CHILD set, and a script that finds it set refuses to fan out again, so an option
+## that slips through to a child cannot make it recurse.
+#
+#######################################################################################################################
+
+import os
+import sys
+import time
+from collections import namedtuple
+
+############################################################################
+#
+#   Globals
+#
+############################################################################
+
+PARALLEL_TARGETS = 4
+TOKEN_VAR        = 'TFE_TOKEN'
+CHILD_VAR        = 'TFE_TARGET_CHILD'
+
+Target = namedtuple('Target', 'address org token cacert')
+
+############################################################################
+#
+# def loadTargets
+#
+############################################################################
+
+## parse the targets file at path; raises ValueError naming the line for a malformed target or an unset token
+## variable, so a typo stops the run before anything is called
+#
+def loadTargets(path):
+  targets = []
+  with open(path) as targetsFile:
+    for n, line in enumerate(targetsFile, 1):
+      fields = line.split('#', 1)[0].split()
+      if not fields:
+        continue
+      if len(fields) < 2 or len(fields) > 4:
+        raise ValueError(f'{path}:{n}: expected "address org [token-variable [ca-bundle]]"')
+
+      address  = fields[0] if fields[0].startswith(('https://', 'http://')) else f'https://{fields[0]}'
+      tokenVar = fields[2] if len(fields) > 2 else TOKEN_VAR
+      token    = os.getenv(tokenVar)
+      if not token:
+        raise ValueError(f'{path}:{n}: token variable {tokenVar} is not set')
+      cacert   = fields[3] if len(fields) > 3 else os.getenv('TFE_CACERT')
+      targets.append(Target(address.rstrip('/'), fields[1], token, cacert))
+
+  if not targets:
+    raise ValueError(f'{path}: no targets')
+  return targets
+#
+## End Func loadTargets
+
+############################################################################
+#
+# def childArgv
+#
+############################################################################
+
+## argv with the named options and their values removed, for re-running the script once per target.  Values may
+## follow as the next word, after "=" ("--opt=value", "-o=value") or, for a short option, attached ("-ovalue");
+## the scripts' parsers do not accept abbreviated long options, so every spelling is covered.  Anything after
+## "--" is kept as it is
+#
+def childArgv(argv, options):
+  shorts = tuple(option for option in options if len(option) == 2 and option[1] != '-')
+  kept   = []
+  skip   = False
+  for n, word in enumerate(argv):
+    if skip:
+      skip = False
+    elif word == '--':
+      return kept + argv[n:]
+    elif word in options:
+      skip = True
+    elif word.split('=', 1)[0] in options:
+      continue
+    elif not word.startswith('--') and word.startswith(shorts):
+      continue
+    else:
+      kept.append(word)
+  return kept
+#
+## End Func childArgv
+
+############################################################################
+#
+# def runTarget
+#
+############################################################################
+
+## run command against one target; stdout is captured unless capture is False (e.g. --watch, where children stream
+## straight to the terminal), stderr always passes through.  The child is added to live while it runs
+#
+def runTarget(command, target, capture=True, live=None):
+  import subprocess
+
+  env = dict(os.environ, TFE_ADDR=target.address, TFE_ORG=target.org, TFE_TOKEN=target.token)
+  env[CHILD_VAR] = '1'
+  env.pop('TFE_TARGETS', None)  # or the child would fan out again
+  if target.cacert:
+    env['TFE_CACERT'] = target.cacert
+
+  started = time.monotonic()
+  child   = subprocess.Popen(command, env=env, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE if capture else None)
+  if live is not None:
+    live.add(child)
+  try:
+    output, _ = child.communicate()
+  finally:
+    if live is not None:
+      live.discard(child)
+  return { 'target': target, 'exit': child.returncode, 'seconds': time.monotonic() - started, 'output': output.decode(errors='replace') if capture else '' }
+#
+## End Func runTarget
+
+############################################################################
+#
+# def fanOut
+#
+############################################################################
+
+## run command once per target, parallel at a time, yielding results in targets order as each becomes available.
+## Children still running when the caller stops early (an error, SIGTERM) are terminated rather than left behind
+#
+def fanOut(command, targets, parallel=PARALLEL_TARGETS, capture=True):
+  from concurrent.futures import ThreadPoolExecutor
+
+  live     = set()
+  executor = ThreadPoolExecutor(max_workers=max(1, parallel))
+  try:
+    futures = [ executor.submit(runTarget, command, target, capture, live) for target in targets ]
+    for future in futures:
+      yield future.result()
+  finally:
+    executor.shutdown(wait=False, cancel_futures=True)
+    for child in list(live):
+      child.terminate()
+#
+## End Func fanOut
+
+############################################################################
+#
+# def isTargetChild
+#
+############################################################################
+
+## whether this process was started by fanOut() for one target, and so must not fan out itself
+#
+def isTargetChild():
+  return os.getenv(CHILD_VAR) == '1'
+#
+## End Func isTargetChild
+
+############################################################################
+#
+# def scriptCommand
+#
+############################################################################
+
+## the command that re-runs the calling script under the same interpreter, minus the fan-out options
+#
+def scriptCommand(script, options):
+  return [ sys.executable, os.path.abspath(script) ] + childArgv(sys.argv[1:], options)
+#
+## End Func scriptCommand
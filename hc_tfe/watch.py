@@ -0,0 +1,102 @@
+#
+## hc_tfe/watch.py
+#
+## Adaptive poll scheduling for the probe's --watch mode.
+## Workspaces with a run in flight are polled every activeInterval seconds so that state changes are seen as they
+## happen; a workspace that is found idle is polled half as often each time it is found idle again, from
+## idleInterval up to maxIdleInterval, and goes straight back to the active rate as soon as anything moves.
+## Due times live in a heap, so finding what to poll next costs the same for ten workspaces or ten thousand.
+#
+#######################################################################################################################
+
+import heapq
+import time
+
+############################################################################
+#
+#   Globals
+#
+############################################################################
+
+ACTIVE_INTERVAL   = 2.0
+IDLE_INTERVAL     = 15.0
+MAX_IDLE_INTERVAL = 300.0
+
+## run statuses a run never leaves; anything else is a run in flight, including those waiting on a person such as
+## policy_soft_failed (waiting on an override) and planned (waiting on confirmation)
+#
+FINAL_STATUSES = { 'applied', 'planned_and_finished', 'errored', 'discarded', 'canceled', 'force_canceled' }
+
+## run statuses that mean a policy result or an apply has landed, i.e. something to attest
+#
+ATTESTATION_STATUSES = { 'policy_checked', 'policy_soft_failed', 'policy_override', 'applied' }
+
+############################################################################
+#
+# Class: PollSchedule
+#
+############################################################################
+
+## PollSchedule - when each key is next due to be polled.  Not thread safe; owned by the watch loop
+#
+class PollSchedule:
+  def __init__(self, activeInterval=ACTIVE_INTERVAL, idleInterval=IDLE_INTERVAL, maxIdleInterval=MAX_IDLE_INTERVAL):
+    self.activeInterval  = float(activeInterval)
+    self.idleInterval    = max(float(idleInterval), self.activeInterval)
+    self.maxIdleInterval = max(float(maxIdleInterval), self.idleInterval)
+    self.intervals       = {}
+    self.dueAt           = {}
+    self.heap            = []
+
+  def schedule(self, key, interval):
+    self.intervals[key] = interval
+    self.dueAt[key]     = time.monotonic() + interval
+    heapq.heappush(self.heap, (self.dueAt[key], key))
+
+  ## start polling key, due straight away
+  #
+  def add(self, key):
+    if key in self.dueAt:
+      return
+    self.intervals[key] = self.activeInterval
+    self.dueAt[key]     = time.monotonic()
+    heapq.heappush(self.heap, (self.dueAt[key], key))
+
+  ## stop polling key; its heap entry is left behind and skipped as stale
+  #
+  def remove(self, key):
+    self.intervals.pop(key, None)
+    self.dueAt.pop(key, None)
+
+  ## after a poll of key: back to the active rate if it is busy or anything changed, otherwise back off
+  #
+  def record(self, key, active):
+    if active:
+      self.schedule(key, self.activeInterval)
+    elif self.intervals.get(key, self.activeInterval) < self.idleInterval:
+      self.schedule(key, self.idleInterval)
+    else:
+      self.schedule(key, min(self.intervals[key] * 2, self.maxIdleInterval))
+
+  ## pop and return every key due by now; stale heap entries left behind by rescheduling are skipped
+  #
+  def due(self, now=None):
+    if now is None:
+      now = time.monotonic()
+    keys = []
+    while self.heap and self.heap[0][0] <= now:
+      dueAt, key = heapq.heappop(self.heap)
+      if self.dueAt.get(key) == dueAt:
+        keys.append(key)
+    return keys
+
+  ## monotonic time the next key falls due, or None if nothing is scheduled
+  #
+  def nextDue(self):
+    while self.heap and self.dueAt.get(self.heap[0][1]) != self.heap[0][0]:
+      heapq.heappop(self.heap)
+    if not self.heap:
+      return None
+    return self.heap[0][0]
+#
+## End Class PollSchedule
@@ -0,0 +1,108 @@
+#
+## hc_tfe/watermark.py
+#
+## Persistent per-workspace watermarks for incremental probing.
+## For every workspace probed, the store records the latest-change-at timestamp and latest run ID the workspace
+## list reported, along with the configuration version ID and state serial the probe saw.  An incremental run
+## compares the fresh workspace list against these and only probes workspaces that have moved on, so a frequent
+## attestation job touches a handful of workspaces per cycle rather than sweeping the whole organisation.
+## SQLite from the standard library, imported when a store is opened; rows are keyed by TFE address, organisation
+## and workspace ID.  The file is in WAL mode with synchronous=NORMAL and updates are committed COMMIT_EVERY at a
+## time and on close, so recording a watermark costs no fsync of its own.  A watermark lost to a crash only means
+## the workspace is probed again next time.
+#
+#######################################################################################################################
+
+import threading
+import time
+
+############################################################################
+#
+#   Globals
+#
+############################################################################
+
+WATERMARK_FILE = 'watermarks.sqlite'
+COMMIT_EVERY   = 100
+SCHEMA         = '''
+CREATE TABLE IF NOT EXISTS watermarks (
+  address          TEXT NOT NULL,
+  org              TEXT NOT NULL,
+  workspace_id     TEXT NOT NULL,
+  latest_change_at TEXT,
+  run_id           TEXT,
+  cv_id            TEXT,
+  state_serial     INTEGER,
+  probed_at        REAL NOT NULL,
+  PRIMARY KEY (address, org, workspace_id)
+)
+'''
+
+############################################################################
+#
+# Class: WatermarkStore
+#
+############################################################################
+
+## WatermarkStore - one SQLite file shared by every run against any TFE address and organisation; safe to share
+## between probe threads
+#
+class WatermarkStore:
+  def __init__(self, path, address, org):
+    import sqlite3
+
+    self.address    = address
+    self.org        = org
+    self.lock       = threading.Lock()
+    self.pending    = 0
+    self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    self.connection.execute('PRAGMA journal_mode=WAL')
+    self.connection.execute('PRAGMA synchronous=NORMAL')
+    with self.connection:
+      self.connection.execute(SCHEMA)
+
+  ## return the stored watermark for workspaceId as a dict, or None if it has never been probed
+  #
+  def get(self, workspaceId):
+    with self.lock:
+      row = self.connection.execute(
+        'SELECT latest_change_at, run_id, cv_id, state_serial FROM watermarks WHERE address = ? AND org = ? AND workspace_id = ?',
+        (self.address, self.org, workspaceId)).fetchone()
+    if row is None:
+      return None
+    return { 'latest-change-at': row[0], 'run-id': row[1], 'cv-id': row[2], 'state-serial': row[3] }
+
+  ## has the workspace moved since it was last probed?  A runId of None means the list did not say, so only
+  ## latest-change-at is compared
+  #
+  def changed(self, workspaceId, latestChangeAt, runId=None):
+    mark = self.get(workspaceId)
+    if mark is None:
+      return True
+    if mark['latest-change-at'] != latestChangeAt:
+      return True
+    return runId is not None and mark['run-id'] != runId
+
+  ## record a watermark; it is committed with the next COMMIT_EVERY updates, or by commit() or close()
+  #
+  def update(self, workspaceId, latestChangeAt, runId=None, cvId=None, stateSerial=None):
+    with self.lock:
+      self.connection.execute(
+        'INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+        (self.address, self.org, workspaceId, latestChangeAt, runId, cvId, stateSerial, time.time()))
+      self.pending += 1
+      if self.pending >= COMMIT_EVERY:
+        self.connection.commit()
+        self.pending = 0
+
+  def commit(self):
+    with self.lock:
+      self.connection.commit()
+      self.pending = 0
+
+  def close(self):
+    with self.lock:
+      self.connection.commit()
+      self.connection.close()
+#
+## End Class WatermarkStore